@@ -11,44 +11,60 @@ from utils.box_utils import decode
 import time
 
 class FaceBoxesDetector(Detector):
-    def __init__(self, model_arch, model_weights, use_gpu, device):
+    def __init__(self, model_arch, model_weights, use_gpu, device, mmap_weights=False):
         super().__init__(model_arch, model_weights)
         self.name = 'FaceBoxesDetector'
         self.net = FaceBoxesV2(phase='test', size=None, num_classes=2)    # initialize detector
         self.use_gpu = use_gpu
         self.device = device
 
-        state_dict = torch.load(self.model_weights, map_location=self.device)
+        if mmap_weights:
+            # map the (zipfile format) checkpoint instead of reading it, see source/shared_weights.py
+            state_dict = torch.load(self.model_weights, map_location=self.device, mmap=True)
+        else:
+            state_dict = torch.load(self.model_weights, map_location=self.device)
         # create new OrderedDict that does not contain `module.`
         from collections import OrderedDict
         new_state_dict = OrderedDict()
         for k, v in state_dict.items():
             name = k[7:] # remove `module.`
             new_state_dict[name] = v
-        # load params
-        self.net.load_state_dict(new_state_dict)
+        # load params, assign keeps mapped tensors instead of copying them into private memory
+        if mmap_weights:
+            self.net.load_state_dict(new_state_dict, assign=True)
+        else:
+            self.net.load_state_dict(new_state_dict)
         self.net = self.net.to(self.device)
         self.net.eval()
 
 
     def detect(self, image, thresh=0.6, im_scale=None):
+        return self.detect_batch([image], thresh, im_scale)[0]
+
+    def detect_batch(self, images, thresh=0.6, im_scale=None):
+        """Detect faces in several images of the same size with a single forward pass"""
         # auto resize for large images
         if im_scale is None:
-            height, width, _ = image.shape
+            height, width, _ = images[0].shape
             if min(height, width) > 600:
                 im_scale = 600. / min(height, width)
             else:
                 im_scale = 1
-        image_scale = cv2.resize(image, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        batch_scale = []
+        for image in images:
+            assert image.shape == images[0].shape, 'detect_batch needs images of the same size'
+            image_scale = cv2.resize(image, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+            batch_scale.append(image_scale.transpose(2,0,1))
 
         scale = torch.Tensor([image_scale.shape[1], image_scale.shape[0], image_scale.shape[1], image_scale.shape[0]])
-        image_scale = torch.from_numpy(image_scale.transpose(2,0,1)).to(self.device).int()
+        image_scale = torch.from_numpy(np.stack(batch_scale)).to(self.device).int()
         mean_tmp = torch.IntTensor([104, 117, 123]).to(self.device)
-        mean_tmp = mean_tmp.unsqueeze(1).unsqueeze(2)
+        mean_tmp = mean_tmp.view(1, 3, 1, 1)
         image_scale -= mean_tmp
-        image_scale = image_scale.float().unsqueeze(0)
+        image_scale = image_scale.float()
         scale = scale.to(self.device)
 
+        results = []
         with torch.no_grad():
             out = self.net(image_scale)
             #priorbox = PriorBox(cfg, out[2], (image_scale.size()[2], image_scale.size()[3]), phase='test')
@@ -57,41 +73,48 @@ class FaceBoxesDetector(Detector):
             priors = priors.to(self.device)
             loc, conf = out
             prior_data = priors.data
-            boxes = decode(loc.data.squeeze(0), prior_data, cfg['variance'])
-            boxes = boxes * scale 
-            boxes = boxes.cpu().numpy()
-            scores = conf.data.cpu().numpy()[:, 1]
+            # the test phase softmax flattens the batch, split it back per image
+            conf = conf.view(loc.size(0), -1, conf.size(-1))
+            for b in range(loc.size(0)):
+                results.append((self._postprocess(loc.data[b], conf.data[b], prior_data, scale, thresh, im_scale), im_scale))
+        return results
+
+    def _postprocess(self, loc, conf, prior_data, scale, thresh, im_scale):
+        boxes = decode(loc, prior_data, cfg['variance'])
+        boxes = boxes * scale 
+        boxes = boxes.cpu().numpy()
+        scores = conf.cpu().numpy()[:, 1]
 
-            # ignore low scores
-            inds = np.where(scores > thresh)[0]
-            boxes = boxes[inds]
-            scores = scores[inds]
+        # ignore low scores
+        inds = np.where(scores > thresh)[0]
+        boxes = boxes[inds]
+        scores = scores[inds]
 
-            # keep top-K before NMS
-            order = scores.argsort()[::-1][:5000]
-            boxes = boxes[order]
-            scores = scores[order]
+        # keep top-K before NMS
+        order = scores.argsort()[::-1][:5000]
+        boxes = boxes[order]
+        scores = scores[order]
 
-            # do NMS
-            dets = np.hstack((boxes, scores[:, np.newaxis])).astype(np.float32, copy=False)
-            keep = nms(dets, 0.3)
-            dets = dets[keep, :]
+        # do NMS
+        dets = np.hstack((boxes, scores[:, np.newaxis])).astype(np.float32, copy=False)
+        keep = nms(dets, 0.3)
+        dets = dets[keep, :]
 
-            dets = dets[:750, :]
-            detections_scale = []
-            for i in range(dets.shape[0]):
-                xmin = int(dets[i][0])
-                ymin = int(dets[i][1])
-                xmax = int(dets[i][2])
-                ymax = int(dets[i][3])
-                score = dets[i][4]
-                width = xmax - xmin
-                height = ymax - ymin
-                detections_scale.append(['face', score, xmin, ymin, width, height])
+        dets = dets[:750, :]
+        detections_scale = []
+        for i in range(dets.shape[0]):
+            xmin = int(dets[i][0])
+            ymin = int(dets[i][1])
+            xmax = int(dets[i][2])
+            ymax = int(dets[i][3])
+            score = dets[i][4]
+            width = xmax - xmin
+            height = ymax - ymin
+            detections_scale.append(['face', score, xmin, ymin, width, height])
 
         # adapt bboxes to the original image size
         if len(detections_scale) > 0:
             detections_scale = [[det[0],det[1],int(det[2]/im_scale),int(det[3]/im_scale),int(det[4]/im_scale),int(det[5]/im_scale)] for det in detections_scale]
 
-        return detections_scale, im_scale
+        return detections_scale
 
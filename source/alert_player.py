@@ -0,0 +1,168 @@
+"""
+Alert sounds played off the detection loop.
+
+AttentionScorer used to call pygame.mixer.music.load() on the alert file every time
+an alert fired, so the frame that raised it paid for the file read and the MP3
+decode. AlertPlayer decodes every alert file into a pygame.mixer.Sound once, when
+load() is called (scorer creation, config reload), and play() only queues the alert
+for a daemon thread that starts the sound.
+
+Priority rules: an alert of higher priority (Sleeping above everything) stops the
+sound that is playing; others wait for it to finish and are dropped when they have
+waited longer than max_age, as the driver's state has moved on by then. An alert
+that is already playing or queued is not queued again, so a state reported on
+every frame (Sleeping) plays its sound over and over instead of restarting it
+every frame.
+
+Without an audio device (CI, containers) the mixer fails to initialise; the player
+then stays silent and play() is a no-op.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+import pygame
+
+PRIORITIES = {
+    'Semi-Closed': 1,
+    'Moderately Drowsy': 2,
+    'Drowsy': 3,
+    'Sleeping': 4,
+}
+
+
+def init_mixer():
+    """Initialise pygame.mixer once, False when there is no usable audio device"""
+    if pygame.mixer.get_init():
+        return True
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        print(f"Audio disabled, mixer failed to initialise: {e}")
+        return False
+    return True
+
+
+class AlertPlayer:
+    def __init__(self, priorities=None, max_age=5.0, poll_interval=0.05):
+        self.priorities = dict(PRIORITIES if priorities is None else priorities)
+        self.max_age = max_age              # seconds a queued alert stays relevant
+        self.poll_interval = poll_interval  # how often a busy channel is checked for the end of a sound
+        self.enabled = init_mixer()
+        self.sounds = {}
+        self.paths = {}
+        self.pending = []  # heap of (-priority, order, t_queued, alert_type)
+        self.order = itertools.count()
+        self.cond = threading.Condition()
+        self.channel = None
+        self.current = None
+        self.current_priority = 0
+        self.played = 0
+        self.preempted = 0
+        self.dropped = 0
+        self.running = True
+        self.thread = None
+        if self.enabled:
+            self.thread = threading.Thread(target=self._run, name='alert-player', daemon=True)
+            self.thread.start()
+
+    def load(self, audio_files):
+        """Decode {alert_type: path} into Sounds; files already loaded from the same path are kept"""
+        if not self.enabled:
+            return
+        sounds = {}
+        for alert_type, path in audio_files.items():
+            if self.paths.get(alert_type) == path and alert_type in self.sounds:
+                sounds[alert_type] = self.sounds[alert_type]
+                continue
+            try:
+                sounds[alert_type] = pygame.mixer.Sound(path)
+            except (pygame.error, FileNotFoundError) as e:
+                print(f"Error loading alert sound {path}: {e}")
+        with self.cond:
+            self.sounds = sounds
+            self.paths = {alert_type: audio_files[alert_type] for alert_type in sounds}
+
+    def busy(self):
+        return self.channel is not None and self.channel.get_busy()
+
+    def play(self, alert_type):
+        """Queue alert_type, returns without waiting; False when it has no sound or is already on"""
+        with self.cond:
+            if alert_type not in self.sounds:
+                return False
+            if (alert_type == self.current and self.busy()) or any(item[3] == alert_type for item in self.pending):
+                return False
+            heapq.heappush(self.pending, (-self.priorities.get(alert_type, 0), next(self.order), time.monotonic(), alert_type))
+            self.cond.notify()
+        return True
+
+    def _next(self):
+        """Pop the alert to start now, None while the playing sound outranks everything queued"""
+        while self.pending:
+            priority, _, t_queued, alert_type = self.pending[0]
+            if self.busy() and -priority <= self.current_priority:
+                return None
+            heapq.heappop(self.pending)
+            if time.monotonic() - t_queued > self.max_age:
+                self.dropped += 1
+                continue
+            return alert_type
+        return None
+
+    def _run(self):
+        with self.cond:
+            while True:
+                alert_type = self._next()
+                while self.running and alert_type is None:
+                    # a sound ending is not signalled, so wait with a timeout while one plays
+                    self.cond.wait(self.poll_interval if self.pending else None)
+                    alert_type = self._next()
+                if not self.running:
+                    return
+                sound = self.sounds.get(alert_type)
+                if sound is None:
+                    # unloaded by a config reload while queued
+                    continue
+                if self.busy():
+                    self.channel.stop()
+                    self.preempted += 1
+                try:
+                    # returns at once, SDL mixes the decoded samples on its own thread
+                    self.channel = sound.play()
+                except pygame.error as e:
+                    print(f"Error playing audio: {e}")
+                    continue
+                self.current = alert_type
+                self.current_priority = self.priorities.get(alert_type, 0)
+                self.played += 1
+
+    def stop(self):
+        """Silence the current sound and forget the queued ones"""
+        with self.cond:
+            self.pending = []
+            if self.busy():
+                self.channel.stop()
+
+    def close(self):
+        self.stop()
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+
+_player = None
+_player_lock = threading.Lock()
+
+
+def get_player():
+    """Process-wide player: one speaker, and the streams of a server share the decoded sounds"""
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = AlertPlayer()
+        return _player
@@ -1,34 +1,29 @@
 import streamlit as st 
 
 import cv2, os
-import numpy as np
-import importlib
 import time
-from math import floor
 import pandas as pd
 import sys
 sys.path.insert(0, 'FaceBoxesV2')
 sys.path.insert(0, '..')
-from faceboxes_detector import *
-
-import torch
-import torch.nn as nn
-import torch.nn.parallel
-import torch.optim as optim
-import torch.utils.data
-import torch.nn.functional as F
-import torchvision.transforms as transforms
-import torchvision.datasets as datasets
-import torchvision.models as models
-
-from networks import *
-import data_utils
-from functions import *
+
+# torchvision, the networks and FaceBoxes are imported by model_cache on its loader thread,
+# so the page renders while the models load
+from functions import style_table
 from attention_score import AttentionScorer
+from config_watcher import get_watcher
+from frame_ring import open_shared_capture
+from instrumentation import FrameProfiler
+from metrics_server import get_metrics, start_metrics_server
+from profiling import get_window
+from motion_gate import MotionGate
+from frame_scheduler import FrameScheduler, FULL, LANDMARKS, SKIP
+from frame_log import FrameLogWriter
+from head_pose import HeadPoseEstimator
+import model_cache
 #Init model variables:
 experiment_name = "pip_32_16_60_r18_l2_l1_10_1_nb10"
 data_name = "WFLW"
-config_path = '.experiments.{}.{}'.format(data_name, experiment_name)
 
 if sys.platform.startswith('win'):
     video_file = 0  # Default webcam (or use 1, 2, 3 for other cameras)
@@ -37,43 +32,41 @@ elif sys.platform.startswith('darwin'):
 else:
     video_file = "/dev/video2"  #Camera_path for unix
 
-save_dir = "snapshots/WFLW/pip_32_16_60_r18_l2_l1_10_1_nb10"
-
-my_config = importlib.import_module(config_path, package='Course_Related_2')
-Config = getattr(my_config, 'Config')
-cfg = Config()
-cfg.experiment_name = experiment_name
-cfg.data_name = data_name
-meanface_indices, reverse_index1, reverse_index2, max_len = get_meanface(os.path.join('data', cfg.data_name, 'meanface.txt'), cfg.num_nb)
-print("====================================")
-print("Loading the model")
-resnet18 = models.resnet18(pretrained=cfg.pretrained)
-net = Pip_resnet18(resnet18, cfg.num_nb, num_lms=cfg.num_lms, input_size=cfg.input_size, net_stride=cfg.net_stride)
-# Set device (CPU/GPU)
-# if torch.cuda.is_available():
-#     print("CUDA is available. Using GPU.")
-
-if cfg.use_gpu and torch.cuda.is_available():
-    print("Using GPU")
-    device = torch.device("cuda:0" if torch.cuda.is_available() else 'cpu')
-else:
-    print("Using CPU")
-    device = torch.device('cpu')
+# Decode camera frames in a separate process and read them through shared memory
+use_shared_memory_capture = False
+
+# Prometheus /metrics on 127.0.0.1:<port> while the detector runs (None disables it)
+metrics_port = 9108
+
+# Skip FaceBoxes and PIP on frames where less than this fraction of pixels changed (see
+# motion_gate.py), reusing the last landmarks for at most motion_max_stale seconds. None disables it.
+motion_threshold = 0.01
+motion_max_stale = 1.0
 
-net = net.to(device)
-print("Model loaded")
+# Run FaceBoxes and PIP every landmark_interval frames and move the eye landmarks with
+# optical flow in between (see landmark_tracker.py); 1 runs the models on every frame
+landmark_interval = 1
 
-# Load the state dictionary
-weight_file = os.path.join(save_dir, 'epoch%d.pth' % (cfg.num_epochs-1))
-state_dict = torch.load(weight_file, map_location=device)
-net.load_state_dict(state_dict)
-print("State dictionary loaded")
-print("====================================")
+# Keep capture-to-score latency under latency_budget seconds by running landmarks in the last
+# boxes or skipping inference on late frames (see frame_scheduler.py), with fresh EAR values at
+# least min_score_rate times per second. None runs every frame whatever it costs.
+latency_budget = None
+min_score_rate = 5.0
 
-normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                 std=[0.229, 0.224, 0.225])
-preprocess = transforms.Compose([transforms.Resize((cfg.input_size, cfg.input_size)), transforms.ToTensor(), normalize])
-print("Preprocess defined")
+# Measure where the irises sit in the eyes for the gaze check (see gaze_cascade.py): every
+# gaze_interval frames with the eyes open, with the Iris model on eye crops when snapshots/Iris has
+# it, else from the pupil landmarks of the face model (COFW, LaPa). None disables it.
+gaze_interval = 5
+iris_experiment_name = "pip_32_16_60_r18_l2_l1_10_1_nb10"
+
+# Append every frame (time, box, eye landmarks, EAR, PERCLOS, status) to compact binary logs
+# in this directory, see frame_log.py; frame_log_max_mb caps their total size. None disables it.
+frame_log_dir = None
+frame_log_max_mb = 2048
+
+# Models are built, loaded and warmed up once per process by model_cache (st.cache_resource),
+# so reruns, new browser sessions and clicks on Run reuse them instead of reloading the weights.
+# Loading starts in the background as soon as the page renders.
 
 
 def play_webcam():
@@ -82,6 +75,9 @@ def play_webcam():
     #Jetson Nano CSI Camera
     # pipeline = 'nvarguscamerasrc ! video/x-raw(memory:NVMM), width=(int)1280, height=(int)720, format=(string)NV12, framerate=(fraction)30/1 ! nvvidconv ! video/x-raw, format=(string)BGRx ! videoconvert ! video/x-raw, format=(string)BGR ! appsink'
 
+    model_future = model_cache.prefetch_pipeline(data_name, experiment_name)
+    show_latency = st.sidebar.checkbox('Show stage latency', value=False)
+
     if st.sidebar.button('Run'):
         try:
                 # Display the DataFrame using st.table()
@@ -89,99 +85,204 @@ def play_webcam():
             # df = pd.DataFrame(columns=["Aspect Ratio"])
             # label_holder.table(df)
             label_holder = st.empty()
-            df = pd.DataFrame(columns=["Aspect Ratio", "PERCLOS Score", "Driver's Status"])
+            df = pd.DataFrame(columns=["Aspect Ratio", "PERCLOS Score", "Blinks/min", "Microsleeps (5 min)", "Head Pose", "Gaze", "Driver's Status"])
             styled_df = style_table(df)
             label_holder.table(styled_df)
-            detector = FaceBoxesDetector('FaceBoxes', 'FaceBoxesV2/weights/FaceBoxesV2.pth', True, device)
+            if model_future.done():
+                # picks up a retrained snapshot, otherwise a cache hit
+                model_future = model_cache.prefetch_pipeline(data_name, experiment_name)
             my_thresh = 0.9
-            det_box_scale = 1.2
-            net.eval()
             count = 0
             sleepy_frames = 0
             print("Starting the video")
             #OpenCV camera
-            cap = cv2.VideoCapture(source_webcam)
+            if use_shared_memory_capture:
+                cap = open_shared_capture(source_webcam)
+            else:
+                cap = cv2.VideoCapture(source_webcam)
             #Jetson Nano CSI Camera
             # cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
 
             print("Video loaded")
+            # the models kept loading while the camera opened
+            with st.spinner("Loading detection models..."):
+                pipeline = model_future.result()
+            detector, cfg = pipeline.detector, pipeline.cfg
             print("====================================")
-            frame_width = int(cap.get(3))
-            frame_height = int(cap.get(4))
             st_frame = st.empty()
+            latency_holder = st.empty()
             #Set up parameters for the video
             t_0 = time.perf_counter()
             score = AttentionScorer(t_now=t_0, ear_thresh=0.15, gaze_thresh=0.2, perclos_thresh=0.2, roll_thresh=15, pitch_thresh=15, yaw_thresh=15, ear_time_thresh=0.2, gaze_time_thresh=0.2, pose_time_thresh=4.0, verbose=False)
-            i = 0 
+            # thresholds saved on the configuration page apply without reloading the models
+            get_watcher().add(score)
+            profiler = FrameProfiler()
+            metrics = get_metrics()
+            if metrics_port is not None:
+                start_metrics_server(metrics_port)
+            metrics.attach_profiler(profiler)
+            score.alert_listeners.append(metrics.alert_listener('webcam'))
+            # armed from the "Runtime profiling" section of the configuration page
+            profiling_window = get_window()
+            gate = MotionGate(motion_threshold, max_stale=motion_max_stale) if motion_threshold else None
+            last_faces = []
+            tracker = None
+            if landmark_interval > 1:
+                # landmark_pipeline pulls in the networks, only import it once the models are loaded
+                from landmark_tracker import LandmarkTracker
+                tracker = LandmarkTracker(landmark_interval, schema=pipeline.schema)
+            # roll, pitch and yaw from the same landmarks for the distraction check
+            pose_estimator = HeadPoseEstimator(pipeline.schema)
+            distracted = False
+            gaze = None
+            if gaze_interval:
+                # torch again, only once the models are loaded
+                from gaze_cascade import GazeCascade
+                gaze = GazeCascade(pipeline.schema, model_cache.get_iris_model(iris_experiment_name, pipeline.device),
+                                   interval=gaze_interval)
+                if not gaze.available:
+                    print("No Iris snapshot and no pupil landmarks, gaze check disabled")
+                    gaze = None
+            looking_away = False
+            scheduler = None
+            if latency_budget is not None:
+                camera_fps = cap.get(cv2.CAP_PROP_FPS)
+                scheduler = FrameScheduler(latency_budget, min_score_rate, frame_interval=1. / camera_fps if camera_fps > 0 else 1 / 30.)
+            frame_log = None
+            if frame_log_dir is not None:
+                frame_log = FrameLogWriter(frame_log_dir, max_total_bytes=frame_log_max_mb << 20, schema=pipeline.schema)
+            dropped_seen = 0
+            t_latency = t_0
             time.sleep(0.01)
             print("Starting the processing loop")
-            while (cap.isOpened()):
-                t_now = time.perf_counter()
-                fps = i/(t_now-t_0)
-                if fps == 0:
-                    fps = 10
-                ret, frame = cap.read()
-                # print("Start reading frame")
-                if ret == True:        
-                    # print("Frame readed")          
-                    detections, _ = detector.detect(frame, my_thresh, 1)
-                    # print("Start processing frame")
-                    for i in range(len(detections)):
-                        det_xmin = detections[i][2]
-                        det_ymin = detections[i][3]
-                        det_width = detections[i][4]
-                        det_height = detections[i][5]
-                        det_xmax = det_xmin + det_width - 1
-                        det_ymax = det_ymin + det_height - 1
-
-                        det_xmin -= int(det_width * (det_box_scale-1)/2)
-                        det_ymin += int(det_height * (det_box_scale-1)/2)
-                        det_xmax += int(det_width * (det_box_scale-1)/2)
-                        det_ymax += int(det_height * (det_box_scale-1)/2)
-                        det_xmin = max(det_xmin, 0)
-                        det_ymin = max(det_ymin, 0)
-                        det_xmax = min(det_xmax, frame_width-1)
-                        det_ymax = min(det_ymax, frame_height-1)
-                        det_width = det_xmax - det_xmin + 1
-                        det_height = det_ymax - det_ymin + 1
-                        cv2.rectangle(frame, (det_xmin, det_ymin), (det_xmax, det_ymax), (0, 0, 255), 2)
-                        det_crop = frame[det_ymin:det_ymax, det_xmin:det_xmax, :]
-                        det_crop = cv2.resize(det_crop, (256, 256))
-                        inputs = Image.fromarray(det_crop[:,:,::-1].astype('uint8'), 'RGB')
-                        inputs = preprocess(inputs).unsqueeze(0)
-                        inputs = inputs.to(device)
-                        lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y, outputs_cls, max_cls = forward_pip(net, inputs, preprocess, 256, 32, 10)
-                        lms_pred = torch.cat((lms_pred_x, lms_pred_y), dim=1).flatten()
-                        tmp_nb_x = lms_pred_nb_x[reverse_index1, reverse_index2].view(cfg.num_lms, max_len)
-                        tmp_nb_y = lms_pred_nb_y[reverse_index1, reverse_index2].view(cfg.num_lms, max_len)
-                        tmp_x = torch.mean(torch.cat((lms_pred_x, tmp_nb_x), dim=1), dim=1).view(-1,1)
-                        tmp_y = torch.mean(torch.cat((lms_pred_y, tmp_nb_y), dim=1), dim=1).view(-1,1)
-                        lms_pred_merge = torch.cat((tmp_x, tmp_y), dim=1).flatten()
-                        lms_pred = lms_pred.cpu().numpy()
-                        lms_pred_merge = lms_pred_merge.cpu().numpy()
-                        for i in range(cfg.num_lms):
-                            x_pred = lms_pred_merge[i*2] * det_width
-                            y_pred = lms_pred_merge[i*2+1] * det_height
-                            cv2.circle(frame, (int(x_pred)+det_xmin, int(y_pred)+det_ymin), 1, (0, 0, 255), -1)
-                        st_frame.image(image=frame, caption="Detected Video", channels="BGR", width=700)
-                        average_aspect_ratio, left_aspect_ratio, right_aspect_ratio = calculate_aspect_ratio(lms_pred_merge)
-                        tired, perclos_score = score.get_PERCLOS(t_now, fps, average_aspect_ratio)
-
-                        # Format aspect ratio value
-                        aspect_ratio_str = f"{average_aspect_ratio:.2f}"
-
-                        # Format PERCLOS score value
-                        perclos_score_str = f"{perclos_score:.2f}"
-
-                        # Update the displayed DataFrame with sample data
-                        df = pd.DataFrame({"Aspect Ratio": [aspect_ratio_str], "PERCLOS Score": [perclos_score_str], "Driver's Status": [tired]})
-                        styled_df = style_table(df)
-                        label_holder.table(styled_df)
-                else:
-                    cap.release()
-
-                    print("Error", ret)
-                    continue
+            # Stop, Run and widget changes end the loop with a StopException/RerunException
+            # (BaseException): close the log there too, or its last chunk and writer thread are lost
+            try:
+                while (cap.isOpened()):
+                    profiler.start_frame()
+                    t_now = time.perf_counter()
+                    fps = profiler.fps if profiler.fps > 0 else 10
+                    with profiler.stage('capture'):
+                        ret, frame = cap.read()
+                    # print("Start reading frame")
+                    if ret == True:        
+                        # print("Frame readed")          
+                        # capture time when the capture records it (shared-memory ring), else now
+                        t_frame = getattr(cap, 'last_time', None)
+                        t_score = t_frame if t_frame is not None else t_now
+                        t_plan = time.perf_counter()
+                        planned = scheduler.plan(t_plan, t_frame, has_box=bool(last_faces)) if scheduler is not None else FULL
+                        mode = planned
+                        with profiler.stage('gate'):
+                            if mode != SKIP and gate is not None and not gate.should_run(frame, t_now):
+                                # nothing moved, the last faces still hold
+                                mode = SKIP
+                        tracked = None
+                        if mode == FULL and tracker is not None and not tracker.inference_due():
+                            with profiler.stage('track'):
+                                tracked = tracker.propagate(frame)
+                        boxes = []
+                        if mode == FULL and tracked is None:
+                            with profiler.stage('detect'):
+                                detections, _ = detector.detect(frame, my_thresh, 1)
+                                boxes = pipeline.expand_boxes(detections, frame.shape)
+                        elif mode == LANDMARKS:
+                            # over budget: landmarks in the last boxes, the head barely moves between frames
+                            boxes = [(face.box, face.score) for face in last_faces]
+                        # print("Start processing frame")
+                        if tracked is not None:
+                            faces = tracked
+                        elif mode == SKIP:
+                            faces = last_faces
+                        else:
+                            faces = pipeline.process_boxes(frame, boxes, profiler)
+                            if tracker is not None:
+                                tracker.start(frame, faces)
+                        if mode != SKIP:
+                            last_faces = faces
+                            if gate is not None:
+                                gate.update(frame, t_now, [face.box for face in faces])
+                            with profiler.stage('pose'):
+                                pose_estimator.estimate(faces, frame.shape)
+                            if gaze is not None:
+                                with profiler.stage('gaze'):
+                                    gaze.estimate(frame, faces, min_ear=score.ear_thresh)
+                        # every frame is scored at its own time, PERCLOS advances whatever ran
+                        with profiler.stage('scoring'):
+                            for face in faces:
+                                average_aspect_ratio = face.average_aspect_ratio
+                                tired, perclos_score = score.get_PERCLOS(t_score, fps, average_aspect_ratio)
+                                _, looking_away, distracted = score.eval_scores(t_score, average_aspect_ratio, face.gaze_score, *(face.head_pose or (None, None, None)))
+                        if scheduler is not None:
+                            # the cost model covers plan() to scoring, capture and rendering are not in it
+                            scheduler.done(mode, time.perf_counter() - t_plan, t_plan)
+
+                        # frames the scheduler skips to catch up are not drawn either
+                        if planned != SKIP:
+                            with profiler.stage('render'):
+                                for face in faces:
+                                    det_xmin, det_ymin, det_xmax, det_ymax = face.box
+                                    det_width = det_xmax - det_xmin + 1
+                                    det_height = det_ymax - det_ymin + 1
+                                    cv2.rectangle(frame, (det_xmin, det_ymin), (det_xmax, det_ymax), (0, 0, 255), 2)
+                                    for lms_idx in range(cfg.num_lms):
+                                        x_pred = face.lms_pred_merge[lms_idx*2] * det_width
+                                        y_pred = face.lms_pred_merge[lms_idx*2+1] * det_height
+                                        cv2.circle(frame, (int(x_pred)+det_xmin, int(y_pred)+det_ymin), 1, (0, 0, 255), -1)
+                                st_frame.image(image=frame, caption="Detected Video", channels="BGR", width=700)
+                                if faces:
+                                    # Format aspect ratio value
+                                    aspect_ratio_str = f"{average_aspect_ratio:.2f}"
+
+                                    # Format PERCLOS score value
+                                    perclos_score_str = f"{perclos_score:.2f}"
+
+                                    # Blink rate over the last minute, microsleeps over the last 5
+                                    blinks = score.blink_analyzer.stats()
+                                    blink_rate = blinks[60]['blink_rate_per_min']
+                                    blink_rate_str = f"{blink_rate:.1f}" if blink_rate is not None else "-"
+
+                                    # Head roll (and yaw with a full-face landmark model), flagged once eval_scores reports a distraction
+                                    head_pose = faces[-1].head_pose
+                                    if head_pose is None:
+                                        head_pose_str = "-"
+                                    else:
+                                        head_pose_str = f"roll {head_pose[0]:+.0f}°" + (f", yaw {head_pose[2]:+.0f}°" if head_pose[2] is not None else "")
+                                        if distracted:
+                                            head_pose_str += " (distracted)"
+                                    gaze_score = faces[-1].gaze_score
+                                    gaze_str = "-" if gaze_score is None else f"{gaze_score:.2f}" + (" (looking away)" if looking_away else "")
+
+                                    # Update the displayed DataFrame with sample data
+                                    df = pd.DataFrame({"Aspect Ratio": [aspect_ratio_str], "PERCLOS Score": [perclos_score_str], "Blinks/min": [blink_rate_str],
+                                                       "Microsleeps (5 min)": [blinks[300]['microsleeps']], "Head Pose": [head_pose_str], "Gaze": [gaze_str], "Driver's Status": [tired]})
+                                    styled_df = style_table(df)
+                                    label_holder.table(styled_df)
+                        profiler.end_frame()
+                        profiling_window.step(profiler)
+                        # frames the shared-memory capture overwrote before we read them
+                        dropped = getattr(cap, 'dropped', 0) - dropped_seen
+                        dropped_seen += dropped
+                        if faces:
+                            metrics.observe_frame('webcam', True, perclos_score, average_aspect_ratio, profiler.fps, dropped)
+                        else:
+                            metrics.observe_frame('webcam', False, fps=profiler.fps, dropped=dropped)
+                        if frame_log is not None:
+                            if faces:
+                                frame_log.append(0, tired, faces[-1], average_aspect_ratio, perclos_score)
+                            else:
+                                frame_log.append(0)
+                        if show_latency and t_now - t_latency >= 1.0:
+                            t_latency = t_now
+                            latency_holder.table(pd.DataFrame(profiler.table()).set_index('Stage'))
+                    else:
+                        cap.release()
+
+                        print("Error", ret)
+                        continue
+            finally:
+                if frame_log is not None:
+                    frame_log.close()
         except Exception as e:
             print("Error loading video: " + str(e))
             st.sidebar.error("Error loading video: " + str(e))
@@ -1,7 +1,73 @@
 import time
-import pygame  # For playing audio
 import os
 import json
+from collections import deque
+
+from alert_player import get_player
+from blink_analyzer import BlinkAnalyzer
+
+
+PERCLOS_CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'perclos_config.json')
+AUDIO_DIR = os.path.join(os.path.dirname(__file__), 'audio')
+
+DEFAULT_PERCLOS_CONFIG = {
+    'semi_closed_min': 0.0,
+    'semi_closed_max': 3.75,
+    'moderately_drowsy_min': 3.75,
+    'moderately_drowsy_max': 10.0,
+    'drowsy_min': 10.0,
+    'drowsy_max': 15.0,
+    'very_drowsy_min': 15.0,
+    'very_drowsy_max': 20.0,
+    'sleeping_min': 20.0,
+    'ear_thresh': 0.15,
+    'sleep_threshold': 3.0,
+    'perclos_time_period': 60,
+    'audio_files': {
+        'Semi-Closed': 'Semi-closed.mp3',
+        'Moderately Drowsy': 'Moderate_Drowsiness.mp3',
+        'Drowsy': 'Drowsiness.mp3',
+        'Sleeping': 'Sleep.mp3'
+    }
+}
+
+LEVELS = ('semi_closed', 'moderately_drowsy', 'drowsy', 'very_drowsy')
+
+
+def validate_perclos_config(config):
+    """Complete config with the defaults of missing keys; ValueError if the scorer cannot run with it"""
+    if not isinstance(config, dict):
+        raise ValueError('PERCLOS config must be a JSON object')
+    config = dict(DEFAULT_PERCLOS_CONFIG, **config)
+    for key, default in DEFAULT_PERCLOS_CONFIG.items():
+        if key == 'audio_files':
+            continue
+        if isinstance(config[key], bool) or not isinstance(config[key], (int, float)):
+            raise ValueError('{} must be a number, got {!r}'.format(key, config[key]))
+    for level in LEVELS:
+        if config[level + '_min'] > config[level + '_max']:
+            raise ValueError('{0}_min is above {0}_max'.format(level))
+    maxima = [config[level + '_max'] for level in LEVELS]
+    if maxima != sorted(maxima) or config['sleeping_min'] < config['very_drowsy_min']:
+        raise ValueError('drowsiness levels must not overlap out of order')
+    for key in ('ear_thresh', 'sleep_threshold', 'perclos_time_period'):
+        if config[key] <= 0:
+            raise ValueError('{} must be positive'.format(key))
+    audio_files = config['audio_files']
+    if not isinstance(audio_files, dict) or not all(isinstance(name, str) for name in audio_files.values()):
+        raise ValueError('audio_files must map alert types to file names')
+    return config
+
+
+def audio_paths(config, audio_dir=AUDIO_DIR):
+    """{alert type: sound file} of a validated config"""
+    return {alert_type: os.path.join(audio_dir, filename) for alert_type, filename in config['audio_files'].items()}
+
+
+def read_perclos_config(config_file=PERCLOS_CONFIG_FILE):
+    """Parse and validate the JSON config, OSError / ValueError when it cannot be used"""
+    with open(config_file, 'r') as f:
+        return validate_perclos_config(json.load(f))
 
 
 class AttentionScorer:
@@ -29,102 +95,103 @@ class AttentionScorer:
         self.distracted_time = 0
 
         self.prev_time = t_now
-        self.eye_closure_counter = 0
+        self.eye_closure_counter = 0  # closed-eye samples in the PERCLOS window
+
+        # Sliding PERCLOS window: (t, dt, closed) per get_PERCLOS call, plus running sums
+        self.perclos_samples = deque()
+        self.closed_time = 0.
+        self.last_sample_time = None
+        self.max_sample_gap = 1.0  # a stalled loop does not count as seconds of closure
         
         # Add new variables for continuous closure tracking
         self.continuous_closure_start = None
         self.sleep_threshold = 3.0  # 3 seconds threshold
         
-        # Initialize pygame mixer for audio
-        pygame.mixer.init()
-        
-        # Load audio files - will be overridden by config if available
-        audio_dir = os.path.join(os.path.dirname(__file__), 'audio')
-        self.audio_files = {
-            'Semi-Closed': os.path.join(audio_dir, 'Semi-closed.mp3'),
-            'Moderately Drowsy': os.path.join(audio_dir, 'Moderate_Drowsiness.mp3'),
-            'Drowsy': os.path.join(audio_dir, 'Drowsiness.mp3'),
-            'Sleeping': os.path.join(audio_dir, 'Sleep.mp3')
-        }
-        self.audio_dir = audio_dir  # Store for later use
-        
+        # Alert sounds are decoded once and played from the player's thread
+        self.alert_player = get_player()
+
+        # Audio files, from the config below; audio_enabled mutes the scorer across config reloads
+        self.audio_files = {}
+        self.audio_dir = AUDIO_DIR
+        self.audio_enabled = True
+
         # Track which alerts have been played this period
         self.alerts_played_this_period = set()
+        # status of the previous play_alert call, Sleeping reaches the listeners only when it starts
+        self.last_alert_type = None
+        # Callables invoked with the alert type whenever an alert fires (e.g. metrics)
+        self.alert_listeners = []
         
+        # Blinks and microsleeps over 1, 5 and 15 minutes, same EAR threshold as PERCLOS
+        self.blink_analyzer = BlinkAnalyzer(self.ear_thresh)
+
         # Load PERCLOS thresholds from config file
+        self.pending_config = None  # set by reload_config, applied between two frames
         self.load_perclos_config()
+        self.alert_player.load(self.audio_files)
 
     def load_perclos_config(self):
         """Load PERCLOS threshold configuration from JSON file"""
-        config_file = os.path.join(os.path.dirname(__file__), 'perclos_config.json')
-        default_config = {
-            'semi_closed_min': 0.0,
-            'semi_closed_max': 3.75,
-            'moderately_drowsy_min': 3.75,
-            'moderately_drowsy_max': 10.0,
-            'drowsy_min': 10.0,
-            'drowsy_max': 15.0,
-            'very_drowsy_min': 15.0,
-            'very_drowsy_max': 20.0,
-            'sleeping_min': 20.0,
-            'ear_thresh': 0.15,
-            'sleep_threshold': 3.0,
-            'perclos_time_period': 60,
-            'audio_files': {
-                'Semi-Closed': 'Semi-closed.mp3',
-                'Moderately Drowsy': 'Moderate_Drowsiness.mp3',
-                'Drowsy': 'Drowsiness.mp3',
-                'Sleeping': 'Sleep.mp3'
-            }
-        }
-        
-        if os.path.exists(config_file):
+        if os.path.exists(PERCLOS_CONFIG_FILE):
             try:
-                with open(config_file, 'r') as f:
-                    self.perclos_config = json.load(f)
-                
-                # Override instance variables with config values
-                if 'ear_thresh' in self.perclos_config:
-                    self.ear_thresh = self.perclos_config['ear_thresh']
-                if 'sleep_threshold' in self.perclos_config:
-                    self.sleep_threshold = self.perclos_config['sleep_threshold']
-                if 'perclos_time_period' in self.perclos_config:
-                    self.perclos_time_period = self.perclos_config['perclos_time_period']
-                
-                # Load audio files from config
-                if 'audio_files' in self.perclos_config:
-                    for alert_type, filename in self.perclos_config['audio_files'].items():
-                        self.audio_files[alert_type] = os.path.join(self.audio_dir, filename)
-                    print(f"  - Loaded {len(self.perclos_config['audio_files'])} custom audio files")
-                
+                self.apply_config(read_perclos_config(PERCLOS_CONFIG_FILE))
+                print(f"  - Loaded {len(self.audio_files)} custom audio files")
                 print("PERCLOS configuration loaded from file")
                 print(f"  - EAR Threshold: {self.ear_thresh}")
                 print(f"  - Sleep Threshold: {self.sleep_threshold}s")
                 print(f"  - PERCLOS Period: {self.perclos_time_period}s")
-            except Exception as e:
+            except (OSError, ValueError) as e:
                 print(f"Error loading PERCLOS config: {e}. Using defaults.")
-                self.perclos_config = default_config
+                self.apply_config(dict(DEFAULT_PERCLOS_CONFIG, ear_thresh=self.ear_thresh))
         else:
             print("PERCLOS config file not found. Using defaults.")
-            self.perclos_config = default_config
+            self.apply_config(dict(DEFAULT_PERCLOS_CONFIG, ear_thresh=self.ear_thresh))
+
+    def apply_config(self, config):
+        """Take the thresholds and audio files of a validated config"""
+        self.perclos_config = config
+        self.ear_thresh = config['ear_thresh']
+        self.blink_analyzer.ear_thresh = config['ear_thresh']
+        self.sleep_threshold = config['sleep_threshold']
+        self.perclos_time_period = config['perclos_time_period']
+        self.audio_files = audio_paths(config, self.audio_dir)
 
+    def reload_config(self, config=None):
+        """Validate config (or re-read the file), decode its sounds and swap it in before the next frame.
+
+        Safe to call from another thread (see config_watcher): the detection loop only
+        picks up the finished config, the PERCLOS window and timers are kept. Raises
+        OSError / ValueError and keeps the current config when the new one is unusable.
+        """
+        config = read_perclos_config() if config is None else validate_perclos_config(config)
+        self.alert_player.load(audio_paths(config, self.audio_dir))
+        self.set_pending_config(config)
+        return config
+
+    def set_pending_config(self, config):
+        """reload_config for a config that is already validated and whose sounds are loaded"""
+        self.pending_config = config
 
     def play_alert(self, alert_type):
         """Play alert sound once per condition per PERCLOS period"""
+        sleeping_onset = alert_type == 'Sleeping' and self.last_alert_type != 'Sleeping'
+        self.last_alert_type = alert_type
         # Only play if not awake and haven't played this specific alert this period yet
-        if alert_type != 'Awake' and alert_type not in self.alerts_played_this_period and alert_type in self.audio_files:
-            try:
-                pygame.mixer.music.load(self.audio_files[alert_type])
-                pygame.mixer.music.play()
-                # If it is sleeping, dont mark other alerts as played
-                if alert_type == 'Sleeping':
-                    pass
-                else:
-                    self.alerts_played_this_period.add(alert_type)  # Mark this alert as played
-                if self.verbose:
-                    print(f"Playing alert: {alert_type}")
-            except Exception as e:
-                print(f"Error playing audio: {e}")
+        if not alert_type or alert_type == 'Awake' or alert_type in self.alerts_played_this_period:
+            return
+        # listeners see the alert even when no sound is configured for it; the Sleeping
+        # sound repeats on every frame, but it is one alert until the driver leaves Sleeping
+        if alert_type != 'Sleeping' or sleeping_onset:
+            for listener in self.alert_listeners:
+                listener(alert_type)
+        # If it is sleeping, dont mark other alerts as played
+        if alert_type != 'Sleeping':
+            self.alerts_played_this_period.add(alert_type)  # Mark this alert as played
+        if not self.audio_enabled or alert_type not in self.audio_files:
+            return
+        # only queued here, the hot loop never waits for the file or the mixer
+        if self.alert_player.play(alert_type) and self.verbose:
+            print(f"Playing alert: {alert_type}")
 
 
     def eval_scores(self, t_now, ear_score, gaze_score, head_roll, head_pitch, head_yaw):
@@ -165,20 +232,48 @@ class AttentionScorer:
 
         if self.verbose:  # print additional info if verbose is True
             print(
-                f"ear counter:{self.ear_counter}/{self.ear_act_thresh}\ngaze counter:{self.gaze_counter}/{self.gaze_act_thresh}\npose counter:{self.pose_counter}/{self.pose_act_thresh}")
+                f"eye closed for:{self.closure_time:.2f}/{self.ear_time_thresh}s\nlooking away for:{self.not_look_ahead_time:.2f}/{self.gaze_time_thresh}s\ndistracted for:{self.distracted_time:.2f}/{self.pose_time_thresh}s")
             print(
                 f"eye closed:{asleep}\tlooking away:{looking_away}\tdistracted:{distracted}")
 
         return asleep, looking_away, distracted
 
+    def update_perclos_window(self, t_now, closed):
+        """Add one sample to the sliding window and drop the ones older than the PERCLOS period"""
+        dt = 0. if self.last_sample_time is None else min(max(t_now - self.last_sample_time, 0.), self.max_sample_gap)
+        self.last_sample_time = t_now
+        self.perclos_samples.append((t_now, dt, closed))
+        if closed:
+            self.closed_time += dt
+            self.eye_closure_counter += 1
+        window_start = t_now - self.perclos_time_period
+        while self.perclos_samples and self.perclos_samples[0][0] <= window_start:
+            _, old_dt, old_closed = self.perclos_samples.popleft()
+            if old_closed:
+                self.closed_time -= old_dt
+                self.eye_closure_counter -= 1
+        # fraction of the period the eyes were closed, whatever the frame rate
+        return max(self.closed_time, 0.) / self.perclos_time_period
+
     def get_PERCLOS(self, t_now, fps, ear_score):
+        """Rolling PERCLOS over the last perclos_time_period seconds.
+
+        Each call weighs its sample by the time since the previous call, so the score
+        does not depend on the frame rate or on skipped frames; fps is kept for callers
+        but no longer used.
+        """
+        if self.pending_config is not None:
+            config, self.pending_config = self.pending_config, None
+            self.apply_config(config)
         delta = t_now - self.prev_time  # set delta timer
         tired = ""  # set default value for the tired state of the driver
 
-        all_frames_numbers_in_perclos_duration = int(self.perclos_time_period * fps)
+        closed = (ear_score is not None) and (ear_score <= self.ear_thresh)
+        perclos_score = self.update_perclos_window(t_now, closed)
+        self.blink_analyzer.update(t_now, ear_score)
 
         # Track continuous eye closure
-        if (ear_score is not None) and (ear_score <= self.ear_thresh):
+        if closed:
             if self.continuous_closure_start is None:
                 self.continuous_closure_start = t_now
             
@@ -187,15 +282,10 @@ class AttentionScorer:
             if continuous_closure_time >= self.sleep_threshold:
                 self.play_alert('Sleeping')
                 return "Sleeping", 100.0  # Return immediately with sleeping status
-            
-            self.eye_closure_counter += 1
         else:
             # Eyes are open, reset continuous closure timer
             self.continuous_closure_start = None
 
-        # compute the PERCLOS over a given time period
-        perclos_score = (self.eye_closure_counter) / all_frames_numbers_in_perclos_duration
-        
         # Use dynamic thresholds from config
         if perclos_score < self.perclos_config['semi_closed_max']:
             tired = "Awake"
@@ -211,12 +301,11 @@ class AttentionScorer:
         # Play appropriate alert based on drowsiness level (once per condition per period)
         self.play_alert(tired)
 
-        if delta >= self.perclos_time_period:  # at every end of the given time period, reset the counter and the timer
-            self.eye_closure_counter = 0
+        if delta >= self.perclos_time_period:  # the score rolls on, but every alert may play again once per period
             self.prev_time = t_now
             self.alerts_played_this_period.clear()  # Clear all played alerts for new period
             print("=====================================")
-            print("PERCLOS score reset")
+            print("PERCLOS alerts re-armed")
             print("tired:", tired)
             print("perclos_score:", perclos_score)
             print("=====================================")
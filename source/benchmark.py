@@ -0,0 +1,321 @@
+"""
+Micro-benchmarks for the hot paths of the detector, on synthetic inputs.
+
+Runs without a camera, GPU or dataset: frames are random noise, the Pip_* networks
+use random weights (only their cost matters here) and the training data path reads
+JPEGs written to a temporary folder. FaceBoxes uses the weights shipped in
+FaceBoxesV2/weights, since random detector weights turn every anchor into a face
+and the run would only measure NMS on thousands of boxes.
+
+Results are written as JSON (one record per case with mean/median/p95/min/stdev in
+ms plus the machine and git commit), so runs can be compared across commits and
+hardware:
+    python source/benchmark.py                              # everything, logs/benchmarks/<commit>-<host>.json
+    python source/benchmark.py --filter nms --filter ear    # only matching cases
+    python source/benchmark.py --quick --output bench.json
+    python source/benchmark.py --compare old.json new.json  # speed-up per case
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import cv2
+import numpy as np
+import torch
+
+import model_loader
+from functions import forward_pip, merge_nb_predictions, calculate_aspect_ratio, calculate_aspect_ratio_batch
+
+ROOT_DIR = model_loader.ROOT_DIR
+RESULTS_DIR = os.path.join(ROOT_DIR, 'logs', 'benchmarks')
+DATA_NAME = model_loader.DEFAULT_DATA_NAME
+BACKBONE_EXPERIMENTS = {
+    'resnet18': 'pip_32_16_60_r18_l2_l1_10_1_nb10',
+    'resnet50': 'pip_32_16_60_r50_l2_l1_10_1_nb10',
+    'resnet101': 'pip_32_16_60_r101_l2_l1_10_1_nb10',
+    'mobilenet_v2': 'pip_32_16_60_mbv2_l2_l1_10_1_nb10',
+    'mobilenet_v3': 'pip_32_16_60_mbv3large_l2_l1_10_1_nb10',
+}
+RESOLUTIONS = {'480p': (480, 640), '720p': (720, 1280), '1080p': (1080, 1920)}
+
+
+def measure(fn, setup=None, warmup=3, min_time=1.0, max_iters=1000, min_iters=5):
+    """Call fn until min_time has passed (at least min_iters times), returns per-call stats in ms.
+
+    setup() runs before every call, outside the timed region, and its result is passed to fn.
+    """
+    for _ in range(warmup):
+        fn(setup()) if setup else fn()
+    times = []
+    t_end = time.perf_counter() + min_time
+    while len(times) < max_iters and (len(times) < min_iters or time.perf_counter() < t_end):
+        arg = setup() if setup else None
+        t_start = time.perf_counter()
+        fn(arg) if setup else fn()
+        times.append(time.perf_counter() - t_start)
+    times = np.array(times) * 1000.
+    return {
+        'iterations': int(len(times)),
+        'mean_ms': float(times.mean()),
+        'median_ms': float(np.median(times)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'min_ms': float(times.min()),
+        'stdev_ms': float(times.std()),
+    }
+
+
+class BenchmarkSuite:
+    def __init__(self, filters=(), min_time=1.0, quick=False):
+        self.filters = list(filters)
+        self.min_time = min_time
+        self.quick = quick
+        self.results = []
+        self.rng = np.random.default_rng(0)
+        torch.manual_seed(0)
+
+    def selected(self, name):
+        return not self.filters or any(f in name for f in self.filters)
+
+    def run(self, name, fn, setup=None, **params):
+        if not self.selected(name):
+            return
+        stats = measure(fn, setup, min_time=self.min_time, warmup=1 if self.quick else 3)
+        self.results.append({'name': name, 'params': params, **stats})
+        print("{:<45} {:>10.3f} ms  (median {:.3f}, p95 {:.3f}, n={})".format(
+            name, stats['mean_ms'], stats['median_ms'], stats['p95_ms'], stats['iterations']))
+
+    def frame(self, height, width):
+        return self.rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+    # ------------------------------------------------------------------ detector
+    def bench_prior_box(self):
+        from utils.config import cfg
+        from utils.prior_box import PriorBox
+        for label, (height, width) in RESOLUTIONS.items():
+            # FaceBoxesDetector scales the short side down to 600
+            scale = min(1., 600. / min(height, width))
+            image_size = (int(round(height * scale)), int(round(width * scale)))
+            self.run('prior_box/{}'.format(label), lambda: PriorBox(cfg, image_size=image_size).forward(),
+                     image_size=list(image_size))
+
+    def bench_detector(self):
+        if not any(self.selected('detect/{}'.format(label)) for label in RESOLUTIONS):
+            return
+        detector = model_loader.load_face_detector(torch.device('cpu'))
+        for label, (height, width) in RESOLUTIONS.items():
+            frame = self.frame(height, width)
+            self.run('detect/{}'.format(label), lambda: detector.detect(frame, 0.9, None), resolution=[height, width])
+
+    def bench_nms(self):
+        from utils.nms.cpu_nms import cpu_nms, cpu_soft_nms
+        from utils.nms.py_cpu_nms import py_cpu_nms
+        implementations = {
+            'cpu_nms': lambda dets: cpu_nms(dets, 0.3),
+            'cpu_soft_nms': lambda dets: cpu_soft_nms(dets, Nt=0.3),
+            'py_cpu_nms': lambda dets: py_cpu_nms(dets, 0.3),
+        }
+        if torch.cuda.is_available():
+            try:
+                from utils.nms.gpu_nms import gpu_nms
+                implementations['gpu_nms'] = lambda dets: gpu_nms(dets, 0.3)
+            except ImportError:
+                print("gpu_nms extension not built, skipping it")
+        for num_boxes in ((100, 1000) if self.quick else (100, 1000, 5000)):
+            dets = self.synthetic_detections(num_boxes)
+            for impl_name, impl in implementations.items():
+                # soft-NMS rewrites the boxes in place, every call gets a fresh copy
+                self.run('nms/{}/{}'.format(impl_name, num_boxes), impl, setup=dets.copy, boxes=num_boxes)
+
+    def synthetic_detections(self, num_boxes):
+        """Boxes clustered around a few faces like raw FaceBoxes output, sorted by score"""
+        centers = self.rng.uniform(100, 500, (8, 2))
+        picks = centers[self.rng.integers(0, len(centers), num_boxes)] + self.rng.normal(0, 10, (num_boxes, 2))
+        sizes = self.rng.uniform(60, 140, (num_boxes, 1))
+        scores = self.rng.uniform(0.3, 1.0, num_boxes)
+        dets = np.hstack((picks - sizes/2, picks + sizes/2, scores[:, None])).astype(np.float32)
+        return dets[np.argsort(-scores)]
+
+    # ------------------------------------------------------------------ landmarks
+    def bench_landmarks(self):
+        for backbone, experiment_name in BACKBONE_EXPERIMENTS.items():
+            name = 'forward_pip/{}'.format(backbone)
+            if not self.selected(name) or (self.quick and backbone not in ('resnet18', 'mobilenet_v2')):
+                continue
+            cfg = model_loader.load_experiment_config(DATA_NAME, experiment_name)
+            net = model_loader.build_landmark_net(cfg).eval()
+            _, reverse_index1, reverse_index2, max_len = model_loader.load_meanface(cfg)
+            inputs = torch.randn(1, 3, cfg.input_size, cfg.input_size)
+
+            def forward_and_merge():
+                lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y, _, _ = forward_pip(
+                    net, inputs, None, cfg.input_size, cfg.net_stride, cfg.num_nb)
+                merge_nb_predictions(lms_pred_x[None], lms_pred_y[None], lms_pred_nb_x[None], lms_pred_nb_y[None],
+                                     reverse_index1, reverse_index2, max_len)
+            self.run(name, forward_and_merge, experiment=experiment_name, input_size=cfg.input_size)
+
+    def bench_aspect_ratio(self):
+        lms = self.rng.uniform(0, 1, 32).astype(np.float32)
+        self.run('calculate_aspect_ratio', lambda: calculate_aspect_ratio(lms))
+        for count in (16, 4096):
+            batch = self.rng.uniform(0, 1, (count, 16, 2)).astype(np.float32)
+            self.run('calculate_aspect_ratio_batch/{}'.format(count), lambda batch=batch: calculate_aspect_ratio_batch(batch), faces=count)
+
+    def bench_perclos(self):
+        if not (self.selected('get_PERCLOS') or self.selected('FleetScorer.update')):
+            return
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        from attention_score import AttentionScorer
+        scorer = AttentionScorer(t_now=0., ear_thresh=0.15, gaze_thresh=0.2, perclos_thresh=0.2, roll_thresh=15,
+                                 pitch_thresh=15, yaw_thresh=15, ear_time_thresh=0.2, gaze_time_thresh=0.2,
+                                 pose_time_thresh=4.0, verbose=False)
+        scorer.audio_files = {}
+        ears = self.rng.uniform(0.05, 0.35, 4096)
+        state = {'frame': 0}
+
+        def step():
+            # 30 fps worth of timestamps, eyes closed about a third of the time
+            frame = state['frame'] = state['frame'] + 1
+            scorer.get_PERCLOS(frame / 30., 30, ears[frame % len(ears)])
+        self.run('get_PERCLOS', step)
+
+        from fleet_scorer import FleetScorer
+        drivers = 1000
+        fleet = FleetScorer(drivers, 0., config=scorer.perclos_config)
+        fleet_ears = self.rng.uniform(0.05, 0.35, (64, drivers))
+        fleet_state = {'frame': 0}
+
+        def fleet_step():
+            frame = fleet_state['frame'] = fleet_state['frame'] + 1
+            fleet.update(frame / 30., fleet_ears[frame % len(fleet_ears)])
+        self.run('FleetScorer.update/{}'.format(drivers), fleet_step, drivers=drivers)
+
+    # ------------------------------------------------------------------ training data
+    def bench_gen_target(self):
+        from data_utils import gen_target_pip
+        cfg = model_loader.load_experiment_config(DATA_NAME, model_loader.DEFAULT_EXPERIMENT_NAME)
+        meanface_indices = model_loader.load_meanface(cfg)[0]
+        map_size = cfg.input_size // cfg.net_stride
+        target = self.rng.uniform(0, 1, cfg.num_lms * 2)
+
+        def setup():
+            return (np.zeros((cfg.num_lms, map_size, map_size)), np.zeros((cfg.num_lms, map_size, map_size)),
+                    np.zeros((cfg.num_lms, map_size, map_size)), np.zeros((cfg.num_nb*cfg.num_lms, map_size, map_size)),
+                    np.zeros((cfg.num_nb*cfg.num_lms, map_size, map_size)))
+        self.run('gen_target_pip', lambda maps: gen_target_pip(target, meanface_indices, *maps), setup=setup,
+                 num_lms=cfg.num_lms, map_size=map_size)
+
+    def bench_dataset(self):
+        if not self.selected('ImageFolder_pip'):
+            return
+        import torchvision.transforms as transforms
+        from data_utils import ImageFolder_pip
+        cfg = model_loader.load_experiment_config(DATA_NAME, model_loader.DEFAULT_EXPERIMENT_NAME)
+        meanface_indices = model_loader.load_meanface(cfg)[0]
+        normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        transform = transforms.Compose([transforms.ToTensor(), normalize])
+        with tempfile.TemporaryDirectory() as root:
+            imgs = []
+            for idx in range(16):
+                img_name = '{}.jpg'.format(idx)
+                cv2.imwrite(os.path.join(root, img_name), self.frame(cfg.input_size, cfg.input_size))
+                imgs.append((img_name, self.rng.uniform(0.2, 0.8, cfg.num_lms * 2)))
+            # identity flip map, only the cost of the augmentation matters here
+            dataset = ImageFolder_pip(root, imgs, cfg.input_size, cfg.num_lms, cfg.net_stride, list(range(cfg.num_lms)),
+                                      meanface_indices, transform)
+            state = {'index': 0}
+
+            def get_item():
+                state['index'] = (state['index'] + 1) % len(dataset)
+                dataset[state['index']]
+            self.run('ImageFolder_pip.__getitem__', get_item, input_size=cfg.input_size)
+
+    def run_all(self):
+        for bench in (self.bench_prior_box, self.bench_detector, self.bench_nms, self.bench_landmarks,
+                      self.bench_aspect_ratio, self.bench_perclos, self.bench_gen_target, self.bench_dataset):
+            bench()
+        return self.results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine_info():
+    info = {
+        'host': socket.gethostname(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'torch_threads': torch.get_num_threads(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'cuda': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    info['processor'] = line.split(':', 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return info
+
+
+def compare(old_path, new_path):
+    """Print new/old mean time for every case present in both result files"""
+    with open(old_path) as f:
+        old = {r['name']: r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {r['name']: r for r in json.load(f)['results']}
+    print("{:<45} {:>12} {:>12} {:>9}".format('case', 'old ms', 'new ms', 'speed-up'))
+    for name, result in new.items():
+        if name in old:
+            print("{:<45} {:>12.3f} {:>12.3f} {:>8.2f}x".format(
+                name, old[name]['mean_ms'], result['mean_ms'], old[name]['mean_ms'] / max(result['mean_ms'], 1e-9)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths on synthetic inputs')
+    parser.add_argument('--filter', action='append', default=[], help='only run cases whose name contains this')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds spent per case')
+    parser.add_argument('--quick', action='store_true', help='fewer sizes and backbones, shorter runs')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--output', default=None, help='JSON file (default logs/benchmarks/<commit>-<host>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    suite = BenchmarkSuite(args.filter, min_time=0.3 if args.quick else args.min_time, quick=args.quick)
+    with torch.no_grad():
+        results = suite.run_all()
+
+    commit = git_commit()
+    report = {'commit': commit, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'machine': machine_info(),
+              'results': results}
+    output = args.output or os.path.join(RESULTS_DIR, '{}-{}.json'.format(commit or 'nogit', socket.gethostname()))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results written to", output)
+
+
+if __name__ == '__main__':
+    main()
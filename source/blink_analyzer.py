@@ -0,0 +1,158 @@
+"""
+Streaming blink and microsleep statistics over the EAR signal.
+
+PERCLOS says how long the eyes were closed, not how: many short blinks and one
+long microsleep can give the same score, yet blink rate, blink duration and
+closures of half a second or more are the earlier fatigue signs. BlinkAnalyzer
+consumes (t, EAR) samples, finds every closure (EAR at or below ear_thresh, from
+the first closed sample to the first open one) and sorts it by duration:
+
+    < min_blink                   noise (a single bad landmark frame), ignored
+    min_blink .. microsleep_min   blink
+    >= microsleep_min             microsleep
+
+Statistics are kept for several horizons at once (1, 5 and 15 minutes by default)
+in constant memory: a ring of one-second bins covering the longest horizon holds
+the per-bin sums (observed time, blink count and duration, microsleep count and
+duration, closure-duration histogram), and a running total per horizon gains each
+event once and loses a bin when it slides out of that horizon. A frame only costs
+a few comparisons; bin and event bookkeeping happens once per second or per event,
+and stats() is O(1) in the history length.
+
+Time without a face or with a sample gap longer than max_gap is not observed time,
+and a closure it interrupts is discarded, so rates are per minute of watched driver.
+"""
+
+import math
+
+import numpy as np
+
+DEFAULT_HORIZONS = (60, 300, 900)
+# closure duration histogram edges in seconds, the last bucket is open-ended
+DEFAULT_EDGES = (0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0)
+
+OBSERVED, BLINKS, BLINK_TIME, MICROSLEEPS, MICROSLEEP_TIME = range(5)
+
+
+class BlinkAnalyzer:
+    def __init__(self, ear_thresh=0.15, horizons=DEFAULT_HORIZONS, bin_seconds=1.0, min_blink=0.05,
+                 microsleep_min=0.5, max_gap=1.0, edges=DEFAULT_EDGES):
+        self.ear_thresh = ear_thresh
+        self.horizons = tuple(horizons)
+        self.bin_seconds = bin_seconds
+        self.min_blink = min_blink
+        self.microsleep_min = microsleep_min
+        self.max_gap = max_gap
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.horizon_bins = [int(math.ceil(horizon / bin_seconds)) for horizon in self.horizons]
+        self.num_bins = max(self.horizon_bins)
+        num_fields = MICROSLEEP_TIME + 1 + len(self.edges)
+        self.bins = np.zeros((self.num_bins, num_fields))
+        self.totals = np.zeros((len(self.horizons), num_fields))
+        self.current_bin = None
+        self.current_observed = 0.  # observed time of the current bin, flushed when the bin ends
+        self.last_time = None
+        self.closure_start = None
+        self.wait_open = True  # a closure already under way when observation starts has no start time
+        self.blinks = 0
+        self.microsleeps = 0
+
+    def reset(self):
+        self.bins[:] = 0.
+        self.totals[:] = 0.
+        self.current_bin = None
+        self.current_observed = 0.
+        self.last_time = None
+        self.closure_start = None
+        self.wait_open = True
+
+    def _advance(self, bin_no):
+        """Move the ring to absolute bin bin_no, sliding old bins out of every horizon"""
+        if self.current_bin is None:
+            self.current_bin = bin_no
+            return
+        self._flush()
+        if bin_no - self.current_bin >= self.num_bins:
+            # nothing recent left in any horizon
+            self.bins[:] = 0.
+            self.totals[:] = 0.
+            self.current_bin = bin_no
+            return
+        for entering in range(self.current_bin + 1, bin_no + 1):
+            for horizon_idx, horizon_bins in enumerate(self.horizon_bins):
+                leaving = entering - horizon_bins
+                self.totals[horizon_idx] -= self.bins[leaving % self.num_bins]
+            self.bins[entering % self.num_bins] = 0.
+        self.current_bin = bin_no
+
+    def _flush(self):
+        if self.current_observed:
+            self.bins[self.current_bin % self.num_bins, OBSERVED] += self.current_observed
+            self.totals[:, OBSERVED] += self.current_observed
+            self.current_observed = 0.
+
+    def _record(self, duration):
+        if duration < self.min_blink:
+            return None
+        row = np.zeros(self.bins.shape[1])
+        if duration < self.microsleep_min:
+            event = 'blink'
+            row[BLINKS], row[BLINK_TIME] = 1, duration
+            self.blinks += 1
+        else:
+            event = 'microsleep'
+            row[MICROSLEEPS], row[MICROSLEEP_TIME] = 1, duration
+            self.microsleeps += 1
+        row[MICROSLEEP_TIME + 1 + max(int(np.searchsorted(self.edges, duration, side='right')) - 1, 0)] = 1
+        self.bins[self.current_bin % self.num_bins] += row
+        self.totals += row
+        return event
+
+    def update(self, t_now, ear_score):
+        """Add one sample (ear_score None when no face); returns 'blink' / 'microsleep' when a closure just ended"""
+        bin_no = int(t_now // self.bin_seconds)
+        if self.current_bin is None or bin_no > self.current_bin:
+            self._advance(bin_no)
+        gap = None if self.last_time is None else t_now - self.last_time
+        self.last_time = t_now
+        if ear_score is None or gap is None or gap > self.max_gap or gap < 0:
+            # unobserved stretch: whatever closure was going on cannot be measured
+            self.closure_start = None
+            self.wait_open = True
+            if ear_score is None:
+                return None
+        else:
+            self.current_observed += gap
+        if ear_score <= self.ear_thresh:
+            if self.closure_start is None and not self.wait_open:
+                self.closure_start = t_now
+            return None
+        self.wait_open = False
+        if self.closure_start is None:
+            return None
+        duration = t_now - self.closure_start
+        self.closure_start = None
+        return self._record(duration)
+
+    def stats(self):
+        """{horizon seconds: blink rate, mean blink duration, microsleeps, closure histogram, ...}"""
+        result = {}
+        for horizon, totals in zip(self.horizons, self.totals):
+            observed = totals[OBSERVED] + self.current_observed
+            blinks = int(round(totals[BLINKS]))
+            microsleeps = int(round(totals[MICROSLEEPS]))
+            result[horizon] = {
+                'observed_s': observed,
+                'blinks': blinks,
+                'blink_rate_per_min': blinks * 60. / observed if observed > 0 else None,
+                'mean_blink_ms': totals[BLINK_TIME] * 1000. / blinks if blinks else None,
+                'microsleeps': microsleeps,
+                'microsleep_s': totals[MICROSLEEP_TIME],
+                'closure_histogram': [int(round(count)) for count in totals[MICROSLEEP_TIME + 1:]],
+            }
+        return result
+
+    def histogram_labels(self):
+        """Bucket labels matching stats()[...]['closure_histogram']"""
+        bounds = [int(edge * 1000) for edge in self.edges]
+        return ['{}-{} ms'.format(low, high) for low, high in zip(bounds, bounds[1:])] + ['>={} ms'.format(bounds[-1])]
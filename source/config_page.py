@@ -1,6 +1,7 @@
 import streamlit as st
 import json
 import os
+import tempfile
 
 class ConfigManager:
     """Manages configuration for PERCLOS thresholds"""
@@ -42,12 +43,19 @@ class ConfigManager:
             self.config = self.default_config.copy()
     
     def save_config(self):
-        """Save configuration to file"""
+        """Save configuration to file, atomically: a running detector reloads it as soon as it changes"""
+        tmp_file = None
         try:
-            with open(self.config_file, 'w') as f:
+            fd, tmp_file = tempfile.mkstemp(prefix='.perclos_config.', suffix='.tmp', dir=os.path.dirname(self.config_file))
+            with os.fdopen(fd, 'w') as f:
                 json.dump(self.config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.config_file)
             return True
         except Exception as e:
+            if tmp_file is not None and os.path.exists(tmp_file):
+                os.remove(tmp_file)
             st.error(f"Error saving config: {e}")
             return False
     
@@ -456,7 +464,7 @@ def create_config_page():
         
         - Each threshold must be higher than the previous one
         - The system automatically enforces minimum values to maintain logical progression
-        - Changes will take effect in the main application after saving
+        - Changes are picked up by a running detector within a second of saving, without reloading the models
         - PERCLOS scores are calculated as a percentage over a time period
         
         ### Recommended Values:
@@ -476,9 +484,12 @@ def create_config_page():
         PERCLOS (Percentage of Eye Closure) is calculated as:
         
         ```
-        PERCLOS = (Number of frames with closed eyes / Total frames in time period) × 100
+        PERCLOS = Time with closed eyes in the last time period / Time period
         ```
         
+        The window slides with every frame, so the score does not depend on the frame rate
+        and does not drop to zero when a period ends.
+        
         ### Detection Parameters:
         
         - **EAR Threshold (Eye Aspect Ratio)**: 
@@ -515,6 +526,80 @@ def create_config_page():
         - Sleeping alert can play multiple times
         """)
 
+    with st.expander("🎯 Threshold Tuner", expanded=False):
+        # the tuner pulls in the scorer modules, only import them when the section is opened
+        import numpy as np
+        import pandas as pd
+        from threshold_tuner import (DEFAULT_BAND_SCALES, DEFAULT_PERIODS, DEFAULT_SLEEP_THRESHOLDS, config_for,
+                                     load_trace, parse_events, rank, tune)
+        st.markdown("Replay a recorded EAR trace (a frame log directory, see `frame_log.py`, or a CSV with `t` and "
+                    "`ear` columns) against every combination of the values below and rank them by the labelled "
+                    "drowsy events they catch, the alerts they raise outside of them and how early they alert.")
+        trace_source = st.text_input("Frame log directory or CSV file", value="logs/frames", key="tuner_trace")
+        events_text = st.text_area("Labelled drowsy events", key="tuner_events",
+                                   placeholder="start,end  (seconds from the start of the trace, one event per line)")
+        # band scales whose thresholds still fit the sliders above
+        slider_limits = {'semi_closed_max': 10.0, 'moderately_drowsy_max': 20.0, 'drowsy_max': 25.0,
+                         'very_drowsy_max': 30.0, 'sleeping_min': 40.0}
+        max_scale = min((limit / config[key] for key, limit in slider_limits.items() if config.get(key, 0) > 0), default=3.0)
+        scale_options = [scale for scale in (0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0) if scale <= max_scale]
+        tune_col1, tune_col2 = st.columns(2)
+        with tune_col1:
+            ear_range = st.slider("EAR thresholds", min_value=0.01, max_value=0.5, value=(0.05, 0.3), step=0.01, key="tuner_ear_range")
+            sleep_choices = st.multiselect("Sleep thresholds (seconds)", [1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 7.5, 10.0],
+                                           default=list(DEFAULT_SLEEP_THRESHOLDS), key="tuner_sleep")
+        with tune_col2:
+            period_choices = st.multiselect("PERCLOS periods (seconds)", list(range(10, 125, 5)),
+                                            default=list(DEFAULT_PERIODS), key="tuner_periods")
+            band_choices = st.multiselect("Band scales (times the thresholds above)", scale_options,
+                                          default=[scale for scale in DEFAULT_BAND_SCALES if scale in scale_options], key="tuner_bands")
+        tolerance = st.number_input("Seconds after an event an alert still counts", min_value=0.0, max_value=60.0, value=5.0, step=1.0)
+        if st.button("▶️ Run Tuner", use_container_width=True):
+            try:
+                t, ear = load_trace(trace_source)
+                events = parse_events(events_text) if events_text.strip() else None
+                ear_thresholds = np.round(np.arange(ear_range[0], ear_range[1] + 0.005, 0.01), 2)
+                with st.spinner("Replaying {} samples...".format(len(t))):
+                    results = tune(t, ear, events, base_config=config, ear_thresholds=ear_thresholds,
+                                   sleep_thresholds=sorted(sleep_choices), periods=sorted(period_choices),
+                                   band_scales=sorted(band_choices), tolerance=tolerance)
+                st.session_state['tuner_results'] = results[rank(results)]
+                st.session_state['tuner_summary'] = "{} configurations, {} samples ({:.1f} min), {} events".format(
+                    len(results), len(t), (t[-1] - t[0]) / 60., 0 if events is None else len(events))
+            except (OSError, ValueError, IndexError) as e:
+                st.error(f"❌ Tuning failed: {e}")
+        ranked = st.session_state.get('tuner_results')
+        if ranked is not None and len(ranked):
+            st.caption(st.session_state.get('tuner_summary', ''))
+            st.dataframe(pd.DataFrame(ranked[:25]), use_container_width=True)
+            best = ranked[0]
+            if st.button("✅ Apply Best Configuration", use_container_width=True):
+                config_manager.update_config(config_for(config, best['ear_thresh'], best['sleep_threshold'],
+                                                        best['perclos_time_period'], best['band_scale']))
+                if config_manager.save_config():
+                    # the sliders keep their own state, let them pick up the saved values
+                    for key in ('awake_max', 'semi_closed_max', 'moderately_drowsy_max', 'drowsy_max', 'very_drowsy_max',
+                                'ear_thresh', 'sleep_threshold', 'perclos_time_period'):
+                        st.session_state.pop(key, None)
+                    st.success("✅ Best configuration saved!")
+                    st.rerun()
+
+    with st.expander("⏱️ Runtime Profiling", expanded=False):
+        # the detection page runs in this process; open this page in a second tab,
+        # any click on the detection page restarts its loop
+        from profiling import DEFAULT_FRAMES, get_window
+        window = get_window()
+        st.markdown("Record a `torch.profiler` trace of the next frames of the running detection loop, "
+                    "saved as a Chrome trace to `logs/profiles/`.")
+        profile_frames = st.number_input("Frames to profile", min_value=1, max_value=1000, value=DEFAULT_FRAMES, step=10)
+        if st.button("▶️ Start Profiling", use_container_width=True):
+            window.arm(profile_frames)
+            st.success(f"✅ Profiling the next {profile_frames} frames")
+        if window.active:
+            st.info("Recording...")
+        if window.last_trace:
+            st.caption(f"Last trace: {window.last_trace}")
+
 
 if __name__ == "__main__":
     create_config_page()
@@ -0,0 +1,97 @@
+"""
+Live reload of perclos_config.json into running scorers.
+
+A ConfigWatcher thread stats the config file every `interval` seconds (a single
+os.stat, no inotify dependency). When its mtime or size changes the file is
+parsed and validated off the detection loop and the alert sounds of the new config
+are decoded into the shared alert player, once however many scorers are registered.
+Every AttentionScorer (or FleetScorer) then gets the finished config through
+set_pending_config() and swaps it in before its next frame. Models, PERCLOS window and
+timers are kept, so thresholds can be tuned on the configuration page while the
+detector runs. A file that fails to parse or validate is reported and ignored,
+the scorers keep their current config until the next change.
+
+ConfigManager.save_config writes the file atomically (temporary file + rename),
+so the watcher never reads half a file.
+
+Usage:
+    get_watcher().add(scorer)
+"""
+
+import os
+import threading
+import weakref
+
+from alert_player import get_player
+from attention_score import PERCLOS_CONFIG_FILE, audio_paths, read_perclos_config
+
+
+class ConfigWatcher:
+    def __init__(self, config_file=PERCLOS_CONFIG_FILE, interval=1.0):
+        self.config_file = config_file
+        self.interval = interval
+        self.scorers = weakref.WeakSet()  # a stream that is removed takes its scorer with it
+        self.stamp = self._stamp()
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def add(self, scorer):
+        """Keep scorer up to date with the file, starts the polling thread on first use"""
+        with self.lock:
+            self.scorers.add(scorer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+                self.thread.start()
+
+    def check(self):
+        """Reload the scorers if the file changed since the last check, returns True when it did"""
+        stamp = self._stamp()
+        if stamp is None or stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        try:
+            config = read_perclos_config(self.config_file)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            self.last_error = str(e)
+            print(f"PERCLOS config not reloaded: {e}")
+            return False
+        get_player().load(audio_paths(config))
+        for scorer in list(self.scorers):
+            scorer.set_pending_config(config)
+        self.reloads += 1
+        print(f"PERCLOS configuration reloaded into {len(self.scorers)} scorer(s)")
+        return True
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher():
+    """Process-wide watcher, one stat per interval however many streams are scored"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ConfigWatcher()
+        return _watcher
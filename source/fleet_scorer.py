@@ -0,0 +1,204 @@
+"""
+PERCLOS scoring of many drivers at once, state held as arrays.
+
+One AttentionScorer per driver means one Python object, one deque and a chain of
+branches per driver and frame. FleetScorer keeps the same state for N drivers in
+NumPy arrays (window ring buffers, closed-time sums, continuous-closure starts,
+alerts-played bitmasks) and update() scores every driver in one call, with the
+semantics of AttentionScorer.get_PERCLOS:
+
+    - each sample is weighted by the time since the driver's previous one (capped
+      at max_sample_gap), PERCLOS is the closed fraction of the last
+      perclos_time_period seconds
+    - eyes closed continuously for sleep_threshold seconds report Sleeping (100.0)
+      and skip the rest, as the scalar early return does
+    - the levels of perclos_config, each alert once per period; Sleeping is not
+      limited per period but reaches the listeners once per onset
+
+test_fleet_scorer.py checks it sample for sample against AttentionScorer. Sounds
+are not played here: a fleet server is headless, alerts go to alert_listeners as
+(driver, alert_type).
+
+Usage:
+    fleet = FleetScorer(num_drivers, t_now)
+    codes, perclos_scores = fleet.update(t_now, ears)  # ears NaN where no face
+    fleet.status_names(codes)
+"""
+
+import numpy as np
+
+from attention_score import DEFAULT_PERCLOS_CONFIG, PERCLOS_CONFIG_FILE, read_perclos_config, validate_perclos_config
+
+# status codes of update(), index into STATUS_NAMES; '' is a score between two configured levels
+NO_STATUS, AWAKE, SEMI_CLOSED, MODERATELY_DROWSY, DROWSY, SLEEPING = range(6)
+STATUS_NAMES = ('', 'Awake', 'Semi-Closed', 'Moderately Drowsy', 'Drowsy', 'Sleeping')
+# bit of each once-per-period alert in alerts_played; Sleeping is never marked
+ALERT_BITS = {SEMI_CLOSED: 1, MODERATELY_DROWSY: 2, DROWSY: 4}
+
+
+class FleetScorer:
+    def __init__(self, num_drivers, t_now, config=None, capacity=2048, max_sample_gap=1.0):
+        self.num_drivers = num_drivers
+        self.max_sample_gap = max_sample_gap
+        self.alert_listeners = []  # callables invoked with (driver, alert_type)
+        if config is None:
+            try:
+                config = read_perclos_config(PERCLOS_CONFIG_FILE)
+            except (OSError, ValueError) as e:
+                print(f"Error loading PERCLOS config: {e}. Using defaults.")
+                config = DEFAULT_PERCLOS_CONFIG
+        self.pending_config = None
+        self.apply_config(validate_perclos_config(config))
+
+        # per-driver state, as in AttentionScorer
+        self.prev_time = np.full(num_drivers, t_now, dtype=np.float64)
+        self.last_sample_time = np.full(num_drivers, np.nan)
+        self.closed_time = np.zeros(num_drivers)
+        self.eye_closure_counter = np.zeros(num_drivers, dtype=np.int64)
+        self.continuous_closure_start = np.full(num_drivers, np.nan)
+        self.alerts_played = np.zeros(num_drivers, dtype=np.uint8)
+        self.last_codes = np.full(num_drivers, -1, dtype=np.int8)  # status of the previous sample
+        # sliding window: one ring of (t, closed dt) per driver, oldest at head
+        self.sample_times = np.zeros((num_drivers, capacity))
+        self.sample_closed_dt = np.zeros((num_drivers, capacity))
+        self.sample_closed = np.zeros((num_drivers, capacity), dtype=bool)
+        self.head = np.zeros(num_drivers, dtype=np.int64)
+        self.count = np.zeros(num_drivers, dtype=np.int64)
+        self.rows = np.arange(num_drivers)
+
+    def apply_config(self, config):
+        """Take the thresholds of a validated config (see attention_score.validate_perclos_config)"""
+        self.perclos_config = config
+        self.ear_thresh = config['ear_thresh']
+        self.sleep_threshold = config['sleep_threshold']
+        self.perclos_time_period = config['perclos_time_period']
+        # (code, low, high) of the bands checked after Awake, in get_PERCLOS order
+        self.levels = [(SEMI_CLOSED, config['moderately_drowsy_min'], config['moderately_drowsy_max']),
+                       (MODERATELY_DROWSY, config['drowsy_min'], config['drowsy_max']),
+                       (DROWSY, config['very_drowsy_min'], config['very_drowsy_max'])]
+
+    def reload_config(self, config=None):
+        """Same contract as AttentionScorer.reload_config, so a ConfigWatcher can keep the fleet up to date"""
+        config = read_perclos_config() if config is None else validate_perclos_config(config)
+        self.set_pending_config(config)
+        return config
+
+    def set_pending_config(self, config):
+        """reload_config for a config that is already validated"""
+        self.pending_config = config
+
+    @property
+    def capacity(self):
+        return self.sample_times.shape[1]
+
+    def _grow(self):
+        """Double the rings, unrolled so every driver's oldest sample is at index 0"""
+        order = (self.head[:, None] + np.arange(self.capacity)) % self.capacity
+        for name in ('sample_times', 'sample_closed_dt', 'sample_closed'):
+            ring = getattr(self, name)[self.rows[:, None], order]
+            setattr(self, name, np.concatenate([ring, np.zeros_like(ring)], axis=1))
+        self.head[:] = 0
+
+    def _update_window(self, t_now, closed, active):
+        """Vector form of AttentionScorer.update_perclos_window for the active drivers"""
+        first = np.isnan(self.last_sample_time)
+        dt = np.minimum(np.maximum(t_now - self.last_sample_time, 0.), self.max_sample_gap)
+        dt = np.where(first, 0., dt)
+        self.last_sample_time = np.where(active, t_now, self.last_sample_time)
+        if (self.count[active] >= self.capacity).any():
+            self._grow()
+        rows = self.rows[active]
+        tail = (self.head[rows] + self.count[rows]) % self.capacity
+        self.sample_times[rows, tail] = t_now[rows]
+        self.sample_closed_dt[rows, tail] = dt[rows]
+        self.sample_closed[rows, tail] = closed[rows]
+        self.count[rows] += 1
+        add = active & closed
+        self.closed_time[add] += dt[add]
+        self.eye_closure_counter[add] += 1
+        window_start = t_now - self.perclos_time_period
+        while True:
+            # drivers whose oldest sample left the window; one pass per sample, usually a single one
+            oldest = self.sample_times[self.rows, self.head]
+            expired = active & (self.count > 0) & (oldest <= window_start)
+            if not expired.any():
+                break
+            rows = self.rows[expired]
+            was_closed = self.sample_closed[rows, self.head[rows]]
+            self.closed_time[rows[was_closed]] -= self.sample_closed_dt[rows[was_closed], self.head[rows[was_closed]]]
+            self.eye_closure_counter[rows[was_closed]] -= 1
+            self.head[rows] = (self.head[rows] + 1) % self.capacity
+            self.count[rows] -= 1
+        return np.maximum(self.closed_time, 0.) / self.perclos_time_period
+
+    def update(self, t_now, ear_scores, active=None):
+        """Score one sample per driver; returns (status codes, PERCLOS scores) for all drivers.
+
+        t_now is one time or one per driver, ear_scores one EAR per driver (NaN for
+        None: no face, counted as open). Drivers outside the boolean mask active are
+        left untouched, like a scorer that is not called, and report NO_STATUS / NaN.
+        """
+        if self.pending_config is not None:
+            config, self.pending_config = self.pending_config, None
+            self.apply_config(config)
+        t_now = np.broadcast_to(np.asarray(t_now, dtype=np.float64), (self.num_drivers,))
+        ear_scores = np.asarray(ear_scores, dtype=np.float64)
+        active = np.ones(self.num_drivers, dtype=bool) if active is None else np.asarray(active, dtype=bool)
+
+        with np.errstate(invalid='ignore'):
+            closed = ear_scores <= self.ear_thresh  # NaN compares False
+        perclos_scores = self._update_window(t_now, closed, active)
+
+        # continuous closure; a driver asleep long enough reports Sleeping and stops there
+        started = active & closed & np.isnan(self.continuous_closure_start)
+        self.continuous_closure_start[started] = t_now[started]
+        self.continuous_closure_start[active & ~closed] = np.nan
+        asleep = active & closed & (t_now - self.continuous_closure_start >= self.sleep_threshold)
+        scored = active & ~asleep
+
+        config = self.perclos_config
+        codes = np.full(self.num_drivers, NO_STATUS, dtype=np.int8)
+        undecided = scored.copy()
+        awake = undecided & (perclos_scores < config['semi_closed_max'])
+        codes[awake] = AWAKE
+        undecided &= ~awake
+        for code, low, high in self.levels:
+            hit = undecided & (perclos_scores >= low) & (perclos_scores <= high)
+            codes[hit] = code
+            undecided &= ~hit
+        codes[undecided & (perclos_scores > config['sleeping_min'])] = SLEEPING
+
+        self._alerts(np.where(asleep, SLEEPING, codes), active)
+
+        # alerts re-arm once per period, drivers in the early Sleeping return keep their timer
+        rearm = scored & (t_now - self.prev_time >= self.perclos_time_period)
+        self.prev_time[rearm] = t_now[rearm]
+        self.alerts_played[rearm] = 0
+
+        codes[asleep] = SLEEPING
+        perclos_scores = np.where(asleep, 100.0, perclos_scores)
+        perclos_scores = np.where(active, perclos_scores, np.nan)
+        return codes, perclos_scores
+
+    def _alerts(self, codes, active):
+        """play_alert for every driver: once per period per level, Sleeping when it starts"""
+        bits = np.zeros(self.num_drivers, dtype=np.uint8)
+        for code, bit in ALERT_BITS.items():
+            bits[codes == code] = bit
+        onset = (codes != SLEEPING) | (self.last_codes != SLEEPING)
+        self.last_codes[active] = codes[active]
+        fire = active & (codes >= SEMI_CLOSED) & ((self.alerts_played & bits) == 0) & onset
+        if not fire.any():
+            return
+        self.alerts_played[fire] |= bits[fire]
+        for driver in np.flatnonzero(fire):
+            for listener in self.alert_listeners:
+                listener(int(driver), STATUS_NAMES[codes[driver]])
+
+    def perclos(self):
+        """Current PERCLOS of every driver, without adding a sample"""
+        return np.maximum(self.closed_time, 0.) / self.perclos_time_period
+
+    @staticmethod
+    def status_names(codes):
+        return [STATUS_NAMES[code] for code in codes]
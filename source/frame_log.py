@@ -0,0 +1,232 @@
+"""
+Compact binary log of the per-frame results, read back through memory maps.
+
+Every processed frame becomes one fixed-size record (RECORD_DTYPE, 92 bytes):
+wall-clock time, stream number, status code, face flag, face box, the eye
+landmarks as float16 normalised to the box (up to 16 points, the eye contours of
+the model's landmark_schema, NaN padded), EAR and PERCLOS. A day of 30 fps
+driving is about 80 MB, so weeks of cab data fit on the device.
+
+FrameLogWriter.append() only fills a row of a preallocated chunk; full chunks (or
+whatever is there every flush_interval seconds) go to a background thread that
+appends them to the current file, starts a new file past max_bytes and deletes
+the oldest files past max_total_bytes.
+
+Files are a 16-byte header (magic, record size) followed by the raw records, so
+read_log() maps them with np.memmap and hands back a structured array without
+parsing anything; a record cut short by a power loss is ignored.
+
+Usage:
+    python source/frame_log.py logs/frames                  # summary of every file
+    python source/frame_log.py logs/frames --csv out.csv    # export
+"""
+
+import os
+import sys
+import glob
+import time
+import queue
+import struct
+import argparse
+import threading
+
+import numpy as np
+
+MAGIC = b'DDDFRM01'
+HEADER = struct.Struct('<8sII')  # magic, record size, reserved
+MAX_EYE_POINTS = 16
+
+RECORD_DTYPE = np.dtype([
+    ('t', '<f8'),                                   # time.time() of the frame
+    ('stream', '<u2'),
+    ('status', 'u1'),                               # index into STATUS_NAMES
+    ('flags', 'u1'),                                # FACE when a driver was found
+    ('box', '<i2', (4,)),                           # xmin, ymin, xmax, ymax in frame pixels
+    ('landmarks', '<f2', (MAX_EYE_POINTS, 2)),      # eye points normalised to the box
+    ('ear', '<f4'),
+    ('perclos', '<f4'),
+])
+
+FACE = 1
+# same codes as fleet_scorer
+STATUS_NAMES = ('', 'Awake', 'Semi-Closed', 'Moderately Drowsy', 'Drowsy', 'Sleeping')
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+
+class FrameLogWriter:
+    def __init__(self, log_dir, prefix='frames', chunk_records=1024, flush_interval=2.0,
+                 max_bytes=64 << 20, max_total_bytes=None, schema=None):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes              # per file
+        self.max_total_bytes = max_total_bytes  # of all files, oldest deleted first (None keeps everything)
+        self.eye_index = None if schema is None or not schema.has_eyes else schema.eyes.ravel()[:MAX_EYE_POINTS]
+        self.chunk_records = chunk_records
+        self.chunk = np.zeros(chunk_records, dtype=RECORD_DTYPE)
+        self.filled = 0
+        self.t_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.file = None
+        self.path = None
+        self.file_seq = 0
+        self.records_written = 0
+        os.makedirs(log_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name='frame-log', daemon=True)
+        self.thread.start()
+
+    def append(self, stream=0, status='', face=None, ear=None, perclos=None, t_now=None):
+        """Log one frame; face is a landmark_pipeline.FaceResult (the driver) or None"""
+        with self.lock:
+            row = self.chunk[self.filled]
+            row['t'] = time.time() if t_now is None else t_now
+            row['stream'] = stream
+            row['status'] = STATUS_CODES.get(status or '', 0)
+            row['ear'] = np.nan if ear is None else ear
+            row['perclos'] = np.nan if perclos is None else perclos
+            if face is not None:
+                row['flags'] = FACE
+                row['box'] = face.box
+                points = face.lms_pred_merge.reshape(-1, 2)
+                points = points[self.eye_index] if self.eye_index is not None else points[:MAX_EYE_POINTS]
+                row['landmarks'][:len(points)] = points
+                row['landmarks'][len(points):] = np.nan
+            else:
+                row['flags'] = 0
+                row['box'] = 0
+                row['landmarks'] = np.nan
+            self.filled += 1
+            if self.filled == self.chunk_records or time.monotonic() - self.t_flush >= self.flush_interval:
+                self._hand_over()
+
+    def _hand_over(self):
+        """Queue the filled part of the chunk for the writer thread (lock held)"""
+        if self.filled:
+            self.queue.put(self.chunk[:self.filled].copy())
+            self.filled = 0
+        self.t_flush = time.monotonic()
+
+    def flush(self):
+        """Queue what is buffered and wait until it is on disk"""
+        with self.lock:
+            self._hand_over()
+        self.queue.join()
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+    def _open(self):
+        self.file_seq += 1
+        name = '{}-{}-{:04d}.bin'.format(self.prefix, time.strftime('%Y%m%d-%H%M%S'), self.file_seq)
+        self.path = os.path.join(self.log_dir, name)
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, RECORD_DTYPE.itemsize, 0))
+
+    def _rotate_if_needed(self, incoming):
+        if self.file is None or self.file.tell() + incoming > self.max_bytes:
+            if self.file is not None:
+                self.file.close()
+            self._open()
+            self._prune()
+
+    def _prune(self):
+        if self.max_total_bytes is None:
+            return
+        files = log_files(self.log_dir, self.prefix)
+        total = sum(os.path.getsize(path) for path in files)
+        # leave room for the file just started to fill up
+        for path in files:
+            if total + self.max_bytes <= self.max_total_bytes or path == self.path:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def _run(self):
+        while True:
+            records = self.queue.get()
+            try:
+                if records is None:
+                    if self.file is not None:
+                        self.file.close()
+                    return
+                self._rotate_if_needed(records.nbytes)
+                self.file.write(records.tobytes())
+                self.file.flush()
+                self.records_written += len(records)
+            except OSError as e:
+                print(f"Frame log write failed: {e}")
+            finally:
+                self.queue.task_done()
+
+
+def log_files(log_dir, prefix='frames'):
+    """Log files of log_dir, oldest first"""
+    return sorted(glob.glob(os.path.join(log_dir, prefix + '-*.bin')))
+
+
+def read_log(path):
+    """Memory-mapped structured array (RECORD_DTYPE) of one file, nothing is read until it is indexed"""
+    with open(path, 'rb') as f:
+        magic, record_size, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError('{} is not a frame log of this version'.format(path))
+    count = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+
+def load_logs(log_dir, prefix='frames', t_start=None, t_end=None, stream=None):
+    """Records of every file in log_dir, optionally only [t_start, t_end) and one stream, as one array"""
+    parts = []
+    for path in log_files(log_dir, prefix):
+        records = read_log(path)
+        if len(records) == 0:
+            continue
+        # files hold increasing times, skip whole files outside the range
+        if (t_start is not None and records['t'][-1] < t_start) or (t_end is not None and records['t'][0] >= t_end):
+            continue
+        mask = np.ones(len(records), dtype=bool)
+        if t_start is not None:
+            mask &= records['t'] >= t_start
+        if t_end is not None:
+            mask &= records['t'] < t_end
+        if stream is not None:
+            mask &= records['stream'] == stream
+        parts.append(records[mask])
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD_DTYPE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise or export frame logs')
+    parser.add_argument('log_dir')
+    parser.add_argument('--prefix', default='frames')
+    parser.add_argument('--csv', help='write t, stream, status, face, box, ear and perclos as CSV')
+    args = parser.parse_args()
+
+    for path in log_files(args.log_dir, args.prefix):
+        records = read_log(path)
+        if len(records) == 0:
+            print("{}: empty".format(os.path.basename(path)))
+            continue
+        statuses = np.bincount(records['status'], minlength=len(STATUS_NAMES))
+        print("{}: {} frames, {:.0f} s, face in {:.0%}, {}".format(
+            os.path.basename(path), len(records), records['t'][-1] - records['t'][0],
+            np.mean(records['flags'] & FACE > 0),
+            ", ".join("{} {}".format(STATUS_NAMES[code] or '-', count) for code, count in enumerate(statuses) if count)))
+    if args.csv:
+        records = load_logs(args.log_dir, args.prefix)
+        with open(args.csv, 'w') as f:
+            f.write('t,stream,status,face,xmin,ymin,xmax,ymax,ear,perclos\n')
+            for record in records:
+                f.write('{:.3f},{},{},{},{},{},{},{},{:.4f},{:.4f}\n'.format(
+                    record['t'], record['stream'], STATUS_NAMES[record['status']], int(record['flags'] & FACE),
+                    *record['box'], record['ear'], record['perclos']))
+        print("{} frames written to {}".format(len(records), args.csv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
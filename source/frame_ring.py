@@ -0,0 +1,263 @@
+"""
+Zero-copy frame transport between a capture process and inference processes.
+
+Frames live in a fixed number of slots of one multiprocessing.shared_memory block.
+The capture process reads from OpenCV directly into a slot and publishes it with a
+sequence number, readers wrap the slot in a NumPy array (torch.from_numpy on top of
+it is zero-copy as well) instead of unpickling a 2.7 MB frame per message.
+
+A reader pins the slot it is working on, the (single) writer never reuses a pinned
+slot, so a pinned frame stays intact until the reader asks for the next one. Pinning
+and claiming a slot are a store followed by a load on each side, which the CPU may
+reorder over plain shared memory, so both (and the commit of a frame) take a
+multiprocessing lock; it is held for a few header reads and writes, never while a
+frame is decoded or processed.
+
+RingCapture mimics the parts of cv2.VideoCapture the app uses, so the capture side of
+app.play_webcam (or any other loop) can switch to it without other changes.
+"""
+
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# header layout (int64)
+LATEST_SEQ = 0
+LATEST_SLOT = 1
+DROPPED = 2
+STATE = 3
+CAPTURE_WIDTH = 4
+CAPTURE_HEIGHT = 5
+CAPTURE_FPS_X1000 = 6
+HEADER_LEN = 8
+
+STATE_STARTING = 0
+STATE_RUNNING = 1
+STATE_STOPPED = 2
+
+
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class SharedFrameRing:
+    """Fixed-slot frame ring buffer in shared memory (one writer, up to max_readers readers)"""
+    def __init__(self, shape=(720, 1280, 3), n_slots=4, max_readers=1, name=None, create=True, lock=None):
+        self.shape = tuple(shape)
+        self.n_slots = n_slots
+        self.max_readers = max_readers
+        frame_bytes = int(np.prod(self.shape))
+
+        header_bytes = 8 * (HEADER_LEN + max_readers + 2 * n_slots)
+        frames_offset = _align(header_bytes)
+        size = frames_offset + n_slots * frame_bytes
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = create
+        self.lock = mp.Lock() if lock is None else lock
+
+        buf = self.shm.buf
+        offset = 0
+        self.header = np.ndarray((HEADER_LEN,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * HEADER_LEN
+        self.pins = np.ndarray((max_readers,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * max_readers
+        self.slot_seq = np.ndarray((n_slots,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * n_slots
+        self.slot_time = np.ndarray((n_slots,), dtype=np.float64, buffer=buf, offset=offset)
+        self.frames = np.ndarray((n_slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=frames_offset)
+
+        if create:
+            self.header[:] = 0
+            self.header[LATEST_SLOT] = -1
+            self.pins[:] = -1
+            self.slot_seq[:] = 0
+            self.slot_time[:] = 0.
+        self._write_slot = -1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        """Description to attach() from another process, pass it in the mp.Process args (the lock is inherited)"""
+        return {'name': self.name, 'shape': self.shape, 'n_slots': self.n_slots, 'max_readers': self.max_readers,
+                'lock': self.lock}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec['shape'], spec['n_slots'], spec['max_readers'], name=spec['name'], create=False, lock=spec['lock'])
+
+    # writer side
+    def acquire(self):
+        """Return a free slot index to write into, or None (frame dropped) if every slot is pinned"""
+        with self.lock:
+            for k in range(1, self.n_slots + 1):
+                slot = (self._write_slot + k) % self.n_slots
+                if slot in self.pins:
+                    continue
+                # the newest frame may live here (every other slot pinned), hide it from readers
+                self.slot_seq[slot] = -1
+                self._write_slot = slot
+                return slot
+            self.header[DROPPED] += 1
+            return None
+
+    def commit(self, slot, t):
+        with self.lock:
+            seq = self.header[LATEST_SEQ] + 1
+            self.slot_time[slot] = t
+            self.slot_seq[slot] = seq
+            self.header[LATEST_SLOT] = slot
+            self.header[LATEST_SEQ] = seq
+            return seq
+
+    def write(self, frame, t=None):
+        """Copying write, for producers that cannot decode straight into a slot"""
+        slot = self.acquire()
+        if slot is None:
+            return None
+        np.copyto(self.frames[slot], frame)
+        return self.commit(slot, time.perf_counter() if t is None else t)
+
+    # reader side
+    @property
+    def latest_seq(self):
+        return int(self.header[LATEST_SEQ])
+
+    def latest(self, reader_id=0, after_seq=0):
+        """(seq, timestamp, frame view) of the newest frame newer than after_seq, or None.
+
+        The returned view stays valid until the next latest()/release() of reader_id.
+        """
+        with self.lock:
+            seq = int(self.header[LATEST_SEQ])
+            if seq <= after_seq:
+                return None
+            slot = int(self.header[LATEST_SLOT])
+            if self.slot_seq[slot] != seq:
+                # every other slot is pinned and the writer is refilling this one
+                return None
+            self.pins[reader_id] = slot
+            return seq, float(self.slot_time[slot]), self.frames[slot]
+
+    def wait(self, reader_id=0, after_seq=0, timeout=1.0, poll_interval=0.0005):
+        deadline = time.perf_counter() + timeout
+        while True:
+            latest = self.latest(reader_id, after_seq)
+            if latest is not None or time.perf_counter() > deadline:
+                return latest
+            time.sleep(poll_interval)
+
+    def release(self, reader_id=0):
+        self.pins[reader_id] = -1
+
+    def close(self):
+        # drop our views before closing the mapping
+        del self.header, self.pins, self.slot_seq, self.slot_time, self.frames
+        try:
+            self.shm.close()
+        except BufferError:
+            # a caller still holds a frame view, the mapping goes away with it
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_worker(spec, source, stop_event):
+    """Process target: decode frames from source straight into ring slots"""
+    ring = SharedFrameRing.attach(spec)
+    height, width = ring.shape[:2]
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    ring.header[CAPTURE_WIDTH] = int(cap.get(3))
+    ring.header[CAPTURE_HEIGHT] = int(cap.get(4))
+    ring.header[CAPTURE_FPS_X1000] = int(cap.get(cv2.CAP_PROP_FPS) * 1000)
+    ring.header[STATE] = STATE_RUNNING if cap.isOpened() else STATE_STOPPED
+    try:
+        while not stop_event.is_set() and cap.isOpened():
+            slot = ring.acquire()
+            if slot is None:
+                if not cap.grab():
+                    break
+                continue
+            view = ring.frames[slot]
+            ret, frame = cap.read(view)
+            if not ret:
+                break
+            if frame.ctypes.data != view.ctypes.data:
+                # camera ignored the requested size, OpenCV allocated a new buffer
+                if frame.shape == view.shape:
+                    np.copyto(view, frame)
+                else:
+                    cv2.resize(frame, (width, height), dst=view)
+            ring.commit(slot, time.perf_counter())
+    finally:
+        cap.release()
+        ring.header[STATE] = STATE_STOPPED
+        ring.close()
+
+
+class RingCapture:
+    """cv2.VideoCapture look-alike that reads from a capture process through a SharedFrameRing"""
+    def __init__(self, source, shape=(720, 1280, 3), n_slots=4, timeout=2.0):
+        self.ring = SharedFrameRing(shape, n_slots, max_readers=1)
+        self.timeout = timeout
+        self.last_seq = 0
+        self.last_time = None
+        self.stop_event = mp.Event()
+        self.process = mp.Process(target=capture_worker, args=(self.ring.spec(), source, self.stop_event), daemon=True)
+        self.process.start()
+        deadline = time.perf_counter() + timeout
+        while self.ring.header[STATE] == STATE_STARTING and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+    def isOpened(self):
+        if self.ring is None:
+            return False
+        return self.ring.header[STATE] == STATE_RUNNING or self.ring.latest_seq > self.last_seq
+
+    def read(self):
+        """(True, frame) with frame a zero-copy view of the newest slot, (False, None) when the source ended"""
+        while self.isOpened():
+            latest = self.ring.wait(0, self.last_seq, timeout=self.timeout)
+            if latest is not None:
+                self.last_seq, self.last_time, frame = latest
+                return True, frame
+            if not self.process.is_alive():
+                break
+        return False, None
+
+    def get(self, prop_id):
+        # frames are always delivered at the ring size, whatever the camera produces
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.ring.shape[1])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.ring.shape[0])
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.ring.header[CAPTURE_FPS_X1000] / 1000.
+        return 0.
+
+    @property
+    def dropped(self):
+        return int(self.ring.header[DROPPED])
+
+    def release(self):
+        if self.ring is None:
+            return
+        self.stop_event.set()
+        self.process.join(timeout=self.timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
+        self.ring = None
+
+
+def open_shared_capture(source, shape=(720, 1280, 3), n_slots=4):
+    return RingCapture(source, shape, n_slots)
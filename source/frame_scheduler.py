@@ -0,0 +1,96 @@
+"""
+Latency-budget scheduling of the per-frame work.
+
+Without a scheduler every frame gets the full pipeline, so one slow frame (a GPU
+clock drop, a second face) delays all the frames buffered behind it and the
+driver's score runs late from then on. FrameScheduler picks one of three modes
+per frame so that the age of the frame plus the expected cost of the mode stays
+within target_latency, falling back from FULL to the cheaper modes:
+
+    FULL       FaceBoxes, then PIP on the new boxes
+    LANDMARKS  PIP on the boxes of the last FULL frame (the head barely moves)
+    SKIP       no inference, the last faces and EAR are reused
+
+Frames are only skipped when they are too old, i.e. a fresher frame would fit the
+budget; when even a fresh frame cannot, the cheapest mode runs on every frame.
+The cost of every mode is an exponential moving average of what it really took,
+measured between plan() and done(): capture and rendering are not part of it, and
+counts are of the modes done() reports, i.e. what ran after a motion gate. Fresh EAR values are produced at least
+min_score_rate times per second even when the budget is blown, and boxes are
+re-detected at least every box_max_age seconds.
+
+The age of a frame is its capture time when the capture knows it (shared-memory
+capture, stream readers, recordings), otherwise the backlog a buffered camera
+builds up when a loop iteration takes longer than the frame interval.
+
+The caller still scores every frame with AttentionScorer.get_PERCLOS and the
+frame's timestamp, so PERCLOS advances in real time whatever mode ran.
+"""
+
+FULL = 'full'
+LANDMARKS = 'landmarks'
+SKIP = 'skip'
+
+
+class FrameScheduler:
+    def __init__(self, target_latency=0.15, min_score_rate=5.0, box_max_age=0.5, frame_interval=1 / 30.,
+                 buffer_frames=4, smoothing=0.2):
+        self.target_latency = target_latency
+        self.min_score_rate = min_score_rate
+        self.box_max_age = box_max_age
+        self.frame_interval = frame_interval  # of the camera, for the backlog estimate
+        self.buffer_frames = buffer_frames    # frames the capture driver queues at most
+        self.smoothing = smoothing
+        self.costs = {FULL: None, LANDMARKS: None, SKIP: None}
+        self.counts = {FULL: 0, LANDMARKS: 0, SKIP: 0}
+        self.backlog = 0.
+        self.t_last_plan = None
+        self.t_last_full = None
+        self.t_last_scored = None
+
+    def cost(self, mode):
+        """Expected seconds for mode; an unmeasured mode costs what FULL costs, nothing before the first frame"""
+        if self.costs[mode] is not None:
+            return self.costs[mode]
+        return self.costs[FULL] or 0.
+
+    def frame_age(self, t_now, frame_time=None):
+        if frame_time is not None:
+            return max(t_now - frame_time, 0.)
+        if self.t_last_plan is not None:
+            # a loop iteration longer than the frame interval leaves frames queued in the driver
+            cycle = t_now - self.t_last_plan
+            self.backlog = min(max(self.backlog + cycle - self.frame_interval, 0.), self.buffer_frames * self.frame_interval)
+        return self.backlog
+
+    def plan(self, t_now, frame_time=None, has_box=False):
+        """Mode for the frame captured at frame_time (None if unknown), entering the pipeline at t_now"""
+        age = self.frame_age(t_now, frame_time)
+        self.t_last_plan = t_now
+        overdue = self.t_last_scored is None or t_now - self.t_last_scored >= 1. / self.min_score_rate
+        box_fresh = has_box and self.t_last_full is not None and t_now - self.t_last_full < self.box_max_age
+        if age + self.cost(FULL) <= self.target_latency:
+            mode = FULL
+        else:
+            cheapest = LANDMARKS if box_fresh else FULL
+            if overdue or age + self.cost(cheapest) <= self.target_latency or self.cost(cheapest) > self.target_latency:
+                # in budget, or out of it even on a fresh frame: skipping would not make the next one faster
+                mode = cheapest
+            else:
+                # the frame is too old, the next one is fresher
+                mode = SKIP
+        return mode
+
+    def done(self, mode, elapsed, t_now):
+        """Report what the frame cost; mode is what actually ran (a motion gate may have turned it into SKIP)"""
+        self.counts[mode] += 1
+        cost = self.costs[mode]
+        self.costs[mode] = elapsed if cost is None else cost + self.smoothing * (elapsed - cost)
+        if mode == FULL:
+            self.t_last_full = t_now
+        if mode != SKIP:
+            self.t_last_scored = t_now
+
+    def snapshot(self):
+        return {'costs_ms': {mode: None if cost is None else cost * 1000. for mode, cost in self.costs.items()},
+                'counts': dict(self.counts), 'backlog_ms': self.backlog * 1000.}
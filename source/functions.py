@@ -6,12 +6,8 @@ import torch
 import torch.nn as nn
 import random
 import time
-from scipy.integrate import simpson as simps
-from tqdm import tqdm
+from landmark_schema import DEFAULT_SCHEMA
 logger = logging.getLogger(__name__)
-from twilio.base.exceptions import TwilioRestException
-from twilio.rest import Client
-import streamlit as st
 
 def buddha_blessing():
     print("""
@@ -143,6 +139,8 @@ def compute_loss_pip(outputs_map, outputs_local_x, outputs_local_y, outputs_nb_x
     return loss_map, loss_x, loss_y, loss_nb_x, loss_nb_y
 
 def train_model(det_head, net, train_loader, criterion_cls, criterion_reg, cls_loss_weight, reg_loss_weight, num_nb, optimizer, num_epochs, scheduler, save_dir, save_interval, device):
+    # training only, kept off the import path of the Streamlit app
+    from tqdm import tqdm
     for epoch in tqdm(range(num_epochs)):
         print('Epoch {}/{}'.format(epoch, num_epochs - 1))
         logging.info('Epoch {}/{}'.format(epoch, num_epochs - 1))
@@ -230,6 +228,45 @@ def forward_pip(net, inputs, preprocess, input_size, net_stride, num_nb):
 
     return tmp_x, tmp_y, tmp_nb_x, tmp_nb_y, outputs_cls, max_cls
 
+def forward_pip_batch(net, inputs, input_size, net_stride, num_nb):
+    # same decoding as forward_pip, but keeps the batch dimension so crops from
+    # several faces (or several cameras) share one forward pass
+    net.eval()
+    with torch.no_grad():
+        outputs_cls, outputs_x, outputs_y, outputs_nb_x, outputs_nb_y = net(inputs)
+        tmp_batch, tmp_channel, tmp_height, tmp_width = outputs_cls.size()
+
+        outputs_cls = outputs_cls.view(tmp_batch, tmp_channel, -1)
+        max_ids = torch.argmax(outputs_cls, 2, keepdim=True)
+        max_cls = torch.max(outputs_cls, 2)[0]
+        max_ids_nb = max_ids.repeat(1, 1, num_nb).view(tmp_batch, tmp_channel*num_nb, 1)
+
+        outputs_x_select = torch.gather(outputs_x.view(tmp_batch, tmp_channel, -1), 2, max_ids)
+        outputs_y_select = torch.gather(outputs_y.view(tmp_batch, tmp_channel, -1), 2, max_ids)
+        outputs_nb_x_select = torch.gather(outputs_nb_x.view(tmp_batch, tmp_channel*num_nb, -1), 2, max_ids_nb)
+        outputs_nb_y_select = torch.gather(outputs_nb_y.view(tmp_batch, tmp_channel*num_nb, -1), 2, max_ids_nb)
+        outputs_nb_x_select = outputs_nb_x_select.view(tmp_batch, tmp_channel, num_nb)
+        outputs_nb_y_select = outputs_nb_y_select.view(tmp_batch, tmp_channel, num_nb)
+
+        grid_x = (max_ids%tmp_width).float()
+        grid_y = (max_ids//tmp_width).float()
+        tmp_x = (grid_x+outputs_x_select) / (1.0 * input_size / net_stride)
+        tmp_y = (grid_y+outputs_y_select) / (1.0 * input_size / net_stride)
+        tmp_nb_x = (grid_x+outputs_nb_x_select) / (1.0 * input_size / net_stride)
+        tmp_nb_y = (grid_y+outputs_nb_y_select) / (1.0 * input_size / net_stride)
+
+    return tmp_x, tmp_y, tmp_nb_x, tmp_nb_y, outputs_cls, max_cls
+
+def merge_nb_predictions(lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y, reverse_index1, reverse_index2, max_len):
+    # average every landmark with the predictions its neighbours made for it,
+    # batched version of the merge step in app.play_webcam. Returns (B, num_lms, 2)
+    tmp_batch, num_lms, _ = lms_pred_x.size()
+    tmp_nb_x = lms_pred_nb_x[:, reverse_index1, reverse_index2].view(tmp_batch, num_lms, max_len)
+    tmp_nb_y = lms_pred_nb_y[:, reverse_index1, reverse_index2].view(tmp_batch, num_lms, max_len)
+    tmp_x = torch.mean(torch.cat((lms_pred_x, tmp_nb_x), dim=2), dim=2)
+    tmp_y = torch.mean(torch.cat((lms_pred_y, tmp_nb_y), dim=2), dim=2)
+    return torch.stack((tmp_x, tmp_y), dim=2)
+
 
 
 def compute_nme(lms_pred, lms_gt, norm):
@@ -243,11 +280,15 @@ def compute_fr_and_auc(nmes, thres=0.01, step=0.0001):
     xs = np.arange(0, thres + step, step)
     ys = np.array([np.count_nonzero(nmes <= x) for x in xs]) / float(num_data)
     fr = 1.0 - ys[-1]
+    from scipy.integrate import simpson as simps
     auc = simps(ys, x=xs) / thres
     return fr, auc
 
 
-def calculate_aspect_ratio(lms_pred):
+def calculate_aspect_ratio(lms_pred, schema=DEFAULT_SCHEMA):
+    if schema is not DEFAULT_SCHEMA:
+        average, left, right = calculate_aspect_ratio_batch(lms_pred, schema)
+        return float(average), float(left), float(right)
     point_0 = np.array([lms_pred[0], lms_pred[1]])
     point_1 = np.array([lms_pred[2], lms_pred[3]])
     point_2 = np.array([lms_pred[4], lms_pred[5]])
@@ -282,6 +323,34 @@ def calculate_aspect_ratio(lms_pred):
     return average_aspect_ratio, left_eye_aspect_ratio, right_eye_aspect_ratio
 
 
+def calculate_aspect_ratio_batch(lms_pred, schema=DEFAULT_SCHEMA):
+    """calculate_aspect_ratio for many faces or frames at once.
+
+    lms_pred is (N, num_lms*2) flat like the PIP output or (N, num_lms, 2) points, any
+    number of leading dimensions (e.g. (T, faces, num_lms, 2) for a landmark trace).
+    schema (landmark_schema.LandmarkSchema) says which points are the eye contours,
+    the 16 eye landmarks of the WFLW snapshot by default. Returns (average, left, right)
+    arrays of the leading shape.
+    """
+    if not schema.has_eyes:
+        raise ValueError('{} has no eyelid landmarks'.format(schema.name))
+    lms = np.asarray(lms_pred)
+    if lms.shape[-1] != 2:
+        lms = lms.reshape(lms.shape[:-1] + (-1, 2))
+    # (..., eye, point, xy), point i faces point n-i, 0 and n/2 are the corners
+    eyes = lms[..., schema.eyes, :]
+    half = schema.eyes.shape[1] // 2
+    upper = list(range(1, half))
+    lower = [2 * half - i for i in upper]
+    heights = np.linalg.norm(eyes[..., upper, :] - eyes[..., lower, :], axis=-1).sum(axis=-1)
+    widths = np.linalg.norm(eyes[..., 0, :] - eyes[..., half, :], axis=-1)
+    ratios = heights / (len(upper) * widths)
+    left_eye_aspect_ratio = ratios[..., 0]
+    right_eye_aspect_ratio = ratios[..., 1]
+    average_aspect_ratio = (left_eye_aspect_ratio + right_eye_aspect_ratio) / 2
+    return average_aspect_ratio, left_eye_aspect_ratio, right_eye_aspect_ratio
+
+
 def style_table(df):
     # Apply CSS styling to the DataFrame
     styled_df = df.style.set_table_styles([
@@ -0,0 +1,209 @@
+"""
+Gaze score for AttentionScorer.eval_scores from a second, eye-sized landmark model.
+
+experiments/Iris configures a 5-point PIP model (net_stride 128, the coarsest
+2x2 head) that predicts the iris on an eye crop. GazeCascade cuts one square crop
+per eye around the eye contour the face model already found (landmark_schema),
+stacks the crops of both eyes of every face, and every camera for the
+multi-stream server, into one Iris forward, and measures how far the iris
+centre sits from the middle of the eye, along the corner-to-corner axis (so a
+tilted head does not read as a sideways look) and across it, in eye widths.
+The gaze score is the length of that offset averaged over both eyes: about 0
+looking ahead, 0.2-0.3 with the iris against a corner.
+
+The cascade is the expensive part, so each face is only re-measured every
+`interval` frames and only while its eyes are open (EAR above min_ear, a closed
+lid hides the iris; callers pass their scorer's live ear_thresh per frame); in between the face keeps the score of the nearest face of
+the previous frame. Layouts that mark the pupils themselves (COFW, LaPa) need no
+second model: without an Iris snapshot their pupils are measured the same way on
+every frame. The 16-point WFLW layout has neither, there the score stays None,
+which eval_scores reads as looking ahead.
+
+The Iris data ships no meanface, so the neighbour merge of PIP is skipped unless
+data/Iris/meanface.txt exists; the iris centre is the mean of the 5 points and
+does not depend on their order.
+
+Usage:
+    gaze = GazeCascade(pipeline.schema, IrisModel.from_experiment(device=pipeline.device), interval=5)
+    gaze.estimate(frame, faces, min_ear=score.ear_thresh)   # sets face.gaze and face.gaze_score
+    score.eval_scores(t_now, face.average_aspect_ratio, face.gaze_score, *face.head_pose)
+"""
+
+import os
+
+import cv2
+import numpy as np
+import torch
+
+import model_loader
+from functions import forward_pip_batch, merge_nb_predictions
+
+IRIS_DATA_NAME = 'Iris'
+DEFAULT_IRIS_EXPERIMENT = 'pip_32_16_60_r18_l2_l1_10_1_nb10'
+
+
+def iris_snapshot_exists(experiment_name=DEFAULT_IRIS_EXPERIMENT):
+    cfg = model_loader.load_experiment_config(IRIS_DATA_NAME, experiment_name)
+    return os.path.exists(model_loader.landmark_weights_path(cfg))
+
+
+class IrisModel:
+    """Iris PIP network, predict() gives (N, num_lms, 2) points normalised to each eye crop"""
+    def __init__(self, net, cfg, device):
+        self.net = net
+        self.cfg = cfg
+        self.device = device
+        self.input_size = cfg.input_size
+        self.reverse_index = None
+        if os.path.exists(os.path.join(model_loader.ROOT_DIR, 'data', cfg.data_name, 'meanface.txt')):
+            _, reverse_index1, reverse_index2, max_len = model_loader.load_meanface(cfg)
+            self.reverse_index = (reverse_index1, reverse_index2, max_len)
+        self.mean = torch.tensor([0.485, 0.456, 0.406], device=device).view(1, 3, 1, 1)
+        self.std = torch.tensor([0.229, 0.224, 0.225], device=device).view(1, 3, 1, 1)
+
+    @classmethod
+    def from_experiment(cls, experiment_name=DEFAULT_IRIS_EXPERIMENT, device=None, mmap_weights=False):
+        cfg = model_loader.load_experiment_config(IRIS_DATA_NAME, experiment_name)
+        if device is None:
+            device = model_loader.select_device(cfg.use_gpu)
+        return cls(model_loader.load_landmark_net(cfg, device, mmap_weights=mmap_weights), cfg, device)
+
+    def predict(self, crops):
+        if len(crops) == 0:
+            return np.zeros((0, self.cfg.num_lms, 2), dtype=np.float32)
+        inputs = torch.from_numpy(np.ascontiguousarray(np.stack(crops)[..., ::-1])).to(self.device)
+        inputs = (inputs.permute(0, 3, 1, 2).float().div_(255) - self.mean) / self.std
+        lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y, _, _ = forward_pip_batch(
+            self.net, inputs, self.input_size, self.cfg.net_stride, self.cfg.num_nb)
+        if self.reverse_index is not None:
+            lms = merge_nb_predictions(lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y, *self.reverse_index)
+        else:
+            lms = torch.cat((lms_pred_x, lms_pred_y), dim=2)
+        return lms.cpu().numpy()
+
+
+def eye_frames(points, eyes):
+    """Middle, unit corner-to-corner axis (pointing right in the image) and width of every eye.
+
+    points (N, num_lms, 2) in pixels, eyes the (2, P) contour indices of landmark_schema,
+    corners at contour positions 0 and P/2. Returns (N, 2, 2), (N, 2, 2), (N, 2).
+    """
+    first = points[:, eyes[:, 0]]
+    second = points[:, eyes[:, eyes.shape[1] // 2]]
+    axis = second - first
+    width = np.linalg.norm(axis, axis=2)
+    axis = axis / np.maximum(width, 1e-6)[..., None]
+    axis *= np.where(axis[..., :1] < 0, -1., 1.)
+    return (first + second) / 2, axis, width
+
+
+def gaze_offsets(centres, middles, axes, widths):
+    """(N, 2) mean (along, across) offset of the iris centres from the eye middles, in eye widths"""
+    delta = centres - middles
+    along = np.sum(delta * axes, axis=2)
+    across = axes[..., 0] * delta[..., 1] - axes[..., 1] * delta[..., 0]  # positive below the eye axis
+    return np.stack([along, across], axis=2).mean(axis=1) / np.maximum(widths.mean(axis=1), 1e-6)[:, None]
+
+
+class GazeCascade:
+    """Gaze offsets of the faces of any number of cameras, re-measured every interval frames with the eyes open"""
+    def __init__(self, schema, iris=None, interval=5, min_ear=0.15, crop_scale=1.5, max_match_distance=0.5):
+        self.schema = schema
+        self.iris = iris                  # IrisModel (or anything with input_size and predict(crops)) or None
+        self.interval = max(int(interval), 1)
+        self.min_ear = min_ear
+        self.crop_scale = crop_scale      # crop side in eye widths
+        self.max_match_distance = max_match_distance  # in box widths
+        self.tracks = {}  # camera key -> [(box centre, box width, gaze, frames since measured)]
+        self.measured = 0
+        self.reused = 0
+
+    @property
+    def available(self):
+        return self.schema.eyes is not None and (self.iris is not None or self.schema.pupils is not None)
+
+    def reset(self, key=None):
+        if key is None:
+            self.tracks = {}
+        else:
+            self.tracks.pop(key, None)
+
+    def _previous(self, tracks, centre, width):
+        best, best_distance = None, self.max_match_distance * width
+        for track in tracks:
+            distance = np.hypot(*(centre - track[0]))
+            if distance <= best_distance:
+                best, best_distance = track, distance
+        return best
+
+    def _crops(self, frame, middles, widths):
+        """Square crops of input_size around each eye, border pixels repeated where an eye is near the edge"""
+        size = self.iris.input_size
+        sides = widths * self.crop_scale
+        corners = middles - sides[:, None] / 2
+        crops = []
+        for (x0, y0), side in zip(corners, sides):
+            scale = size / side
+            warp = np.array([[scale, 0., -x0 * scale], [0., scale, -y0 * scale]])
+            crops.append(cv2.warpAffine(frame, warp, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE))
+        return crops, corners, sides
+
+    def estimate(self, frame, faces, key=0, min_ear=None):
+        """Set face.gaze ((along, across) or None) and face.gaze_score of faces in one frame"""
+        self.estimate_frames([frame], [faces], [key], None if min_ear is None else [min_ear])
+        return [face.gaze_score for face in faces]
+
+    def estimate_frames(self, frames, faces_per_frame, keys=None, min_ears=None):
+        """estimate() for several frames (one per camera key), all due eyes share one Iris forward.
+
+        min_ears gives the open-eye EAR threshold of every frame (its scorer's ear_thresh),
+        self.min_ear is used without it.
+        """
+        if keys is None:
+            keys = list(range(len(frames)))
+        if min_ears is None:
+            min_ears = [self.min_ear] * len(frames)
+        due = []  # (frame index, face, track)
+        for frame_idx, (faces, key, min_ear) in enumerate(zip(faces_per_frame, keys, min_ears)):
+            previous = self.tracks.get(key, [])
+            tracks = []
+            for face in faces:
+                box = np.asarray(face.box, dtype=np.float64)
+                centre, width = (box[:2] + box[2:]) / 2, box[2] - box[0] + 1
+                track = self._previous(previous, centre, width) if self.available else None
+                face.gaze = track[2] if track is not None else None
+                age = track[3] + 1 if track is not None else self.interval
+                eyes_open = face.average_aspect_ratio is not None and face.average_aspect_ratio > min_ear
+                if self.available and eyes_open and (age >= self.interval or self.iris is None):
+                    tracks.append([centre, width, face.gaze, 0])
+                    due.append((frame_idx, face, tracks[-1]))
+                elif track is not None:
+                    tracks.append([centre, width, face.gaze, age])
+                    self.reused += 1
+            self.tracks[key] = tracks
+
+        if due:
+            boxes = np.array([face.box for _, face, _ in due], dtype=np.float64)
+            sizes = boxes[:, 2:] - boxes[:, :2] + 1
+            points = np.stack([face.lms_pred_merge.reshape(-1, 2) for _, face, _ in due]) * sizes[:, None, :] + boxes[:, None, :2]
+            middles, axes, widths = eye_frames(points, self.schema.eyes)
+            if self.iris is None:
+                centres = points[:, list(self.schema.pupils)]
+            else:
+                crops, corners = [], []
+                for (frame_idx, _, _), face_middles, face_widths in zip(due, middles, widths):
+                    face_crops, face_corners, sides = self._crops(frames[frame_idx], face_middles, face_widths)
+                    crops += face_crops
+                    corners.append(np.concatenate([face_corners, sides[:, None]], axis=1))
+                corners = np.concatenate(corners)
+                iris_points = self.iris.predict(crops)
+                # iris centre back in frame pixels, (N, 2 eyes, 2)
+                centres = (corners[:, :2] + iris_points.mean(axis=1) * corners[:, 2:]).reshape(-1, 2, 2)
+            offsets = gaze_offsets(centres, middles, axes, widths)
+            for (_, face, track), offset in zip(due, offsets):
+                face.gaze = track[2] = (float(offset[0]), float(offset[1]))
+            self.measured += len(due)
+
+        for faces in faces_per_frame:
+            for face in faces:
+                face.gaze_score = None if face.gaze is None else float(np.hypot(*face.gaze))
@@ -0,0 +1,173 @@
+"""
+Head pose from the landmarks the PIP model already predicts, for the distraction
+check of AttentionScorer.eval_scores.
+
+No extra network: the nose tip, chin, eye and mouth corners named by the model's
+landmark_schema are matched to the same points of a generic 3D head
+(POSE_TEMPLATE) and cv2.solvePnP gives the rotation, with a pinhole camera whose
+focal length is the frame width. Every face is matched to the nearest face of the
+previous call and its rotation and translation seed the solver
+(useExtrinsicGuess), so a tracked head converges in a few iterations and does not
+flip between mirror solutions; new faces start from a frontal head at the
+distance their box width implies. Landmarks of all faces are moved to pixels and
+the rotations turned into angles in one array operation each, only the solver
+runs per face.
+
+Angles are (roll, pitch, yaw) in degrees, 0 when the driver looks straight into
+the camera. Layouts without nose, mouth and chin points (the 16 eye points of the
+WFLW snapshot) only give the roll, from the line between the eye centres; pitch
+and yaw are None there, which eval_scores reads as unknown.
+
+Usage:
+    estimator = HeadPoseEstimator(pipeline.schema)
+    estimator.estimate(faces, frame.shape)   # sets face.head_pose
+    score.eval_scores(t_now, face.average_aspect_ratio, None, *face.head_pose)
+"""
+
+import cv2
+import numpy as np
+
+from landmark_schema import DEFAULT_SCHEMA
+
+# generic head in millimetres: x to the right of the image, y down, z away from the camera,
+# origin at the nose tip, so a face looking into the camera has no rotation
+POSE_TEMPLATE = {
+    'nose_tip': (0., 0., 0.),
+    'chin': (0., 66., 13.),
+    'left_eye_outer': (-45., -34., 27.),
+    'left_eye_inner': (-16., -33., 17.),
+    'right_eye_inner': (16., -33., 17.),
+    'right_eye_outer': (45., -34., 27.),
+    'left_mouth': (-30., 30., 25.),
+    'right_mouth': (30., 30., 25.),
+}
+MIN_POSE_POINTS = 6
+FACE_WIDTH_MM = 150.  # of a detection box, for the distance of a new face
+
+
+def rotation_matrices(rvecs):
+    """(N, 3, 3) rotation matrices of (N, 3) Rodrigues vectors"""
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    axis = rvecs / np.where(theta > 1e-12, theta, 1.)[:, None]
+    x, y, z = axis.T
+    zero = np.zeros_like(x)
+    skew = np.stack([zero, -z, y, z, zero, -x, -y, x, zero], axis=1).reshape(-1, 3, 3)
+    sin, cos = np.sin(theta)[:, None, None], np.cos(theta)[:, None, None]
+    return np.eye(3) + sin * skew + (1 - cos) * skew @ skew
+
+
+def euler_angles(rvecs):
+    """(N, 3) roll, pitch, yaw in degrees of R = Rz(roll) Ry(yaw) Rx(pitch)"""
+    rotation = rotation_matrices(rvecs)
+    pitch = np.arctan2(rotation[:, 2, 1], rotation[:, 2, 2])
+    yaw = np.arctan2(-rotation[:, 2, 0], np.hypot(rotation[:, 2, 1], rotation[:, 2, 2]))
+    roll = np.arctan2(rotation[:, 1, 0], rotation[:, 0, 0])
+    return np.degrees(np.stack([roll, pitch, yaw], axis=1))
+
+
+class HeadPoseEstimator:
+    """Head pose of the faces of one camera, keeps the last poses to warm-start the next frame"""
+    def __init__(self, schema=DEFAULT_SCHEMA, max_match_distance=0.5, max_reprojection_error=0.15):
+        names = [name for name in POSE_TEMPLATE if name in schema.pose]
+        self.full_pose = len(names) >= MIN_POSE_POINTS
+        self.indices = np.array([schema.pose[name] for name in names], dtype=np.int64)
+        self.template = np.array([POSE_TEMPLATE[name] for name in names], dtype=np.float64)
+        self.nose = names.index('nose_tip') if 'nose_tip' in names else None
+        self.eyes = schema.eyes
+        self.max_match_distance = max_match_distance          # in box widths
+        self.max_reprojection_error = max_reprojection_error  # mean, in box widths
+        self.tracks = []  # (box centre, rvec, tvec) of the faces of the last call
+        self.warm_starts = 0
+        self.cold_starts = 0
+        self.failures = 0
+
+    @property
+    def available(self):
+        """False when the layout gives neither a pose nor a roll"""
+        return self.full_pose or self.eyes is not None
+
+    def reset(self):
+        self.tracks = []
+
+    @staticmethod
+    def camera_matrix(frame_shape):
+        height, width = frame_shape[:2]
+        return np.array([[width, 0., width / 2.], [0., width, height / 2.], [0., 0., 1.]])
+
+    def _previous(self, centre, width):
+        best, best_distance = None, self.max_match_distance * width
+        for track_centre, rvec, tvec in self.tracks:
+            distance = np.hypot(*(centre - track_centre))
+            if distance <= best_distance:
+                best, best_distance = (rvec, tvec), distance
+        return best
+
+    def _solve(self, image_points, camera, guess):
+        rvec, tvec = guess
+        ok, rvec, tvec = cv2.solvePnP(self.template, image_points, camera, None, rvec.copy(), tvec.copy(),
+                                      useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+        if not ok or not np.isfinite(rvec).all() or tvec[2, 0] <= 0:
+            return None
+        projected, _ = cv2.projectPoints(self.template, rvec, tvec, camera, None)
+        return rvec, tvec, np.mean(np.linalg.norm(projected.reshape(-1, 2) - image_points, axis=1))
+
+    def estimate(self, faces, frame_shape):
+        """Set face.head_pose of every face to (roll, pitch, yaw) degrees (None where unknown), returns the poses"""
+        if not faces or not self.available:
+            self.tracks = []
+            for face in faces:
+                face.head_pose = None
+            return [None] * len(faces)
+        boxes = np.array([face.box for face in faces], dtype=np.float64)
+        sizes = boxes[:, 2:] - boxes[:, :2] + 1
+        points = np.stack([face.lms_pred_merge.reshape(-1, 2) for face in faces]) * sizes[:, None, :] + boxes[:, None, :2]
+
+        if not self.full_pose:
+            # eye-only layout: the eye line gives the roll, nothing constrains pitch and yaw
+            centres = points[:, self.eyes].mean(axis=2)
+            delta = centres[:, 1] - centres[:, 0]
+            rolls = np.degrees(np.arctan2(delta[:, 1], delta[:, 0]))
+            poses = [(float(roll), None, None) for roll in rolls]
+            for face, pose in zip(faces, poses):
+                face.head_pose = pose
+            return poses
+
+        camera = self.camera_matrix(frame_shape)
+        focal = camera[0, 0]
+        box_centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+        rvecs = np.full((len(faces), 3), np.nan)
+        tracks = []
+        for idx in range(len(faces)):
+            image_points = np.ascontiguousarray(points[idx, self.indices])
+            width = sizes[idx, 0]
+            solved = None
+            previous = self._previous(box_centres[idx], width)
+            if previous is not None:
+                solved = self._solve(image_points, camera, previous)
+                if solved is not None and solved[2] <= self.max_reprojection_error * width:
+                    self.warm_starts += 1
+                else:
+                    solved = None
+            if solved is None:
+                # frontal head at the distance the box width implies, in front of the nose landmark
+                depth = focal * FACE_WIDTH_MM / width
+                nose = image_points[self.nose] if self.nose is not None else box_centres[idx]
+                tvec = np.array([[(nose[0] - camera[0, 2]) * depth / focal], [(nose[1] - camera[1, 2]) * depth / focal], [depth]])
+                solved = self._solve(image_points, camera, (np.zeros((3, 1)), tvec))
+                if solved is not None and solved[2] <= self.max_reprojection_error * width:
+                    self.cold_starts += 1
+                else:
+                    solved = None
+                    self.failures += 1
+            if solved is not None:
+                rvecs[idx] = solved[0].ravel()
+                tracks.append((box_centres[idx], solved[0], solved[1]))
+        self.tracks = tracks
+
+        angles = euler_angles(np.nan_to_num(rvecs))
+        poses = []
+        for face, solved, (roll, pitch, yaw) in zip(faces, np.isfinite(rvecs[:, 0]), angles):
+            face.head_pose = (float(roll), float(pitch), float(yaw)) if solved else None
+            poses.append(face.head_pose)
+        return poses
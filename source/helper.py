@@ -1,8 +1,6 @@
-from ultralytics import YOLO
 import time
 import streamlit as st
 import cv2
-from pytube import YouTube
 
 import settings
 
@@ -17,6 +15,7 @@ def load_model(model_path):
     Returns:
         A YOLO object detection model.
     """
+    from ultralytics import YOLO
     model = YOLO(model_path)
     return model
 
@@ -84,6 +83,7 @@ def play_youtube_video(conf, model):
 
     if st.sidebar.button('Detect Objects'):
         try:
+            from pytube import YouTube
             yt = YouTube(source_youtube)
             stream = yt.streams.filter(file_extension="mp4", res=720).first()
             vid_cap = cv2.VideoCapture(stream.url)
@@ -0,0 +1,116 @@
+import time
+import bisect
+import threading
+
+# upper bounds in seconds, 0.5 ms .. 5 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.05, 0.075,
+                   0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram, constant memory however many values are observed.
+
+    Quantiles are interpolated inside the bucket that holds them, which is plenty
+    for p50/p95/p99 latency reporting and matches how Prometheus histograms work.
+
+    With a window (seconds) the quantiles and the max of snapshot() only cover the
+    last `window` seconds: the bucket counts are also kept in `slices` rings of
+    window / slices seconds each, and a ring slot is zeroed when its turn comes
+    again. count, sum, mean and cumulative_counts() always cover every value since
+    clear(), as Prometheus expects.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS, window=None, slices=6, clock=time.monotonic):
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self.n_slices = slices
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+            self.count = 0
+            self.sum = 0.
+            self.max = 0.
+            if self.window:
+                self.slice_counts = [[0] * (len(self.buckets) + 1) for _ in range(self.n_slices)]
+                self.slice_max = [0.] * self.n_slices
+                self.slice_index = int(self.clock() * self.n_slices // self.window)
+
+    def _rotate(self):
+        """Zero the ring slots that ended since the last call (lock held), returns the current slot"""
+        index = int(self.clock() * self.n_slices // self.window)
+        for step in range(1, min(index - self.slice_index, self.n_slices) + 1):
+            slot = (self.slice_index + step) % self.n_slices
+            self.slice_counts[slot] = [0] * len(self.counts)
+            self.slice_max[slot] = 0.
+        self.slice_index = max(index, self.slice_index)
+        return self.slice_index % self.n_slices
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+            if self.window:
+                slot = self._rotate()
+                self.slice_counts[slot][idx] += 1
+                if value > self.slice_max[slot]:
+                    self.slice_max[slot] = value
+
+    def _recent(self):
+        """(bucket counts, count, max) of the window, or of everything without one"""
+        with self.lock:
+            if not self.window:
+                return list(self.counts), self.count, self.max
+            self._rotate()
+            counts = [sum(column) for column in zip(*self.slice_counts)]
+            return counts, sum(counts), max(self.slice_max)
+
+    @property
+    def recent_max(self):
+        return self._recent()[2]
+
+    def quantile(self, q):
+        counts, count, max_value = self._recent()
+        if count == 0:
+            return 0.
+        rank = q * count
+        cumulative = 0
+        for idx, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[idx-1] if idx > 0 else 0.
+                upper = self.buckets[idx] if idx < len(self.buckets) else max_value
+                upper = min(upper, max_value)
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return max_value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.
+
+    def cumulative_counts(self):
+        """[(upper_bound, cumulative_count)] including the +Inf bucket"""
+        with self.lock:
+            counts = list(self.counts)
+        result = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            result.append((bound, cumulative))
+        return result
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.recent_max,
+        }
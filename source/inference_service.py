@@ -0,0 +1,283 @@
+"""
+Local inference service with dynamic batching for FaceBoxes and the Pip_* landmark model.
+
+Many clients (Streamlit sessions, edge capture processes) post frames or face crops.
+Requests are queued and a worker collects them until either max_batch_size requests
+are waiting or the oldest one has waited max_wait_ms, then runs a single forward
+pass for the whole batch. Per-request latency and batch-size histograms are served
+on /stats.
+
+Endpoints (frames are raw BGR uint8 with an "X-Frame-Shape: h,w,3" header, or any
+image file cv2.imdecode understands):
+    POST /detect     -> {"faces": [{"box": [xmin, ymin, xmax, ymax], "score": s}, ...]}
+    POST /landmarks  -> {"landmarks": [x0, y0, x1, y1, ...]} normalised to the crop
+    POST /process    -> detect + landmarks + eye aspect ratios for every face
+    GET  /stats
+
+Usage:
+    python source/inference_service.py --port 8601 --max-batch-size 8 --max-wait-ms 5
+"""
+
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from histogram import Histogram
+from functions import calculate_aspect_ratio
+
+BATCH_SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+
+
+class DynamicBatcher:
+    """Queue requests and hand them to process_batch in groups of up to max_batch_size"""
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=5.0, name='batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.
+        self.name = name
+        self.queue = queue.Queue()
+        self.latency = Histogram()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        future = Future()
+        if not self.running:
+            future.set_exception(RuntimeError('{} stopped'.format(self.name)))
+            return future
+        self.queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _run(self):
+        while self.running:
+            first = self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.running = False
+                    break
+                batch.append(request)
+
+            self.batch_sizes.observe(len(batch))
+            error = None
+            try:
+                results = list(self.process_batch([item for item, _, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError('{}: {} results for a batch of {}'.format(self.name, len(results), len(batch)))
+            except Exception as e:
+                error = e
+            # failed requests count in the latency too, and every caller of the batch gets the exception
+            t_done = time.perf_counter()
+            for idx, (_, future, t_submit) in enumerate(batch):
+                self.latency.observe(t_done - t_submit)
+                if error is None:
+                    future.set_result(results[idx])
+                else:
+                    future.set_exception(error)
+
+        # requests queued behind stop() would otherwise wait forever
+        while True:
+            try:
+                request = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[1].set_exception(RuntimeError('{} stopped'.format(self.name)))
+
+    def stop(self):
+        self.running = False
+        self.queue.put(None)
+
+    def stats(self):
+        return {
+            'pending': self.queue.qsize(),
+            'latency': self.latency.snapshot(),
+            'batch_size': self.batch_sizes.snapshot(),
+        }
+
+
+class InferenceService:
+    """Shares one warm LandmarkPipeline between all clients of the process"""
+    def __init__(self, pipeline, max_batch_size=8, max_wait_ms=5.0):
+        self.pipeline = pipeline
+        self.detect_batcher = DynamicBatcher(pipeline.detect_batch, max_batch_size, max_wait_ms, 'detect')
+        self.landmark_batcher = DynamicBatcher(pipeline.predict, max_batch_size, max_wait_ms, 'landmarks')
+
+    def detect(self, frame):
+        return self.detect_batcher(frame)
+
+    def landmarks(self, crop):
+        size = self.pipeline.cfg.input_size
+        if crop.shape[:2] != (size, size):
+            crop = cv2.resize(crop, (size, size))
+        return self.landmark_batcher(crop)
+
+    def process(self, frame):
+        boxes = self.detect(frame)
+        # submit every crop before waiting so the faces of this frame share a batch
+        futures = [self.landmark_batcher.submit(self.pipeline.crop(frame, box)) for box, _ in boxes]
+        faces = []
+        for (box, det_score), future in zip(boxes, futures):
+            lms = future.result()
+            average_aspect_ratio, left_aspect_ratio, right_aspect_ratio = calculate_aspect_ratio(lms, self.pipeline.schema)
+            faces.append({
+                'box': [int(v) for v in box],
+                'score': det_score,
+                'landmarks': lms.tolist(),
+                'aspect_ratio': float(average_aspect_ratio),
+                'left_aspect_ratio': float(left_aspect_ratio),
+                'right_aspect_ratio': float(right_aspect_ratio),
+            })
+        return faces
+
+    def stats(self):
+        return {'detect': self.detect_batcher.stats(), 'landmarks': self.landmark_batcher.stats()}
+
+    def stop(self):
+        self.detect_batcher.stop()
+        self.landmark_batcher.stop()
+
+    def serve(self, host='127.0.0.1', port=8601):
+        """Start the HTTP front end in a daemon thread and return the server"""
+        httpd = ThreadingHTTPServer((host, port), make_service_handler(self))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd
+
+
+def encode_frame(frame):
+    return frame.tobytes(), {'Content-Type': 'application/octet-stream',
+                             'X-Frame-Shape': ','.join(str(v) for v in frame.shape)}
+
+
+def decode_frame(body, headers):
+    shape = headers.get('X-Frame-Shape')
+    if shape:
+        return np.frombuffer(body, dtype=np.uint8).reshape([int(v) for v in shape.split(',')])
+    frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError('could not decode image')
+    return frame
+
+
+def make_service_handler(service):
+    class ServiceHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] == '/stats':
+                self._send(200, service.stats())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            path = self.path.split('?')[0]
+            try:
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                frame = decode_frame(body, self.headers)
+                if path == '/detect':
+                    payload = {'faces': [{'box': [int(v) for v in box], 'score': det_score}
+                                         for box, det_score in service.detect(frame)]}
+                elif path == '/landmarks':
+                    payload = {'landmarks': service.landmarks(frame).tolist()}
+                elif path == '/process':
+                    payload = {'faces': service.process(frame)}
+                else:
+                    self._send(404, {'error': 'not found'})
+                    return
+            except Exception as e:
+                self._send(400, {'error': str(e)})
+                return
+            self._send(200, payload)
+
+        def _send(self, code, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ServiceHandler
+
+
+class InferenceClient:
+    """Minimal client for InferenceService, e.g. for a Streamlit session without its own models"""
+    def __init__(self, url='http://127.0.0.1:8601', timeout=5.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _post(self, path, frame):
+        body, headers = encode_frame(frame)
+        request = urllib.request.Request(self.url + path, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def detect(self, frame):
+        return self._post('/detect', frame)['faces']
+
+    def landmarks(self, crop):
+        return np.array(self._post('/landmarks', crop)['landmarks'], dtype=np.float32)
+
+    def process(self, frame):
+        return self._post('/process', frame)['faces']
+
+    def stats(self):
+        with urllib.request.urlopen(self.url + '/stats', timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+def main():
+    import model_loader
+    from landmark_pipeline import LandmarkPipeline
+
+    parser = argparse.ArgumentParser(description='Serve FaceBoxes + PIP landmarks to local clients with dynamic batching')
+    parser.add_argument('--data-name', default=model_loader.DEFAULT_DATA_NAME)
+    parser.add_argument('--experiment-name', default=model_loader.DEFAULT_EXPERIMENT_NAME)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8601)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--cpu', action='store_true', help='force CPU inference')
+    parser.add_argument('--mmap-weights', action='store_true',
+                        help='memory-map the weights so several worker processes share them (CPU only)')
+    args = parser.parse_args()
+
+    device = model_loader.select_device(False) if args.cpu else None
+    pipeline = LandmarkPipeline.from_experiment(args.data_name, args.experiment_name, device=device, mmap_weights=args.mmap_weights)
+    service = InferenceService(pipeline, args.max_batch_size, args.max_wait_ms)
+    httpd = service.serve(args.host, args.port)
+    print("Inference service listening on http://{}:{}".format(args.host, args.port))
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        httpd.shutdown()
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
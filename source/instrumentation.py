@@ -0,0 +1,157 @@
+"""
+Per-stage latency instrumentation for the detection loop.
+
+StageTimer is FaceBoxesV2's utils.timer.Timer on time.perf_counter that also feeds
+a fixed-bucket Histogram. FrameProfiler holds one StageTimer per pipeline stage,
+sums the time every stage spent on the current frame (a frame with two faces runs
+the landmark stages twice) and records the per-frame totals on end_frame(), so the
+p50/p95/p99 are per frame and memory stays constant. They roll over the last
+`window` seconds (60 by default, in 10 s slices) so a slowdown shows up right away;
+the Prometheus buckets of metrics_server keep counting every frame. Replays pass
+window=None to summarise the whole run.
+
+On CUDA the landmark forward is asynchronous: its GPU time shows up in 'decode',
+where the results are copied back to the host.
+
+While a profiling.ProfilingWindow is recording, trace_label is set to
+torch.profiler.record_function and every stage becomes a named range in the trace.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if os.path.join(ROOT_DIR, 'FaceBoxesV2') not in sys.path:
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'FaceBoxesV2'))
+
+from utils.timer import Timer
+
+from histogram import Histogram, LATENCY_BUCKETS
+
+# seconds of frames the percentiles cover
+ROLLING_WINDOW = 60.
+
+STAGES = ('capture', 'gate', 'track', 'detect', 'preprocess', 'forward', 'decode', 'ear', 'pose', 'gaze', 'scoring', 'render')
+
+
+class StageTimer(Timer):
+    """utils.timer.Timer with a monotonic clock and a latency histogram"""
+    def __init__(self, buckets=LATENCY_BUCKETS, window=ROLLING_WINDOW):
+        super().__init__()
+        self.histogram = Histogram(buckets, window)
+
+    def tic(self):
+        self.start_time = time.perf_counter()
+
+    def toc(self, average=True):
+        self.diff = time.perf_counter() - self.start_time
+        self.total_time += self.diff
+        self.calls += 1
+        self.average_time = self.total_time / self.calls
+        if average:
+            return self.average_time
+        else:
+            return self.diff
+
+    def clear(self):
+        super().clear()
+        self.histogram.clear()
+
+
+class FrameProfiler:
+    """Stage timings of every frame plus the processed frame rate"""
+    def __init__(self, stages=STAGES, fps_smoothing=0.1, window=ROLLING_WINDOW):
+        self.stages = tuple(stages)
+        self.timers = {stage: StageTimer(window=window) for stage in self.stages}
+        self.frame_timer = StageTimer(window=window)
+        self.fps_smoothing = fps_smoothing
+        self.frames = 0
+        self.fps = 0.
+        self.last_frame_start = None
+        self.current = {}
+        self.trace_label = None
+
+    def start_frame(self):
+        t_start = time.perf_counter()
+        if self.last_frame_start is not None and t_start > self.last_frame_start:
+            # exponential moving average of the frame rate
+            inst_fps = 1.0 / (t_start - self.last_frame_start)
+            self.fps = inst_fps if self.fps == 0 else (1 - self.fps_smoothing) * self.fps + self.fps_smoothing * inst_fps
+        self.last_frame_start = t_start
+        self.frame_timer.start_time = t_start
+        self.current = {}
+
+    @contextmanager
+    def stage(self, name):
+        timer = self.timers[name]
+        label = self.trace_label(name) if self.trace_label is not None else None
+        if label is not None:
+            label.__enter__()
+        timer.tic()
+        try:
+            yield timer
+        finally:
+            self.current[name] = self.current.get(name, 0.) + timer.toc(average=False)
+            if label is not None:
+                label.__exit__(None, None, None)
+
+    def record(self, name, elapsed):
+        """Add a duration measured elsewhere to stage name of the current frame"""
+        self.current[name] = self.current.get(name, 0.) + elapsed
+
+    def end_frame(self):
+        for name, elapsed in self.current.items():
+            self.timers[name].histogram.observe(elapsed)
+        self.current = {}
+        self.frame_timer.toc()
+        self.frame_timer.histogram.observe(self.frame_timer.diff)
+        self.frames += 1
+
+    def clear(self):
+        for timer in self.timers.values():
+            timer.clear()
+        self.frame_timer.clear()
+        self.frames = 0
+        self.fps = 0.
+        self.last_frame_start = None
+
+    def snapshot(self):
+        """{'frames', 'fps', 'stages': {stage: {count, mean, p50, p95, p99, max}}} in milliseconds"""
+        stages = {}
+        for name, timer in list(self.timers.items()) + [('total', self.frame_timer)]:
+            stats = timer.histogram.snapshot()
+            stages[name] = {key: (value if key == 'count' else value * 1000.) for key, value in stats.items()}
+        return {'frames': self.frames, 'fps': self.fps, 'stages': stages}
+
+    def table(self):
+        """Rows for a DataFrame / log line: stage, p50, p95, p99 and max in ms"""
+        rows = []
+        for name, stats in self.snapshot()['stages'].items():
+            if stats['count'] == 0:
+                continue
+            rows.append({'Stage': name, 'p50 ms': round(stats['p50'], 2), 'p95 ms': round(stats['p95'], 2),
+                         'p99 ms': round(stats['p99'], 2), 'max ms': round(stats['max'], 2)})
+        return rows
+
+
+class NullProfiler:
+    """Drop-in for FrameProfiler when nothing is measured"""
+    _null = nullcontext()
+    fps = 0.
+
+    def start_frame(self):
+        pass
+
+    def stage(self, name):
+        return self._null
+
+    def record(self, name, elapsed):
+        pass
+
+    def end_frame(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,186 @@
+import cv2
+import numpy as np
+import torch
+
+import model_loader
+from landmark_schema import schema_for
+from functions import forward_pip_batch, merge_nb_predictions, calculate_aspect_ratio_batch
+from instrumentation import NULL_PROFILER
+
+
+class FaceResult:
+    """Landmarks and eye aspect ratio of one detected face"""
+    def __init__(self, box, score, lms_pred_merge):
+        self.box = box                        # (xmin, ymin, xmax, ymax) in frame pixels
+        self.score = score                    # FaceBoxes confidence
+        self.lms_pred_merge = lms_pred_merge  # flat [x0, y0, x1, y1, ...] normalised to the crop
+        self.average_aspect_ratio = None
+        self.left_aspect_ratio = None
+        self.right_aspect_ratio = None
+        self.head_pose = None                 # (roll, pitch, yaw) in degrees, see head_pose.py
+        self.gaze = None                      # iris offset (along, across the eye) in eye widths, see gaze_cascade.py
+        self.gaze_score = None
+
+    @property
+    def area(self):
+        return (self.box[2] - self.box[0] + 1) * (self.box[3] - self.box[1] + 1)
+
+    def landmarks_px(self):
+        """Landmarks in frame pixel coordinates, shape (num_lms, 2)"""
+        det_xmin, det_ymin, det_xmax, det_ymax = self.box
+        lms = self.lms_pred_merge.reshape(-1, 2).copy()
+        lms[:, 0] = lms[:, 0] * (det_xmax - det_xmin + 1) + det_xmin
+        lms[:, 1] = lms[:, 1] * (det_ymax - det_ymin + 1) + det_ymin
+        return lms
+
+
+class LandmarkPipeline:
+    """FaceBoxes detection followed by one batched Pip_* forward for every face crop.
+
+    The same instance can serve any number of frames (and cameras): faces found in
+    all frames handed to process_frames() are stacked into a single landmark batch.
+    Any experiment whose landmark layout has eyelids works, the EAR is taken from the
+    points its landmark_schema names.
+    """
+    def __init__(self, detector, net, cfg, device, det_thresh=0.9, det_box_scale=1.2):
+        self.detector = detector
+        self.net = net
+        self.cfg = cfg
+        self.device = device
+        self.det_thresh = det_thresh
+        self.det_box_scale = det_box_scale
+        self.schema = schema_for(cfg)
+        _, self.reverse_index1, self.reverse_index2, self.max_len = model_loader.load_meanface(cfg)
+        self.mean = torch.tensor([0.485, 0.456, 0.406], device=device).view(1, 3, 1, 1)
+        self.std = torch.tensor([0.229, 0.224, 0.225], device=device).view(1, 3, 1, 1)
+
+    @classmethod
+    def from_experiment(cls, data_name=model_loader.DEFAULT_DATA_NAME, experiment_name=model_loader.DEFAULT_EXPERIMENT_NAME, device=None, mmap_weights=False, **kwargs):
+        cfg = model_loader.load_experiment_config(data_name, experiment_name)
+        if device is None:
+            device = model_loader.select_device(cfg.use_gpu)
+        net = model_loader.load_landmark_net(cfg, device, mmap_weights=mmap_weights)
+        detector = model_loader.load_face_detector(device, mmap_weights=mmap_weights)
+        return cls(detector, net, cfg, device, **kwargs)
+
+    def detect(self, frame):
+        """Run FaceBoxes and return [(box, score)] with the same box expansion as app.play_webcam"""
+        detections, _ = self.detector.detect(frame, self.det_thresh, 1)
+        return self.expand_boxes(detections, frame.shape)
+
+    def detect_batch(self, frames):
+        """detect() for several frames, frames of equal size share one FaceBoxes forward"""
+        boxes = [None] * len(frames)
+        groups = {}
+        for frame_idx, frame in enumerate(frames):
+            groups.setdefault(frame.shape, []).append(frame_idx)
+        for shape, frame_ids in groups.items():
+            batch = self.detector.detect_batch([frames[frame_idx] for frame_idx in frame_ids], self.det_thresh, 1)
+            for frame_idx, (detections, _) in zip(frame_ids, batch):
+                boxes[frame_idx] = self.expand_boxes(detections, shape)
+        return boxes
+
+    def expand_boxes(self, detections, frame_shape):
+        frame_height, frame_width = frame_shape[:2]
+        boxes = []
+        for det in detections:
+            det_xmin = det[2]
+            det_ymin = det[3]
+            det_width = det[4]
+            det_height = det[5]
+            det_xmax = det_xmin + det_width - 1
+            det_ymax = det_ymin + det_height - 1
+
+            det_xmin -= int(det_width * (self.det_box_scale-1)/2)
+            det_ymin += int(det_height * (self.det_box_scale-1)/2)
+            det_xmax += int(det_width * (self.det_box_scale-1)/2)
+            det_ymax += int(det_height * (self.det_box_scale-1)/2)
+            det_xmin = max(det_xmin, 0)
+            det_ymin = max(det_ymin, 0)
+            det_xmax = min(det_xmax, frame_width-1)
+            det_ymax = min(det_ymax, frame_height-1)
+            if det_xmax <= det_xmin or det_ymax <= det_ymin:
+                continue
+            boxes.append(((det_xmin, det_ymin, det_xmax, det_ymax), float(det[1])))
+        return boxes
+
+    def crop(self, frame, box):
+        det_xmin, det_ymin, det_xmax, det_ymax = box
+        det_crop = frame[det_ymin:det_ymax, det_xmin:det_xmax, :]
+        return cv2.resize(det_crop, (self.cfg.input_size, self.cfg.input_size))
+
+    def preprocess(self, crops):
+        """BGR uint8 crops (N, H, W, 3) -> normalised RGB tensor (N, 3, H, W) on self.device"""
+        inputs = torch.from_numpy(np.ascontiguousarray(crops[..., ::-1])).to(self.device)
+        inputs = inputs.permute(0, 3, 1, 2).float().div_(255)
+        return (inputs - self.mean) / self.std
+
+    def forward(self, inputs):
+        """Pip_* head outputs for a preprocessed batch"""
+        return forward_pip_batch(self.net, inputs, self.cfg.input_size, self.cfg.net_stride, self.cfg.num_nb)
+
+    def decode(self, outputs):
+        """Merge the neighbour predictions, returns (N, num_lms*2) normalised to each crop"""
+        lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y, _, _ = outputs
+        lms_pred_merge = merge_nb_predictions(lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y,
+                                              self.reverse_index1, self.reverse_index2, self.max_len)
+        return lms_pred_merge.view(lms_pred_merge.shape[0], -1).cpu().numpy()
+
+    def predict(self, crops):
+        """Landmarks for a stack of crops, returns (N, num_lms*2) normalised to each crop"""
+        if len(crops) == 0:
+            return np.zeros((0, self.cfg.num_lms*2), dtype=np.float32)
+        return self.decode(self.forward(self.preprocess(np.stack(crops))))
+
+    def process_boxes(self, frame, boxes, profiler=NULL_PROFILER):
+        """Landmarks and EAR for faces at known [(box, score)] in frame, e.g. the boxes of the last frame"""
+        if not boxes:
+            return []
+        with profiler.stage('preprocess'):
+            inputs = self.preprocess(np.stack([self.crop(frame, box) for box, _ in boxes]))
+        with profiler.stage('forward'):
+            outputs = self.forward(inputs)
+        with profiler.stage('decode'):
+            lms_pred_merge = self.decode(outputs)
+        faces = []
+        with profiler.stage('ear'):
+            ears = zip(*calculate_aspect_ratio_batch(lms_pred_merge, self.schema))
+            for (box, det_score), lms, (average, left, right) in zip(boxes, lms_pred_merge, ears):
+                face = FaceResult(box, det_score, lms)
+                face.average_aspect_ratio, face.left_aspect_ratio, face.right_aspect_ratio = average, left, right
+                faces.append(face)
+        return faces
+
+    def process_frames(self, frames, profiler=NULL_PROFILER):
+        """Detect faces in every frame and run one landmark forward for all of them.
+
+        Returns a list (one entry per frame) of FaceResult lists. Stage times go to
+        profiler (see instrumentation.FrameProfiler).
+        """
+        results = [[] for _ in frames]
+        with profiler.stage('detect'):
+            boxes_per_frame = self.detect_batch(frames)
+        if not any(boxes_per_frame):
+            return results
+        crops = []
+        owners = []
+        with profiler.stage('preprocess'):
+            for frame_idx, (frame, boxes) in enumerate(zip(frames, boxes_per_frame)):
+                for box, det_score in boxes:
+                    crops.append(self.crop(frame, box))
+                    owners.append((frame_idx, box, det_score))
+            inputs = self.preprocess(np.stack(crops))
+        with profiler.stage('forward'):
+            outputs = self.forward(inputs)
+        with profiler.stage('decode'):
+            lms_pred_merge = self.decode(outputs)
+        with profiler.stage('ear'):
+            ears = zip(*calculate_aspect_ratio_batch(lms_pred_merge, self.schema))
+            for (frame_idx, box, det_score), lms, (average, left, right) in zip(owners, lms_pred_merge, ears):
+                face = FaceResult(box, det_score, lms)
+                face.average_aspect_ratio, face.left_aspect_ratio, face.right_aspect_ratio = average, left, right
+                results[frame_idx].append(face)
+        return results
+
+    def process_frame(self, frame):
+        return self.process_frames([frame])[0]
@@ -0,0 +1,118 @@
+"""
+Where the eyes (and the mouth) are in the landmark layout of every dataset.
+
+The EAR code used to assume the 16 eye points of the WFLW snapshot, so no other
+experiments/* model could drive the app. A LandmarkSchema names the landmark
+indices of each eye contour instead, and schema_for(cfg) picks the one matching
+an experiment config, so a model with fewer landmarks or a coarser net_stride can
+be swapped in with --data-name / --experiment-name alone.
+
+A contour is an even number of indices going corner, upper lid, other corner,
+lower lid, so that point i faces point n-i across the eye:
+
+    1 2 3            1
+  0       4   or   0   2
+    7 6 5            3
+
+EAR is the mean distance of the facing pairs over the corner-to-corner width.
+The 16-point layout gives exactly the original calculate_aspect_ratio formula and
+the 6-point 68-landmark eyes the usual Soukupova & Cech EAR. Mouths follow the same
+ordering (inner lip contour where there is one) for a mouth aspect ratio.
+
+pose names the landmarks matching the points of head_pose.POSE_TEMPLATE (nose
+tip, chin, eye and mouth corners) in layouts that have them.
+
+"left" is the eye on the left of the image, as in calculate_aspect_ratio.
+Indices were checked against data/<name>/meanface.txt.
+"""
+
+import numpy as np
+
+
+class LandmarkSchema:
+    def __init__(self, name, num_lms, left_eye=None, right_eye=None, mouth=None, pupils=None, pose=None):
+        self.name = name
+        self.num_lms = num_lms
+        self.left_eye = left_eye
+        self.right_eye = right_eye
+        self.mouth = mouth
+        self.pupils = pupils  # (left, right) eye centres when the layout has them
+        self.pose = pose or {}  # head_pose.POSE_TEMPLATE point name -> landmark index
+        if left_eye is not None:
+            assert len(left_eye) == len(right_eye) and len(left_eye) % 2 == 0, name
+            # (eye, point) index array for calculate_aspect_ratio_batch
+            self.eyes = np.array([left_eye, right_eye])
+        else:
+            self.eyes = None
+
+    @property
+    def has_eyes(self):
+        return self.eyes is not None
+
+    def __repr__(self):
+        return 'LandmarkSchema({!r}, {} landmarks)'.format(self.name, self.num_lms)
+
+
+# the 16 eye landmarks the WFLW snapshots (and the 16-point LaPa configs) were trained on
+EYES_16 = LandmarkSchema('eyes_16', 16, left_eye=list(range(0, 8)), right_eye=list(range(8, 16)))
+
+# iBUG 68-point markup of 300W (and the 300W+CelebA / 300W+COFW+WFLW mixes)
+IBUG_68 = LandmarkSchema('ibug_68', 68, left_eye=list(range(36, 42)), right_eye=list(range(42, 48)),
+                         mouth=list(range(60, 68)),
+                         pose={'nose_tip': 30, 'chin': 8, 'left_eye_outer': 36, 'left_eye_inner': 39,
+                               'right_eye_inner': 42, 'right_eye_outer': 45, 'left_mouth': 48, 'right_mouth': 54})
+
+# COFW: two corners, one upper and one lower lid point per eye, pupils 16 and 17
+COFW_29 = LandmarkSchema('cofw_29', 29, left_eye=[8, 12, 10, 13], right_eye=[11, 14, 9, 15],
+                         mouth=[22, 25, 23, 26], pupils=(16, 17),
+                         pose={'nose_tip': 20, 'chin': 28, 'left_eye_outer': 8, 'left_eye_inner': 10,
+                               'right_eye_inner': 11, 'right_eye_outer': 9, 'left_mouth': 22, 'right_mouth': 23})
+
+# AFLW marks eye corners and centres only, there are no lids to measure an EAR with
+AFLW_19 = LandmarkSchema('aflw_19', 19, pupils=(7, 10),
+                         pose={'nose_tip': 13, 'chin': 18, 'left_eye_outer': 6, 'left_eye_inner': 8,
+                               'right_eye_inner': 9, 'right_eye_outer': 11, 'left_mouth': 15, 'right_mouth': 17})
+
+# LaPa 106-point markup: eye contours 66-73 and 75-82, inner lips 96-103
+LAPA_106 = LandmarkSchema('lapa_106', 106, left_eye=list(range(66, 74)), right_eye=list(range(75, 83)),
+                          mouth=list(range(96, 104)), pupils=(104, 105),
+                          pose={'nose_tip': 54, 'chin': 16, 'left_eye_outer': 66, 'left_eye_inner': 70,
+                                'right_eye_inner': 75, 'right_eye_outer': 79, 'left_mouth': 84, 'right_mouth': 90})
+
+# the Iris experiment is not a face layout: it predicts 5 points on an eye crop
+IRIS_5 = LandmarkSchema('iris_5', 5)
+
+SCHEMAS = {
+    'WFLW': EYES_16,
+    'data_300W': IBUG_68,
+    'data_300W_CELEBA': IBUG_68,
+    'data_300W_COFW_WFLW': IBUG_68,
+    'COFW': COFW_29,
+    'AFLW': AFLW_19,
+    'LaPa': LAPA_106,
+    # ships no meanface, assumed to use the same 106-point order as LaPa
+    '106_points': LAPA_106,
+    'Iris': IRIS_5,
+}
+
+DEFAULT_SCHEMA = EYES_16
+
+
+def get_schema(data_name, num_lms):
+    """Schema of the data_name layout, by landmark count when a dataset has configs of several sizes"""
+    schema = SCHEMAS.get(data_name)
+    if schema is not None and schema.num_lms == num_lms:
+        return schema
+    for schema in SCHEMAS.values():
+        if schema.num_lms == num_lms:
+            return schema
+    raise ValueError('No landmark schema for {} with {} landmarks'.format(data_name, num_lms))
+
+
+def schema_for(cfg, need_eyes=True):
+    """Schema of an experiment config, ValueError when it cannot give an EAR and need_eyes is set"""
+    schema = get_schema(cfg.data_name, cfg.num_lms)
+    if need_eyes and not schema.has_eyes:
+        raise ValueError('{}/{} ({}) has no eyelid landmarks, the eye aspect ratio cannot be computed'.format(
+            cfg.data_name, cfg.experiment_name, schema.name))
+    return schema
@@ -0,0 +1,112 @@
+"""
+Lucas-Kanade propagation of the eye landmarks between landmark inferences.
+
+The Pip_* networks of this project predict the eye landmarks. LandmarkTracker
+lets FaceBoxes + PIP run every `interval` frames and moves the last landmarks
+along the sparse optical flow (cv2.calcOpticalFlowPyrLK) in the frames between,
+inside each face box only. A point that is lost or fails the forward-backward check
+(tracked back to where it started, off by more than max_fb_error pixels) makes the
+caller fall back to inference on that frame, which is what a fast blink does.
+
+Propagated landmarks are handed back as landmark_pipeline.FaceResult, normalised
+to the face box moved by the median flow, so calculate_aspect_ratio sees the
+same kind of input as after a forward pass.
+
+Usage:
+    tracker = LandmarkTracker(interval=3, schema=pipeline.schema)
+    faces = None if tracker.inference_due() else tracker.propagate(frame)
+    if faces is None:
+        faces = pipeline.process_frame(frame)
+        tracker.start(frame, faces)
+"""
+
+import cv2
+import numpy as np
+
+from functions import calculate_aspect_ratio
+from landmark_schema import DEFAULT_SCHEMA
+from landmark_pipeline import FaceResult
+
+
+class LandmarkTracker:
+    def __init__(self, interval=3, max_fb_error=1.0, win_size=(15, 15), max_level=2, margin=0.15, schema=DEFAULT_SCHEMA):
+        self.interval = interval          # frames per landmark inference, 1 disables propagation
+        self.schema = schema              # landmark layout of the pipeline, for the EAR
+        self.max_fb_error = max_fb_error  # pixels
+        self.lk_params = dict(winSize=win_size, maxLevel=max_level,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        self.margin = margin              # flow is computed on the face box grown by this fraction
+        self.frames_inferred = 0
+        self.frames_propagated = 0
+        self.fallbacks = 0
+        self.reset()
+
+    def reset(self):
+        self.prev_gray = None
+        self.faces = []
+        self.points = []
+        self.since_inference = 0
+
+    def inference_due(self):
+        """True when this frame has to go through the models anyway"""
+        return self.interval <= 1 or self.prev_gray is None or not self.faces or self.since_inference >= self.interval - 1
+
+    def start(self, frame, faces):
+        """Take the faces of a frame that went through detection and PIP as the new reference"""
+        self.prev_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.faces = list(faces)
+        self.points = [face.landmarks_px().astype(np.float32) for face in self.faces]
+        self.since_inference = 0
+        self.frames_inferred += 1
+
+    def _region(self, box, shape):
+        det_xmin, det_ymin, det_xmax, det_ymax = box
+        pad_x = int((det_xmax - det_xmin + 1) * self.margin)
+        pad_y = int((det_ymax - det_ymin + 1) * self.margin)
+        return (max(det_xmin - pad_x, 0), max(det_ymin - pad_y, 0),
+                min(det_xmax + pad_x, shape[1] - 1), min(det_ymax + pad_y, shape[0] - 1))
+
+    def _track(self, prev_gray, gray, points, box):
+        """New landmark positions in frame pixels, or None if any point was lost"""
+        x0, y0, x1, y1 = self._region(box, gray.shape)
+        prev_crop = prev_gray[y0:y1 + 1, x0:x1 + 1]
+        crop = gray[y0:y1 + 1, x0:x1 + 1]
+        start = (points - np.float32([x0, y0])).reshape(-1, 1, 2)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_crop, crop, start, None, **self.lk_params)
+        if moved is None or not status.all():
+            return None
+        back, status_back, _ = cv2.calcOpticalFlowPyrLK(crop, prev_crop, moved, None, **self.lk_params)
+        if back is None or not status_back.all():
+            return None
+        fb_error = np.linalg.norm((back - start).reshape(-1, 2), axis=1)
+        if fb_error.max() > self.max_fb_error:
+            return None
+        return moved.reshape(-1, 2) + np.float32([x0, y0])
+
+    def propagate(self, frame):
+        """FaceResults for frame from the flow of the last landmarks, None to fall back to inference"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = []
+        points = []
+        for face, face_points in zip(self.faces, self.points):
+            moved = self._track(self.prev_gray, gray, face_points, face.box)
+            if moved is None:
+                self.fallbacks += 1
+                return None
+            # the box follows the landmarks, it keeps its size so the normalisation matches PIP's crop
+            shift_x, shift_y = np.median(moved - face_points, axis=0)
+            det_xmin, det_ymin, det_xmax, det_ymax = face.box
+            shift_x = int(round(np.clip(shift_x, -det_xmin, gray.shape[1] - 1 - det_xmax)))
+            shift_y = int(round(np.clip(shift_y, -det_ymin, gray.shape[0] - 1 - det_ymax)))
+            box = (det_xmin + shift_x, det_ymin + shift_y, det_xmax + shift_x, det_ymax + shift_y)
+            lms = (moved - np.float32([box[0], box[1]])) / np.float32([box[2] - box[0] + 1, box[3] - box[1] + 1])
+            tracked = FaceResult(box, face.score, lms.reshape(-1))
+            tracked.average_aspect_ratio, tracked.left_aspect_ratio, tracked.right_aspect_ratio = calculate_aspect_ratio(tracked.lms_pred_merge, self.schema)
+            faces.append(tracked)
+            points.append(moved)
+        self.prev_gray = gray
+        self.faces = faces
+        self.points = points
+        self.since_inference += 1
+        self.frames_propagated += 1
+        return faces
@@ -1,7 +1,6 @@
 from pathlib import Path
 import streamlit as st
-import app
-import app_jetson
+# app / app_jetson are imported where they are used, so the page renders before torch loads
 st.set_page_config(
     page_title="Driver Drowsiness Detection",
     page_icon="🤖",
@@ -16,6 +15,8 @@ source_radio = st.sidebar.radio("Select source:", ["Webcam"])
 
 if source_radio == "Webcam":
     #If it is an Ubuntu 22.04 laptop:
+    import app
     app.play_webcam()
-    #If it is a Jetson Nano, uncomment the following line:
+    #If it is a Jetson Nano, uncomment the following lines:
+    # import app_jetson
     # app_jetson.play_webcam()
\ No newline at end of file
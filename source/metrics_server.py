@@ -0,0 +1,304 @@
+"""
+Prometheus-compatible /metrics endpoint for the detection runtime.
+
+The hot loop only touches plain Python numbers under a lock (one observe_frame()
+call per frame); the text exposition is rendered by the HTTP thread when a
+scraper asks for it. Stage latencies are not copied at all: the histograms of the
+loop's FrameProfiler are attached and read at scrape time.
+
+Exported series (label `stream` is "webcam" for the Streamlit app and the stream
+id for stream_server.py):
+    ddd_frames_processed_total, ddd_frames_dropped_total, ddd_face_detected_frames_total
+    ddd_face_detected_ratio (moving average), ddd_fps, ddd_perclos, ddd_eye_aspect_ratio
+    ddd_alerts_total{stream, type}     every alert AttentionScorer.play_alert fires
+    ddd_stage_latency_seconds{stage}   histogram per pipeline stage
+    process_cpu_seconds_total, process_peak_resident_memory_bytes (not exported on Windows)
+    process_resident_memory_bytes      current RSS, Linux only (/proc)
+
+Usage:
+    from metrics_server import get_metrics, start_metrics_server
+    start_metrics_server(9108)
+    curl http://127.0.0.1:9108/metrics
+"""
+
+import os
+import sys
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from histogram import Histogram, LATENCY_BUCKETS
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_PORT = 9108
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in pairs) + '}'
+
+
+def _number(value):
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        self.function = None
+
+    def set_function(self, function):
+        """Compute the (unlabelled) value at scrape time instead of in the hot loop"""
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            return [] if value is None else [(self.name, (), float(value))]
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+    def collect(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help_text), '# TYPE {} {}'.format(self.name, self.kind)]
+        for name, labels, value in self.samples():
+            lines.append('{}{} {}'.format(name, _labels(self.labelnames, labels), _number(value)))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues):
+        return self.values.get(labelvalues, 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = value
+
+    def get(self, *labelvalues):
+        return self.values.get(labelvalues)
+
+
+class HistogramMetric(Metric):
+    """A family of histogram.Histogram, either owned or attached from a FrameProfiler"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = buckets
+
+    def attach(self, histogram, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = histogram
+
+    def observe(self, value, *labelvalues):
+        histogram = self.values.get(labelvalues)
+        if histogram is None:
+            with self.lock:
+                histogram = self.values.setdefault(labelvalues, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def collect(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help_text), '# TYPE {} {}'.format(self.name, self.kind)]
+        with self.lock:
+            families = list(self.values.items())
+        for labels, histogram in families:
+            with histogram.lock:
+                total = histogram.sum
+            cumulative = histogram.cumulative_counts()
+            for bound, count in cumulative:
+                le = ('le', '+Inf' if math.isinf(bound) else repr(bound))
+                lines.append('{}_bucket{} {}'.format(self.name, _labels(self.labelnames, labels, [le]), count))
+            lines.append('{}_sum{} {}'.format(self.name, _labels(self.labelnames, labels), _number(total)))
+            lines.append('{}_count{} {}'.format(self.name, _labels(self.labelnames, labels), cumulative[-1][1]))
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(HistogramMetric(name, help_text, labelnames, buckets))
+
+    def exposition(self):
+        """Prometheus text format of every registered metric"""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+def process_cpu_seconds():
+    """User and system CPU time, None where the resource module is missing (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def process_rss_bytes():
+    """Current resident set size, None without /proc (macOS, Windows)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def process_peak_rss_bytes():
+    """Largest resident set size so far, None where the resource module is missing (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kB everywhere else
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class DetectorMetrics:
+    """The detector's metrics, one instance per process (see get_metrics)"""
+    def __init__(self, registry=None, face_ratio_smoothing=0.05):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.face_ratio_smoothing = face_ratio_smoothing
+        r = self.registry
+        self.frames = r.counter('ddd_frames_processed_total', 'Frames run through the detector', ('stream',))
+        self.dropped = r.counter('ddd_frames_dropped_total', 'Frames captured but never processed', ('stream',))
+        self.face_frames = r.counter('ddd_face_detected_frames_total', 'Processed frames with at least one face', ('stream',))
+        self.face_ratio = r.gauge('ddd_face_detected_ratio', 'Moving average of frames with a face', ('stream',))
+        self.fps = r.gauge('ddd_fps', 'Processed frames per second', ('stream',))
+        self.perclos = r.gauge('ddd_perclos', 'Current PERCLOS score of the driver', ('stream',))
+        self.aspect_ratio = r.gauge('ddd_eye_aspect_ratio', 'Eye aspect ratio of the driver in the last frame', ('stream',))
+        self.alerts = r.counter('ddd_alerts_total', 'Alerts fired by AttentionScorer.play_alert', ('stream', 'type'))
+        self.stage_latency = r.histogram('ddd_stage_latency_seconds', 'Per-frame time spent in each pipeline stage', ('stage',))
+        r.counter('process_cpu_seconds_total', 'User and system CPU time of the process').set_function(process_cpu_seconds)
+        r.gauge('process_resident_memory_bytes', 'Resident set size of the process').set_function(process_rss_bytes)
+        r.gauge('process_peak_resident_memory_bytes', 'Peak resident set size of the process').set_function(process_peak_rss_bytes)
+
+    def observe_frame(self, stream, face_detected, perclos=None, aspect_ratio=None, fps=None, dropped=0):
+        """Everything the loop reports per frame, a handful of dict updates"""
+        self.frames.inc(stream)
+        if dropped:
+            self.dropped.inc(stream, amount=dropped)
+        if face_detected:
+            self.face_frames.inc(stream)
+        ratio = self.face_ratio.get(stream)
+        hit = 1. if face_detected else 0.
+        self.face_ratio.set(hit if ratio is None else ratio + self.face_ratio_smoothing * (hit - ratio), stream)
+        if fps is not None:
+            self.fps.set(fps, stream)
+        if perclos is not None:
+            self.perclos.set(perclos, stream)
+        if aspect_ratio is not None:
+            self.aspect_ratio.set(aspect_ratio, stream)
+
+    def attach_profiler(self, profiler):
+        """Export the stage histograms of an instrumentation.FrameProfiler"""
+        for stage, timer in profiler.timers.items():
+            self.stage_latency.attach(timer.histogram, stage)
+        self.stage_latency.attach(profiler.frame_timer.histogram, 'total')
+
+    def alert_listener(self, stream):
+        """Callback for AttentionScorer.alert_listeners"""
+        def on_alert(alert_type):
+            self.alerts.inc(stream, alert_type)
+        return on_alert
+
+
+def make_metrics_handler(registry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            send_metrics(self, registry)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+def send_metrics(handler, registry):
+    body = registry.exposition().encode('utf-8')
+    handler.send_response(200)
+    handler.send_header('Content-Type', CONTENT_TYPE)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+_metrics = None
+_servers = {}
+_lock = threading.Lock()
+
+
+def get_metrics():
+    """Process-wide DetectorMetrics, shared by every Streamlit session"""
+    global _metrics
+    with _lock:
+        if _metrics is None:
+            _metrics = DetectorMetrics()
+        return _metrics
+
+
+def start_metrics_server(port=DEFAULT_PORT, host='127.0.0.1', registry=None):
+    """Serve /metrics from a daemon thread, once per (host, port); returns the server or None"""
+    if registry is None:
+        registry = get_metrics().registry
+    with _lock:
+        if (host, port) in _servers:
+            return _servers[(host, port)]
+        try:
+            httpd = ThreadingHTTPServer((host, port), make_metrics_handler(registry))
+        except OSError as e:
+            # another detector process already owns the port, run without the endpoint
+            print("Metrics endpoint not started on {}:{}: {}".format(host, port, e))
+            return None
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        _servers[(host, httpd.server_address[1])] = httpd
+        if port != 0:
+            _servers[(host, port)] = httpd
+        return httpd
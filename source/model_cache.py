@@ -0,0 +1,99 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# torch, torchvision and the model code are imported on the loader thread (see prefetch_pipeline)
+DEFAULT_DATA_NAME = "WFLW"
+DEFAULT_EXPERIMENT_NAME = "pip_32_16_60_r18_l2_l1_10_1_nb10"
+
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+
+
+def warm_up(pipeline, frame_shape=(720, 1280, 3), iterations=2):
+    """Run a couple of dummy inferences so the first real frame doesn't pay for allocator/kernel setup"""
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    crop = np.zeros((pipeline.cfg.input_size, pipeline.cfg.input_size, 3), dtype=np.uint8)
+    for _ in range(iterations):
+        pipeline.detect(frame)
+        pipeline.predict([crop])
+
+
+@st.cache_resource(show_spinner="Loading detection models...", max_entries=4)
+def _load_pipeline(data_name, experiment_name, device_name, landmark_weights_mtime, detector_weights_mtime):
+    # the weight mtimes are only part of the cache key, a new snapshot on disk invalidates the entry
+    import torch
+    from landmark_pipeline import LandmarkPipeline
+
+    print("====================================")
+    print("Loading the models on", device_name)
+    pipeline = LandmarkPipeline.from_experiment(data_name, experiment_name, device=torch.device(device_name))
+    warm_up(pipeline)
+    print("Models loaded and warmed up")
+    print("====================================")
+    return pipeline
+
+
+def get_pipeline(data_name=DEFAULT_DATA_NAME, experiment_name=DEFAULT_EXPERIMENT_NAME, use_gpu=None):
+    """LandmarkPipeline shared by every rerun and browser session of this Streamlit server"""
+    import model_loader
+
+    cfg = model_loader.load_experiment_config(data_name, experiment_name)
+    device = model_loader.select_device(cfg.use_gpu if use_gpu is None else use_gpu)
+    return _load_pipeline(data_name, experiment_name, str(device),
+                          _mtime(model_loader.landmark_weights_path(cfg)), _mtime(model_loader.FACEBOXES_WEIGHTS))
+
+
+def _in_script_run(ctx, function, *args):
+    # st.cache_resource (and its spinner) needs the ScriptRunContext of the session that asked
+    if ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+    return function(*args)
+
+
+def prefetch_pipeline(data_name=DEFAULT_DATA_NAME, experiment_name=DEFAULT_EXPERIMENT_NAME, use_gpu=None):
+    """Start get_pipeline on the loader thread and return its Future.
+
+    Callers that arrive while a load is running share it, once it is done the next
+    call goes through get_pipeline again (a cache hit unless the weights changed).
+    The loader thread runs in the ScriptRunContext of the caller that started the load.
+    """
+    key = (data_name, experiment_name, use_gpu)
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is None or future.done():
+            future = _loader.submit(_in_script_run, get_script_run_ctx(), get_pipeline, data_name, experiment_name, use_gpu)
+            _pending[key] = future
+    return future
+
+
+@st.cache_resource(show_spinner="Loading the iris model...", max_entries=2)
+def _load_iris_model(experiment_name, device_name, weights_mtime):
+    import torch
+    from gaze_cascade import IrisModel
+
+    model = IrisModel.from_experiment(experiment_name, device=torch.device(device_name))
+    model.predict([np.zeros((model.input_size, model.input_size, 3), dtype=np.uint8)])
+    print("Iris model loaded on", device_name)
+    return model
+
+
+def get_iris_model(experiment_name, device):
+    """IrisModel for gaze_cascade on the device of the face model, None without a trained Iris snapshot"""
+    import model_loader
+    from gaze_cascade import IRIS_DATA_NAME
+
+    cfg = model_loader.load_experiment_config(IRIS_DATA_NAME, experiment_name)
+    weights = model_loader.landmark_weights_path(cfg)
+    if not os.path.exists(weights):
+        return None
+    return _load_iris_model(experiment_name, str(device), _mtime(weights))
@@ -0,0 +1,86 @@
+import os
+import sys
+import importlib
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+if os.path.join(ROOT_DIR, 'FaceBoxesV2') not in sys.path:
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'FaceBoxesV2'))
+
+import torch
+import torchvision.models as models
+
+from faceboxes_detector import FaceBoxesDetector
+from networks import Pip_resnet18, Pip_resnet50, Pip_resnet101, Pip_mbnetv2, Pip_mbnetv3
+from functions import get_meanface
+import shared_weights
+
+DEFAULT_DATA_NAME = "WFLW"
+DEFAULT_EXPERIMENT_NAME = "pip_32_16_60_r18_l2_l1_10_1_nb10"
+FACEBOXES_WEIGHTS = os.path.join(ROOT_DIR, 'FaceBoxesV2', 'weights', 'FaceBoxesV2.pth')
+
+
+def load_experiment_config(data_name, experiment_name):
+    """Import experiments/<data_name>/<experiment_name>.py and return its Config"""
+    my_config = importlib.import_module('experiments.{}.{}'.format(data_name, experiment_name))
+    cfg = getattr(my_config, 'Config')()
+    cfg.experiment_name = experiment_name
+    cfg.data_name = data_name
+    return cfg
+
+
+def select_device(use_gpu=True):
+    if use_gpu and torch.cuda.is_available():
+        return torch.device("cuda:0")
+    return torch.device('cpu')
+
+
+def build_landmark_net(cfg):
+    """Build the Pip_* network for cfg.backbone (without ImageNet weights, the snapshot overrides them)"""
+    if cfg.backbone == 'resnet18':
+        return Pip_resnet18(models.resnet18(), cfg.num_nb, num_lms=cfg.num_lms, input_size=cfg.input_size, net_stride=cfg.net_stride)
+    elif cfg.backbone == 'resnet50':
+        return Pip_resnet50(models.resnet50(), cfg.num_nb, num_lms=cfg.num_lms, input_size=cfg.input_size, net_stride=cfg.net_stride)
+    elif cfg.backbone == 'resnet101':
+        return Pip_resnet101(models.resnet101(), cfg.num_nb, num_lms=cfg.num_lms, input_size=cfg.input_size, net_stride=cfg.net_stride)
+    elif cfg.backbone == 'mobilenet_v2':
+        return Pip_mbnetv2(models.mobilenet_v2(), cfg.num_nb, num_lms=cfg.num_lms, input_size=cfg.input_size, net_stride=cfg.net_stride)
+    elif cfg.backbone == 'mobilenet_v3':
+        return Pip_mbnetv3(models.mobilenet_v3_large(), cfg.num_nb, num_lms=cfg.num_lms, input_size=cfg.input_size, net_stride=cfg.net_stride)
+    raise ValueError('No such backbone: {}'.format(cfg.backbone))
+
+
+def landmark_weights_path(cfg):
+    save_dir = os.path.join(ROOT_DIR, 'snapshots', cfg.data_name, cfg.experiment_name)
+    return os.path.join(save_dir, 'epoch%d.pth' % (cfg.num_epochs-1))
+
+
+def load_meanface(cfg):
+    """Return (meanface_indices, reverse_index1, reverse_index2, max_len) for cfg"""
+    return get_meanface(os.path.join(ROOT_DIR, 'data', cfg.data_name, 'meanface.txt'), cfg.num_nb)
+
+
+def load_landmark_net(cfg, device, weight_file=None, mmap_weights=False):
+    """Pip_* network with the snapshot loaded, mmap_weights shares the tensors between processes (CPU only)"""
+    if weight_file is None:
+        weight_file = landmark_weights_path(cfg)
+    if mmap_weights and device.type == 'cpu':
+        # build on the meta device so no private copy is allocated before the mapped tensors are assigned
+        with torch.device('meta'):
+            net = build_landmark_net(cfg)
+        state_dict = shared_weights.load_shared_state_dict(weight_file)
+        net.load_state_dict(state_dict, assign=True)
+    else:
+        net = build_landmark_net(cfg)
+        state_dict = torch.load(weight_file, map_location=device)
+        net.load_state_dict(state_dict)
+    net = net.to(device)
+    net.eval()
+    return net
+
+
+def load_face_detector(device, weight_file=FACEBOXES_WEIGHTS, mmap_weights=False):
+    if mmap_weights and device.type == 'cpu':
+        return FaceBoxesDetector('FaceBoxes', shared_weights.export_shared_weights(weight_file), True, device, mmap_weights=True)
+    return FaceBoxesDetector('FaceBoxes', weight_file, True, device)
@@ -0,0 +1,83 @@
+"""
+Frame-difference gate in front of the face detector.
+
+A parked vehicle or an idle cab camera sends the same picture over and over;
+running FaceBoxes and the Pip_* network on it only reproduces the last result.
+MotionGate compares the new frame with the last frame that went through the
+models, on a small grayscale thumbnail of the whole frame plus a thumbnail of every
+face box found there, and lets the frame through when enough pixels changed or
+the last result is older than max_stale seconds. A blink is a few pixels of the
+full-frame thumbnail, so eye closure is caught by the face thumbnails.
+
+Frames that are held back reuse the last faces and EAR; the caller still feeds
+them to AttentionScorer.get_PERCLOS with the current time so PERCLOS keeps counting.
+
+Usage:
+    gate = MotionGate()
+    if gate.should_run(frame, t_now):
+        faces = pipeline.process_frame(frame)
+        gate.update(frame, t_now, [face.box for face in faces])
+"""
+
+import cv2
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.01
+
+
+class MotionGate:
+    def __init__(self, threshold=DEFAULT_THRESHOLD, pixel_thresh=15, max_stale=1.0, frame_size=(80, 60), face_size=64):
+        self.threshold = threshold        # fraction of changed thumbnail pixels that counts as motion
+        self.pixel_thresh = pixel_thresh  # grey-level difference of a changed pixel
+        self.max_stale = max_stale        # seconds a result may be reused
+        self.frame_size = frame_size
+        self.face_size = face_size
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.face_references = []
+        self.boxes = []
+        self.t_update = None
+        self.frames_run = 0
+        self.frames_skipped = 0
+
+    def _thumbnail(self, image, size):
+        # shrink first, the colour conversion then only touches the thumbnail
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _face_thumbnails(self, frame):
+        thumbnails = []
+        for det_xmin, det_ymin, det_xmax, det_ymax in self.boxes:
+            crop = frame[det_ymin:det_ymax + 1, det_xmin:det_xmax + 1]
+            thumbnails.append(self._thumbnail(crop, (self.face_size, self.face_size)))
+        return thumbnails
+
+    def _changed(self, current, reference):
+        changed = cv2.absdiff(current, reference) > self.pixel_thresh
+        return np.count_nonzero(changed) >= self.threshold * changed.size
+
+    def should_run(self, frame, t_now):
+        """True when the models have to look at this frame"""
+        run = (self.reference is None or t_now - self.t_update >= self.max_stale
+               or self._changed(self._thumbnail(frame, self.frame_size), self.reference)
+               or any(self._changed(current, reference)
+                      for current, reference in zip(self._face_thumbnails(frame), self.face_references)))
+        if run:
+            self.frames_run += 1
+        else:
+            self.frames_skipped += 1
+        return run
+
+    def update(self, frame, t_now, boxes=()):
+        """Make frame, processed at t_now with faces at boxes, the new reference"""
+        self.reference = self._thumbnail(frame, self.frame_size)
+        self.boxes = [tuple(int(v) for v in box) for box in boxes]
+        self.face_references = self._face_thumbnails(frame)
+        self.t_update = t_now
+
+    @property
+    def skip_ratio(self):
+        total = self.frames_run + self.frames_skipped
+        return self.frames_skipped / total if total else 0.
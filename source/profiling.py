@@ -0,0 +1,128 @@
+"""
+On-demand torch.profiler capture for the running detector.
+
+A ProfilingWindow is armed for the next N frames from another thread: a SIGUSR1
+handler (headless servers), the "Runtime profiling" expander of the configuration
+page (Streamlit), or code. The detection loop calls window.step() once per frame;
+while the window is off that is a single attribute check. While it is on, every
+op of FaceBoxesV2 and the Pip_* network is recorded (CPU, CUDA when present,
+memory, shapes), the FrameProfiler stages show up as named ranges, and the result
+is written as a Chrome trace (chrome://tracing, ui.perfetto.dev) plus an op summary
+to logs/profiles/.
+
+Only loops that install the handler and step the window can be profiled this way:
+stream_server.py and replay.py. inference_service.py does neither, and the default
+action of SIGUSR1 terminates a process, so do not signal it.
+
+Usage:
+    kill -USR1 <pid of stream_server.py>
+"""
+
+import os
+import time
+import signal
+import threading
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PROFILE_DIR = os.path.join(ROOT_DIR, 'logs', 'profiles')
+DEFAULT_FRAMES = 30
+
+
+class ProfilingWindow:
+    def __init__(self, log_dir=PROFILE_DIR, profile_memory=True, record_shapes=True, with_stack=False):
+        self.log_dir = log_dir
+        self.profile_memory = profile_memory
+        self.record_shapes = record_shapes
+        self.with_stack = with_stack
+        self.requested = 0       # set by arm(), from any thread or a signal handler
+        self.remaining = 0
+        self.profiler = None
+        self.frame_profiler = None
+        self.last_trace = None
+        self.lock = threading.Lock()
+
+    def arm(self, frames=DEFAULT_FRAMES):
+        """Profile the next `frames` frames; a plain store so it is safe from a signal handler"""
+        self.requested = int(frames)
+
+    @property
+    def active(self):
+        return self.profiler is not None
+
+    def step(self, frame_profiler=None):
+        """Call once per frame, from the loop thread"""
+        if self.profiler is None:
+            if not self.requested:
+                return
+            self._start(frame_profiler)
+            return
+        self.profiler.step()
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self._stop()
+
+    def _start(self, frame_profiler):
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with self.lock:
+            self.remaining = self.requested
+            self.requested = 0
+        self.profiler = profile(activities=activities, profile_memory=self.profile_memory,
+                                record_shapes=self.record_shapes, with_stack=self.with_stack)
+        self.profiler.start()
+        if frame_profiler is not None:
+            # name the pipeline stages in the trace
+            frame_profiler.trace_label = torch.profiler.record_function
+            self.frame_profiler = frame_profiler
+        self.t_start = time.time()
+        print("Profiling the next {} frames".format(self.remaining))
+
+    def _stop(self):
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        if self.frame_profiler is not None:
+            self.frame_profiler.trace_label = None
+            self.frame_profiler = None
+        os.makedirs(self.log_dir, exist_ok=True)
+        name = 'trace-{}-{}'.format(time.strftime('%Y%m%d-%H%M%S', time.localtime(self.t_start)), os.getpid())
+        trace_path = os.path.join(self.log_dir, name + '.json')
+        profiler.export_chrome_trace(trace_path)
+        sort_by = 'self_cuda_time_total' if any(evt.device_type.name == 'CUDA' for evt in profiler.key_averages()) else 'self_cpu_time_total'
+        with open(os.path.join(self.log_dir, name + '.txt'), 'w') as f:
+            f.write(profiler.key_averages().table(sort_by=sort_by, row_limit=40))
+            if self.profile_memory:
+                f.write('\n\n')
+                f.write(profiler.key_averages().table(sort_by='self_cpu_memory_usage', row_limit=20))
+        self.last_trace = trace_path
+        print("Profiler trace written to", trace_path)
+
+
+_window = None
+_window_lock = threading.Lock()
+
+
+def get_window():
+    """Process-wide window, so a Streamlit page can arm the loop running in another session"""
+    global _window
+    with _window_lock:
+        if _window is None:
+            _window = ProfilingWindow()
+        return _window
+
+
+def install_signal_handler(frames=DEFAULT_FRAMES, signum=None, window=None):
+    """Arm the window on SIGUSR1; only possible from the main thread on POSIX, returns success"""
+    window = window or get_window()
+    signum = signum if signum is not None else getattr(signal, 'SIGUSR1', None)
+    if signum is None:
+        return False
+    try:
+        signal.signal(signum, lambda received, stack: window.arm(frames))
+    except ValueError:
+        # not the main thread (e.g. a Streamlit script), arm it from the UI instead
+        return False
+    return True
@@ -0,0 +1,379 @@
+"""
+Record camera sessions and replay them through the detection pipeline.
+
+A recording is a directory with
+    frames.u8       raw BGR frames, a (count, height, width, 3) uint8 memmap
+    timestamps.f8   capture time of every frame in seconds from the first one, float64
+    meta.json       shape, count, source and the PERCLOS config at record time
+so replaying is a page-cache read with no decoding in the way. Replays score with
+the recorded PERCLOS config, so editing perclos_config.json later does not turn a
+reference comparison into a mismatch (recordings without one use the live file).
+
+The replay drives the same steps as app.play_webcam (FaceBoxes, crop, Pip_* forward,
+neighbour merge, EAR, AttentionScorer.get_PERCLOS) with the recorded timestamps,
+either as fast as possible or at the original pace (frames that arrive while the
+pipeline is busy are dropped, like a live camera). It reports throughput, the
+end-to-end latency distribution (frame available -> score out) and, given a
+reference run, whether the EAR/PERCLOS outputs still match.
+
+Usage:
+    python source/replay.py record --source 0 --seconds 60 --output recordings/cab1
+    python source/replay.py run recordings/cab1 --save-reference recordings/cab1/reference.npz
+    python source/replay.py run recordings/cab1 --pace realtime --reference recordings/cab1/reference.npz --report out.json
+    python source/replay.py run recordings/cab1 --profile-frames 50
+"""
+
+import os
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+FRAMES_FILE = 'frames.u8'
+TIMESTAMPS_FILE = 'timestamps.f8'
+META_FILE = 'meta.json'
+
+
+class FrameRecorder:
+    """Append frames to a preallocated memmap, trimmed to the recorded length on close()"""
+    def __init__(self, path, shape, max_frames, source=None, perclos_config=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.shape = tuple(shape)
+        self.max_frames = max_frames
+        self.source = source
+        self.perclos_config = perclos_config
+        self.count = 0
+        self.t_first = None
+        self.frames = np.memmap(os.path.join(path, FRAMES_FILE), dtype=np.uint8, mode='w+',
+                                shape=(max_frames,) + self.shape)
+        self.timestamps = np.zeros(max_frames, dtype=np.float64)
+
+    def write(self, frame, t=None):
+        """Store one frame, returns False once the recording is full"""
+        if self.count >= self.max_frames:
+            return False
+        if frame.shape != self.shape:
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
+        t = time.perf_counter() if t is None else t
+        if self.t_first is None:
+            self.t_first = t
+        self.frames[self.count] = frame
+        self.timestamps[self.count] = t - self.t_first
+        self.count += 1
+        return True
+
+    def close(self):
+        self.frames.flush()
+        del self.frames
+        frame_bytes = int(np.prod(self.shape))
+        os.truncate(os.path.join(self.path, FRAMES_FILE), self.count * frame_bytes)
+        self.timestamps[:self.count].tofile(os.path.join(self.path, TIMESTAMPS_FILE))
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump({'shape': list(self.shape), 'count': self.count, 'source': None if self.source is None else str(self.source),
+                       'duration': float(self.timestamps[self.count-1]) if self.count else 0.,
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                       'perclos_config': self.perclos_config}, f, indent=2)
+
+
+class Recording:
+    """Read-only view of a recording directory"""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.shape = tuple(self.meta['shape'])
+        self.count = self.meta['count']
+        self.perclos_config = self.meta.get('perclos_config')  # None in recordings made before it was stored
+        self.frames = np.memmap(os.path.join(path, FRAMES_FILE), dtype=np.uint8, mode='r',
+                                shape=(self.count,) + self.shape) if self.count else np.zeros((0,) + self.shape, np.uint8)
+        self.timestamps = np.fromfile(os.path.join(path, TIMESTAMPS_FILE), dtype=np.float64)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def fps(self):
+        if self.count < 2 or self.timestamps[-1] <= 0:
+            return 0.
+        return (self.count - 1) / self.timestamps[-1]
+
+
+def current_perclos_config():
+    """The config a scorer started now would use (perclos_config.json, defaults if unusable)"""
+    from attention_score import DEFAULT_PERCLOS_CONFIG, read_perclos_config
+    try:
+        return read_perclos_config()
+    except (OSError, ValueError):
+        return dict(DEFAULT_PERCLOS_CONFIG)
+
+
+def record(source, path, seconds=None, max_frames=None, shape=None):
+    """Record a capture source (webcam index, file, RTSP url) into path"""
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise IOError('could not open {}'.format(source))
+    ret, frame = cap.read()
+    if not ret:
+        raise IOError('no frame from {}'.format(source))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.
+    # video files are read faster than real time, their own timestamps are the capture times
+    from_file = os.path.isfile(str(source))
+    if max_frames is None:
+        if from_file and cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 and seconds is None:
+            max_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        else:
+            max_frames = int((seconds or 60) * fps * 1.5) + 1
+    recorder = FrameRecorder(path, shape or frame.shape, max_frames, source, current_perclos_config())
+    t_end = None if seconds is None else time.perf_counter() + seconds
+    try:
+        while ret and recorder.write(frame, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000. if from_file else None):
+            if t_end is not None and time.perf_counter() >= t_end:
+                break
+            ret, frame = cap.read()
+    finally:
+        cap.release()
+        recorder.close()
+    print("Recorded {} frames to {}".format(recorder.count, path))
+    return recorder.count
+
+
+def make_scorer(t_now, config=None):
+    """Silent scorer, with config (a PERCLOS config dict) instead of perclos_config.json if given"""
+    # replays are headless, pygame still wants a device
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    from attention_score import AttentionScorer, validate_perclos_config
+    scorer = AttentionScorer(t_now=t_now, ear_thresh=0.15, gaze_thresh=0.2, perclos_thresh=0.2, roll_thresh=15,
+                             pitch_thresh=15, yaw_thresh=15, ear_time_thresh=0.2, gaze_time_thresh=0.2,
+                             pose_time_thresh=4.0, verbose=False)
+    if config is not None:
+        scorer.apply_config(validate_perclos_config(config))
+    scorer.audio_files = {}
+    return scorer
+
+
+def replay(recording, pipeline, pace='fast', profiler=None, window=None, gate=None, tracker=None, scheduler=None,
+           perclos_config=None):
+    """Run every frame (pace='fast') or every frame that is due when the pipeline is free
+    (pace='realtime') through detection, landmarks and scoring. An armed
+    profiling.ProfilingWindow records torch.profiler traces of the next frames, a
+    motion_gate.MotionGate lets static frames reuse the last faces and a
+    landmark_tracker.LandmarkTracker moves the landmarks between inferences and a
+    frame_scheduler.FrameScheduler trades inference for latency. Scoring uses
+    perclos_config, by default the one stored in the recording.
+
+    Returns (outputs, latencies): outputs has per-frame arrays 'processed', 'ear' and
+    'perclos' (NaN when skipped or no face) and 'status'; latencies in seconds.
+    """
+    from instrumentation import FrameProfiler
+    from frame_scheduler import FULL, LANDMARKS, SKIP
+    profiler = profiler or FrameProfiler(window=None)
+    count = len(recording)
+    outputs = {
+        'processed': np.zeros(count, dtype=bool),
+        'ear': np.full(count, np.nan),
+        'perclos': np.full(count, np.nan),
+        'status': np.array([''] * count, dtype=object),
+    }
+    latencies = []
+    scorer = make_scorer(0., recording.perclos_config if perclos_config is None else perclos_config)
+    faces = []
+    t_start = time.perf_counter()
+    frame_idx = 0
+    while frame_idx < count:
+        if pace == 'realtime':
+            # the newest frame that has "arrived" by now, the ones before it were dropped
+            elapsed = time.perf_counter() - t_start
+            due = int(np.searchsorted(recording.timestamps, elapsed, side='right')) - 1
+            if due < frame_idx:
+                time.sleep(min(recording.timestamps[frame_idx] - elapsed, 0.05))
+                continue
+            frame_idx = due
+            t_available = t_start + recording.timestamps[frame_idx]
+        else:
+            t_available = time.perf_counter()
+
+        profiler.start_frame()
+        with profiler.stage('capture'):
+            frame = np.array(recording.frames[frame_idx])
+        t_frame = recording.timestamps[frame_idx]
+        t_plan = time.perf_counter()
+        mode = scheduler.plan(t_plan, t_available, has_box=bool(faces)) if scheduler is not None else FULL
+        with profiler.stage('gate'):
+            if mode != SKIP and gate is not None and not gate.should_run(frame, t_frame):
+                mode = SKIP
+        if mode != SKIP:
+            tracked = None
+            if mode == FULL and tracker is not None and not tracker.inference_due():
+                with profiler.stage('track'):
+                    tracked = tracker.propagate(frame)
+            if tracked is not None:
+                faces = tracked
+            else:
+                if mode == LANDMARKS:
+                    faces = pipeline.process_boxes(frame, [(face.box, face.score) for face in faces], profiler)
+                else:
+                    faces = pipeline.process_frames([frame], profiler)[0]
+                if tracker is not None:
+                    tracker.start(frame, faces)
+            if gate is not None:
+                gate.update(frame, t_frame, [face.box for face in faces])
+        # the scorer sees recording time; fast replays use the recorded frame rate so they are
+        # deterministic, realtime ones the processed rate like play_webcam does
+        fps = profiler.fps if pace == 'realtime' and profiler.fps > 0 else recording.fps or 10
+        with profiler.stage('scoring'):
+            if faces:
+                driver = max(faces, key=lambda face: face.area)
+                tired, perclos_score = scorer.get_PERCLOS(t_frame, fps, driver.average_aspect_ratio)
+                outputs['ear'][frame_idx] = driver.average_aspect_ratio
+                outputs['perclos'][frame_idx] = perclos_score
+                outputs['status'][frame_idx] = tired
+        if scheduler is not None:
+            scheduler.done(mode, time.perf_counter() - t_plan, t_plan)
+        profiler.end_frame()
+        if window is not None:
+            window.step(profiler)
+        outputs['processed'][frame_idx] = True
+        latencies.append(time.perf_counter() - t_available)
+        frame_idx += 1
+    return outputs, np.array(latencies)
+
+
+def compare_outputs(outputs, reference, ear_tol=1e-4, perclos_tol=1e-6):
+    """Frame-by-frame comparison of two replays over the frames both processed"""
+    both = outputs['processed'] & reference['processed']
+    ear_a, ear_b = outputs['ear'][both], reference['ear'][both]
+    face_mismatch = int(np.count_nonzero(np.isnan(ear_a) != np.isnan(ear_b)))
+    valid = ~np.isnan(ear_a) & ~np.isnan(ear_b)
+    ear_diff = float(np.max(np.abs(ear_a[valid] - ear_b[valid]))) if valid.any() else 0.
+    perclos_diff = float(np.max(np.abs(outputs['perclos'][both][valid] - reference['perclos'][both][valid]))) if valid.any() else 0.
+    status_mismatch = int(np.count_nonzero(outputs['status'][both] != reference['status'][both]))
+    return {
+        'frames_compared': int(np.count_nonzero(both)),
+        'face_mismatch': face_mismatch,
+        'max_ear_diff': ear_diff,
+        'max_perclos_diff': perclos_diff,
+        'status_mismatch': status_mismatch,
+        'match': face_mismatch == 0 and ear_diff <= ear_tol and perclos_diff <= perclos_tol and status_mismatch == 0,
+    }
+
+
+def save_outputs(path, outputs):
+    np.savez_compressed(path, processed=outputs['processed'], ear=outputs['ear'], perclos=outputs['perclos'],
+                        status=outputs['status'].astype(str))
+
+
+def load_outputs(path):
+    data = np.load(path)
+    return {'processed': data['processed'], 'ear': data['ear'], 'perclos': data['perclos'],
+            'status': data['status'].astype(object)}
+
+
+def summarize(recording, outputs, latencies, wall_time, profiler):
+    processed = int(np.count_nonzero(outputs['processed']))
+    latencies_ms = latencies * 1000.
+    return {
+        'frames': len(recording),
+        'processed': processed,
+        'dropped': len(recording) - processed,
+        'wall_time_s': wall_time,
+        'throughput_fps': processed / wall_time if wall_time > 0 else 0.,
+        'recorded_fps': recording.fps,
+        'latency_ms': {
+            'mean': float(latencies_ms.mean()) if processed else 0.,
+            'p50': float(np.percentile(latencies_ms, 50)) if processed else 0.,
+            'p95': float(np.percentile(latencies_ms, 95)) if processed else 0.,
+            'p99': float(np.percentile(latencies_ms, 99)) if processed else 0.,
+            'max': float(latencies_ms.max()) if processed else 0.,
+        },
+        'stages': profiler.snapshot()['stages'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record camera sessions and replay them through the pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='record a capture source')
+    record_parser.add_argument('--source', required=True, help='webcam index, video file or RTSP url')
+    record_parser.add_argument('--output', required=True, help='recording directory')
+    record_parser.add_argument('--seconds', type=float, default=None)
+    record_parser.add_argument('--frames', type=int, default=None, help='stop after this many frames')
+
+    run_parser = subparsers.add_parser('run', help='replay a recording through the pipeline')
+    run_parser.add_argument('recording')
+    run_parser.add_argument('--pace', choices=('fast', 'realtime'), default='fast')
+    run_parser.add_argument('--data-name', default='WFLW')
+    run_parser.add_argument('--experiment-name', default='pip_32_16_60_r18_l2_l1_10_1_nb10')
+    run_parser.add_argument('--cpu', action='store_true', help='force CPU inference')
+    run_parser.add_argument('--reference', default=None, help='outputs of a reference run (.npz) to compare against')
+    run_parser.add_argument('--save-reference', default=None, help='store this run\'s outputs (.npz)')
+    run_parser.add_argument('--report', default=None, help='write the summary as JSON')
+    run_parser.add_argument('--motion-threshold', type=float, default=0,
+                            help='skip the models on frames with less change than this (see motion_gate.py, 0 disables)')
+    run_parser.add_argument('--landmark-interval', type=int, default=1, metavar='K',
+                            help='run the models every K frames, optical flow in between (see landmark_tracker.py)')
+    run_parser.add_argument('--latency-budget', type=float, default=None, metavar='SECONDS',
+                            help='schedule full / landmarks-only / skipped frames to stay within this latency (see frame_scheduler.py)')
+    run_parser.add_argument('--profile-frames', type=int, default=0, metavar='N',
+                            help='record a torch.profiler trace of the first N frames to logs/profiles')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.source, args.output, args.seconds, args.frames)
+        return
+
+    import model_loader
+    from landmark_pipeline import LandmarkPipeline
+    from instrumentation import FrameProfiler
+    from model_cache import warm_up
+    from profiling import get_window, install_signal_handler
+    from motion_gate import MotionGate
+    from landmark_tracker import LandmarkTracker
+    from frame_scheduler import FrameScheduler
+
+    recording = Recording(args.recording)
+    if recording.perclos_config is None:
+        print("{} has no PERCLOS config, scoring with perclos_config.json".format(args.recording))
+    device = model_loader.select_device(False) if args.cpu else None
+    pipeline = LandmarkPipeline.from_experiment(args.data_name, args.experiment_name, device=device)
+    warm_up(pipeline, recording.shape)
+    profiler = FrameProfiler(window=None)
+    window = get_window()
+    install_signal_handler()
+    if args.profile_frames:
+        window.arm(args.profile_frames)
+    t_start = time.perf_counter()
+    gate = MotionGate(args.motion_threshold) if args.motion_threshold else None
+    tracker = LandmarkTracker(args.landmark_interval, schema=pipeline.schema) if args.landmark_interval > 1 else None
+    scheduler = None
+    if args.latency_budget is not None:
+        scheduler = FrameScheduler(args.latency_budget, frame_interval=1. / recording.fps if recording.fps else 1 / 30.)
+    outputs, latencies = replay(recording, pipeline, args.pace, profiler, window, gate, tracker, scheduler)
+    summary = summarize(recording, outputs, latencies, time.perf_counter() - t_start, profiler)
+    summary.update({'pace': args.pace, 'experiment': args.experiment_name, 'device': str(pipeline.device)})
+    if gate is not None:
+        summary['motion_skip_ratio'] = gate.skip_ratio
+    if scheduler is not None:
+        summary['scheduler'] = scheduler.snapshot()
+    if tracker is not None:
+        summary['landmark_tracking'] = {'inferred': tracker.frames_inferred, 'propagated': tracker.frames_propagated,
+                                        'fallbacks': tracker.fallbacks}
+    if args.reference:
+        summary['reference'] = compare_outputs(outputs, load_outputs(args.reference))
+    if args.save_reference:
+        save_outputs(args.save_reference, outputs)
+
+    print("{processed}/{frames} frames, {throughput_fps:.1f} fps (recorded at {recorded_fps:.1f} fps)".format(**summary))
+    print("latency p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms, max {max:.1f} ms".format(**summary['latency_ms']))
+    if 'reference' in summary:
+        print("reference: {}".format('match' if summary['reference']['match'] else 'MISMATCH'), summary['reference'])
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
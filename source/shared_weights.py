@@ -0,0 +1,156 @@
+"""
+Share model weights between inference worker processes.
+
+Every worker that torch.load()s the checkpoints gets its own private copy of the
+Pip_* and FaceBoxesV2 tensors. Here each checkpoint is converted once into the
+zipfile format and then memory-mapped by every worker (torch.load(mmap=True) +
+load_state_dict(assign=True)), so all workers, forked or spawned, use the same
+page-cache pages read-only. On a 4 GB edge device that decides how many camera
+streams fit.
+
+The memory report reads /proc/<pid>/smaps_rollup (Linux) and splits the RSS of
+each worker into pages unique to it and pages shared with other processes.
+
+Usage:
+    python source/shared_weights.py --workers 4            # mapped weights
+    python source/shared_weights.py --workers 4 --no-mmap  # private copies, for comparison
+"""
+
+import os
+import time
+import argparse
+import multiprocessing as mp
+
+import torch
+
+CACHE_DIR = os.environ.get('DDD_WEIGHTS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'driver_drowsiness', 'weights'))
+
+
+def shared_weights_path(weight_file, cache_dir=None):
+    """Cache file for weight_file, keyed by its mtime so a retrained snapshot gets a new copy"""
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+    mtime_ns = os.stat(weight_file).st_mtime_ns
+    name = '{}.{}.pt'.format(os.path.splitext(os.path.basename(weight_file))[0], mtime_ns)
+    return os.path.join(cache_dir, name)
+
+
+def export_shared_weights(weight_file, cache_dir=None):
+    """Re-save weight_file in the mmap-able zipfile format (once) and return the copy's path"""
+    path = shared_weights_path(weight_file, cache_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        state_dict = torch.load(weight_file, map_location='cpu')
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        torch.save(state_dict, tmp_path, _use_new_zipfile_serialization=True)
+        try:
+            # link never replaces: when workers race on first start, they all map the winner's file
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # filesystem without hard links
+            os.replace(tmp_path, path)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def load_shared_state_dict(weight_file, cache_dir=None):
+    """State dict whose tensors are read-only mappings of the shared cache file"""
+    return torch.load(export_shared_weights(weight_file, cache_dir), map_location='cpu', mmap=True)
+
+
+def process_memory(pid='self'):
+    """RSS split of a process in kB: {'rss', 'pss', 'shared', 'unique'} or None off Linux"""
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    fields = {}
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].endswith(':'):
+            fields[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'unique': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def memory_report(pids):
+    """Print and return the RSS split of every pid"""
+    report = {}
+    print("{:>8} {:>10} {:>10} {:>10} {:>10}".format('pid', 'rss MB', 'unique MB', 'shared MB', 'pss MB'))
+    for pid in pids:
+        memory = process_memory(pid)
+        report[pid] = memory
+        if memory is None:
+            print("{:>8} {:>10}".format(pid, 'n/a'))
+            continue
+        print("{:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            pid, memory['rss']/1024, memory['unique']/1024, memory['shared']/1024, memory['pss']/1024))
+    known = [m for m in report.values() if m is not None]
+    if known:
+        print("total unique: {:.1f} MB, total pss: {:.1f} MB".format(
+            sum(m['unique'] for m in known)/1024, sum(m['pss'] for m in known)/1024))
+    return report
+
+
+def _worker(data_name, experiment_name, mmap_weights, ready, stop):
+    import numpy as np
+    import model_loader
+    device = torch.device('cpu')
+    cfg = model_loader.load_experiment_config(data_name, experiment_name)
+    detector = model_loader.load_face_detector(device, mmap_weights=mmap_weights)
+    # one inference touches every weight page, like a warm worker would
+    detector.detect(np.zeros((480, 640, 3), dtype=np.uint8), 0.9, 1)
+    net = None
+    if os.path.exists(model_loader.landmark_weights_path(cfg)):
+        net = model_loader.load_landmark_net(cfg, device, mmap_weights=mmap_weights)
+        with torch.no_grad():
+            net(torch.zeros(1, 3, cfg.input_size, cfg.input_size))
+    ready.set()
+    stop.wait()
+    del detector, net
+
+
+def main():
+    import model_loader
+
+    parser = argparse.ArgumentParser(description='Start N model workers and report their unique/shared memory')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--no-mmap', action='store_true', help='load private copies of the weights instead')
+    parser.add_argument('--data-name', default=model_loader.DEFAULT_DATA_NAME)
+    parser.add_argument('--experiment-name', default=model_loader.DEFAULT_EXPERIMENT_NAME)
+    args = parser.parse_args()
+
+    # convert the checkpoints once up front instead of in every worker
+    cfg = model_loader.load_experiment_config(args.data_name, args.experiment_name)
+    if not args.no_mmap:
+        export_shared_weights(model_loader.FACEBOXES_WEIGHTS)
+        if os.path.exists(model_loader.landmark_weights_path(cfg)):
+            export_shared_weights(model_loader.landmark_weights_path(cfg))
+
+    ctx = mp.get_context('spawn')
+    stop = ctx.Event()
+    workers = []
+    for _ in range(args.workers):
+        ready = ctx.Event()
+        process = ctx.Process(target=_worker, args=(args.data_name, args.experiment_name, not args.no_mmap, ready, stop))
+        process.start()
+        workers.append((process, ready))
+    for _, ready in workers:
+        ready.wait()
+    time.sleep(0.5)
+    memory_report([process.pid for process, _ in workers])
+    stop.set()
+    for process, _ in workers:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
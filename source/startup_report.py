@@ -0,0 +1,109 @@
+"""
+Startup-time report for the Streamlit entry points.
+
+Imports a module in a fresh interpreter with `python -X importtime` and breaks the
+cost down by top-level package, so a heavy dependency that slipped back onto the
+import path of launcher.py/app.py shows up at once. Optionally also times building
+and warming up the models the way model_cache does.
+
+Usage:
+    python source/startup_report.py app
+    python source/startup_report.py app config_page --top 20 --models
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SOURCE_DIR)
+
+
+def parse_importtime(stderr):
+    """Lines of -X importtime output -> list of (module, depth, self_us, cumulative_us)"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            # header line
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return entries
+
+
+def measure_import(module, python=sys.executable):
+    """Import module in a fresh interpreter, returns (wall seconds, importtime entries)"""
+    # same layout as `streamlit run source/launcher.py` from the repository root
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SOURCE_DIR, os.environ.get('PYTHONPATH')])))
+    t_start = time.perf_counter()
+    result = subprocess.run([python, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                            cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t_start
+    if result.returncode != 0:
+        raise RuntimeError('importing {} failed:\n{}'.format(module, result.stderr[-2000:]))
+    return wall, parse_importtime(result.stderr)
+
+
+def by_package(entries):
+    """Self time summed per top-level package, largest first"""
+    totals = {}
+    for name, _, self_us, _ in entries:
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def print_report(module, wall, entries, top=15):
+    target = [e for e in entries if e[0] == module]
+    total_us = target[-1][3] if target else sum(e[2] for e in entries)
+    print("====================================")
+    print("import {}: {:.0f} ms (interpreter wall time {:.0f} ms)".format(module, total_us/1000, wall*1000))
+    # share of all import work, imports done by the model loader thread included
+    total_self_us = sum(e[2] for e in entries)
+    print("{:<32} {:>10} {:>7}".format('package', 'self ms', 'share'))
+    for package, self_us in by_package(entries)[:top]:
+        print("{:<32} {:>10.1f} {:>6.1f}%".format(package, self_us/1000, 100.*self_us/max(total_self_us, 1)))
+
+
+def measure_models(data_name, experiment_name, use_gpu):
+    sys.path.insert(0, SOURCE_DIR)
+    import model_loader
+    from landmark_pipeline import LandmarkPipeline
+    from model_cache import warm_up
+
+    t_start = time.perf_counter()
+    device = model_loader.select_device(use_gpu)
+    pipeline = LandmarkPipeline.from_experiment(data_name, experiment_name, device=device)
+    t_loaded = time.perf_counter()
+    warm_up(pipeline)
+    t_warm = time.perf_counter()
+    print("====================================")
+    print("model load: {:.0f} ms, warm-up: {:.0f} ms ({})".format(
+        (t_loaded-t_start)*1000, (t_warm-t_loaded)*1000, device))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Break down the import time of the Streamlit entry modules')
+    parser.add_argument('modules', nargs='*', default=['app'], help='modules under source/ to import')
+    parser.add_argument('--top', type=int, default=15, help='number of packages to list')
+    parser.add_argument('--models', action='store_true', help='also time model loading and warm-up')
+    parser.add_argument('--data-name', default='WFLW')
+    parser.add_argument('--experiment-name', default='pip_32_16_60_r18_l2_l1_10_1_nb10')
+    parser.add_argument('--cpu', action='store_true', help='time the models on the CPU')
+    args = parser.parse_args()
+
+    for module in args.modules:
+        wall, entries = measure_import(module)
+        print_report(module, wall, entries, args.top)
+    if args.models:
+        measure_models(args.data_name, args.experiment_name, not args.cpu)
+
+
+if __name__ == '__main__':
+    main()
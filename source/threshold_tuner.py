@@ -0,0 +1,310 @@
+"""
+Offline tuning of the PERCLOS thresholds against recorded EAR traces.
+
+The configuration page makes operators guess ear_thresh, sleep_threshold,
+perclos_time_period and the PERCLOS bands. This module replays a recorded EAR
+series (a frame_log directory, or any CSV with t and ear columns) through
+thousands of threshold combinations and reports, for each one, how many alerts
+of every level it would have raised and, given labelled drowsiness events, how
+many of them it caught, how late and how many alerts fell outside of them.
+
+No model runs again: the EAR is all AttentionScorer.get_PERCLOS looks at, and
+nearly all of its work is shared between configurations. The closed mask only
+depends on ear_thresh, the PERCLOS series on (ear_thresh, perclos_time_period)
+and is a cumulative sum with a searchsorted window start, the continuous-closure
+length is a run-length pass. For every (ear_thresh, period) pair the statuses of
+all (sleep_threshold, band scale) combinations are then one (configs, samples)
+np.select, and the once-per-period alerts come from the segments between two
+alert re-arms: a level fires on its first sample of a segment, which is always a
+point where the status or the segment changes, so only those are scanned. Only
+the re-arm times are found sequentially, one step per period. The default grid
+of 6370 configurations takes about 2 s on half an hour of 15 fps samples.
+
+replay() gives the statuses, scores and alerts of a single configuration the
+same way, test_threshold_tuner.py checks them against AttentionScorer. Alerts
+are counted as AttentionScorer raises them to its listeners, Sleeping once per
+onset.
+
+Frames without a face are dropped, the scorer is not called for them either.
+Labelled events are (start, end) in seconds from the first sample of the trace;
+an event is caught by any alert between its start and its end plus tolerance.
+
+Usage:
+    python source/threshold_tuner.py logs/frames --events events.csv --top 20
+"""
+
+import os
+import sys
+import argparse
+from itertools import product
+
+import numpy as np
+
+from attention_score import read_perclos_config, validate_perclos_config
+from fleet_scorer import NO_STATUS, AWAKE, SEMI_CLOSED, MODERATELY_DROWSY, DROWSY, SLEEPING, STATUS_NAMES
+
+# keys scaled by band_scale, in the order the scorer checks them
+BAND_KEYS = ('semi_closed_max', 'moderately_drowsy_min', 'moderately_drowsy_max', 'drowsy_min', 'drowsy_max',
+             'very_drowsy_min', 'very_drowsy_max', 'sleeping_min')
+ALERT_LEVELS = (SEMI_CLOSED, MODERATELY_DROWSY, DROWSY, SLEEPING)
+
+DEFAULT_EAR_THRESHOLDS = tuple(np.round(np.arange(0.05, 0.305, 0.01), 2))
+DEFAULT_SLEEP_THRESHOLDS = (1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0)
+DEFAULT_PERIODS = (10, 20, 30, 45, 60, 90, 120)
+DEFAULT_BAND_SCALES = (0.5, 0.75, 1.0, 1.5, 2.0)
+
+RESULT_DTYPE = np.dtype([
+    ('ear_thresh', 'f4'), ('sleep_threshold', 'f4'), ('perclos_time_period', 'f4'), ('band_scale', 'f4'),
+    ('alerts', 'i4'), ('semi_closed', 'i4'), ('moderately_drowsy', 'i4'), ('drowsy', 'i4'), ('sleeping', 'i4'),
+    ('detected', 'i4'), ('recall', 'f4'), ('false_alerts', 'i4'), ('false_per_hour', 'f4'),
+    ('mean_latency', 'f4'), ('first_alert', 'f4'),
+])
+
+
+def load_trace(source, stream=None):
+    """(t, ear) of the frames with a face, sorted by time, from a frame_log directory or file or a CSV"""
+    if os.path.isdir(source) or source.endswith('.bin'):
+        from frame_log import FACE, load_logs, read_log
+        records = load_logs(source, stream=stream) if os.path.isdir(source) else read_log(source)
+        if stream is not None and not os.path.isdir(source):
+            records = records[records['stream'] == stream]
+        records = records[(records['flags'] & FACE) > 0]
+        t, ear = records['t'].astype(np.float64), records['ear'].astype(np.float64)
+    else:
+        with open(source) as f:
+            columns = f.readline().strip().split(',')
+        data = np.genfromtxt(source, delimiter=',', skip_header=1, usecols=(columns.index('t'), columns.index('ear')))
+        t, ear = data.reshape(-1, 2).T
+    keep = np.isfinite(t) & np.isfinite(ear)
+    order = np.argsort(t[keep], kind='stable')
+    return t[keep][order], ear[keep][order]
+
+
+def parse_events(text):
+    """(K, 2) array of (start, end) seconds from 'start,end' lines; blank lines and # comments are skipped"""
+    events = []
+    for line in text.splitlines():
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+        start, end = (float(value) for value in line.replace(';', ',').split(',')[:2])
+        if end < start:
+            raise ValueError('event ends before it starts: {}'.format(line))
+        events.append((start, end))
+    return np.array(events, dtype=np.float64).reshape(-1, 2)
+
+
+def config_for(base_config, ear_thresh, sleep_threshold, perclos_time_period, band_scale=1.0):
+    """base_config with the tuned values, bands multiplied by band_scale"""
+    config = dict(base_config)
+    for key in BAND_KEYS:
+        config[key] = round(float(base_config[key]) * float(band_scale), 4)
+    config['ear_thresh'] = round(float(ear_thresh), 4)
+    config['sleep_threshold'] = float(sleep_threshold)
+    config['perclos_time_period'] = int(perclos_time_period) if float(perclos_time_period).is_integer() else float(perclos_time_period)
+    return validate_perclos_config(config)
+
+
+def sample_weights(t, max_sample_gap=1.0):
+    """Time each sample stands for, as AttentionScorer.update_perclos_window weighs it"""
+    dt = np.zeros(len(t))
+    dt[1:] = np.minimum(np.maximum(np.diff(t), 0.), max_sample_gap)
+    return dt
+
+
+def perclos_series(t, dt, closed, period):
+    """PERCLOS after every sample: closed time of the samples newer than t - period, over period"""
+    closed_sum = np.concatenate([[0.], np.cumsum(np.where(closed, dt, 0.))])
+    window_start = np.searchsorted(t, t - period, side='right')
+    return np.maximum(closed_sum[1:] - closed_sum[window_start], 0.) / period
+
+
+def closure_durations(t, closed):
+    """Time since the current run of closed samples started, -inf where the eyes are open"""
+    idx = np.arange(len(t))
+    starts = closed & ~np.concatenate([[False], closed[:-1]])
+    run_start = np.maximum.accumulate(np.where(starts, idx, 0))
+    return np.where(closed, t - t[run_start], -np.inf)
+
+
+def classify(perclos, bands):
+    """Status codes (len(bands), samples) of a PERCLOS series under every row of bands (BAND_KEYS order)"""
+    p = perclos[None, :]
+    b = [column[:, None] for column in np.asarray(bands, dtype=np.float64).T]
+    return np.select([p < b[0], (b[1] <= p) & (p <= b[2]), (b[3] <= p) & (p <= b[4]), (b[5] <= p) & (p <= b[6]), p > b[7]],
+                     [AWAKE, SEMI_CLOSED, MODERATELY_DROWSY, DROWSY, SLEEPING], NO_STATUS).astype(np.int8)
+
+
+def rearm_segments(t, scored, period, t_start):
+    """Alert period of every sample: the scorer re-arms on the first scored sample period after the last re-arm"""
+    count = len(t)
+    next_scored = np.minimum.accumulate(np.where(scored, np.arange(count), count)[::-1])[::-1]
+    next_scored = np.append(next_scored, count)
+    rearm = np.zeros(count, dtype=bool)
+    prev = t_start
+    while True:
+        j = int(np.searchsorted(t, prev + period, side='left'))
+        # same comparison as the scorer, not prev + period
+        while j < count and t[j] - prev < period:
+            j += 1
+        while j > 0 and t[j - 1] - prev >= period:
+            j -= 1
+        i = next_scored[j]
+        if i >= count:
+            break
+        rearm[i] = True
+        prev = t[i]
+    # the re-arming sample still belongs to the old period
+    return np.concatenate([[0], np.cumsum(rearm)[:-1]]).astype(np.int32)
+
+
+def alert_events(codes, segments, group=1):
+    """(rows, samples, levels) of every alert raised, ordered by row then sample; row r is in the periods of segments[r // group].
+
+    A once-per-period level fires on its first sample of an alert period, Sleeping
+    on every onset; either happens where the status or the period changes, and
+    statuses last many samples, so only those change points are looked at.
+    """
+    changed = np.ones(codes.shape, dtype=bool)
+    changed[:, 1:] = codes[:, 1:] != codes[:, :-1]
+    new_period = np.zeros(segments.shape, dtype=bool)
+    new_period[:, 1:] = segments[:, 1:] != segments[:, :-1]
+    changed |= np.repeat(new_period, group, axis=0)
+    rows, cols = np.nonzero(changed)
+    levels = codes[rows, cols]
+    new_status = (cols == 0) | (codes[rows, np.maximum(cols - 1, 0)] != levels)
+    fire = (levels == SLEEPING) & new_status
+    periods = segments[rows // group, cols]
+    for code in (SEMI_CLOSED, MODERATELY_DROWSY, DROWSY):
+        hits = np.flatnonzero(levels == code)
+        first = np.ones(len(hits), dtype=bool)
+        first[1:] = (rows[hits[1:]] != rows[hits[:-1]]) | (periods[hits[1:]] != periods[hits[:-1]])
+        fire[hits[first]] = True
+    return rows[fire], cols[fire], levels[fire]
+
+
+def _evaluate(t, dt, ear, ear_thresh, period, sleep_thresholds, bands):
+    """Codes, PERCLOS and alert events of every (sleep threshold, bands) pair, rows sleep-major"""
+    closed = ear <= ear_thresh
+    perclos = perclos_series(t, dt, closed, period)
+    band_codes = classify(perclos, bands)
+    durations = closure_durations(t, closed)
+    codes, segments = [], []
+    for sleep_threshold in sleep_thresholds:
+        asleep = durations >= sleep_threshold
+        codes.append(np.where(asleep[None, :], np.int8(SLEEPING), band_codes))
+        segments.append(rearm_segments(t, ~asleep, period, t[0]))
+    codes = np.concatenate(codes)
+    return codes, perclos, alert_events(codes, np.stack(segments), group=len(bands))
+
+
+def tune(t, ear, events=None, base_config=None, ear_thresholds=DEFAULT_EAR_THRESHOLDS,
+         sleep_thresholds=DEFAULT_SLEEP_THRESHOLDS, periods=DEFAULT_PERIODS, band_scales=DEFAULT_BAND_SCALES,
+         tolerance=5.0, max_sample_gap=1.0):
+    """Results (RESULT_DTYPE, one row per configuration) of every combination of the grid.
+
+    t, ear are the face frames of a trace (see load_trace), events the labelled
+    (start, end) seconds from t[0] or None. Bands are those of base_config (the
+    saved config by default) times each band scale.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    ear = np.asarray(ear, dtype=np.float64)
+    if len(t) < 2:
+        raise ValueError('the trace needs at least two samples')
+    base_config = read_perclos_config() if base_config is None else validate_perclos_config(base_config)
+    base_bands = np.array([base_config[key] for key in BAND_KEYS], dtype=np.float64)
+    bands = np.asarray(band_scales, dtype=np.float64)[:, None] * base_bands[None, :]
+    dt = sample_weights(t, max_sample_gap)
+    count = len(t)
+    hours = max(t[-1] - t[0], 1e-9) / 3600.
+
+    events = np.zeros((0, 2)) if events is None else np.asarray(events, dtype=np.float64).reshape(-1, 2)
+    starts = t[0] + events[:, 0]
+    lo = np.searchsorted(t, starts, side='left')
+    hi = np.searchsorted(t, t[0] + events[:, 1] + tolerance, side='right')
+    inside = np.zeros(count + 1, dtype=np.int32)
+    np.add.at(inside, lo, 1)
+    np.add.at(inside, hi, -1)
+    inside = np.cumsum(inside[:-1]) > 0
+
+    num_rows = len(sleep_thresholds) * len(band_scales)
+    row_ids = np.arange(num_rows)
+    results = np.zeros((len(ear_thresholds), len(periods), num_rows), dtype=RESULT_DTYPE)
+    for (e_idx, ear_thresh), (p_idx, period) in product(enumerate(ear_thresholds), enumerate(periods)):
+        _, _, (rows, cols, levels) = _evaluate(t, dt, ear, ear_thresh, period, sleep_thresholds, bands)
+        block = results[e_idx, p_idx]
+        block['ear_thresh'] = ear_thresh
+        block['perclos_time_period'] = period
+        block['sleep_threshold'] = np.repeat(sleep_thresholds, len(band_scales))
+        block['band_scale'] = np.tile(band_scales, len(sleep_thresholds))
+        for field, code in zip(('semi_closed', 'moderately_drowsy', 'drowsy', 'sleeping'), ALERT_LEVELS):
+            block[field] = np.bincount(rows[levels == code], minlength=num_rows)
+        block['alerts'] = np.bincount(rows, minlength=num_rows)
+        block['false_alerts'] = np.bincount(rows[~inside[cols]], minlength=num_rows)
+        block['false_per_hour'] = block['false_alerts'] / hours
+        # first alert of a row at or after a sample: search the (row, sample) keys, sorted as the alerts are
+        keys = np.append(rows.astype(np.int64) * (count + 1) + cols, np.iinfo(np.int64).max)
+        row_base = row_ids.astype(np.int64)[:, None] * (count + 1)
+        first_key = keys[np.searchsorted(keys, row_base)]
+        block['first_alert'] = np.where(first_key < row_base + count, t[np.minimum(first_key - row_base, count - 1)] - t[0], np.nan)[:, 0]
+        if len(events):
+            first_key = keys[np.searchsorted(keys, row_base + lo[None, :])]
+            caught = first_key < row_base + hi[None, :]
+            latency = np.where(caught, t[np.minimum(first_key - row_base, count - 1)] - starts[None, :], 0.)
+            block['detected'] = caught.sum(axis=1)
+            block['recall'] = block['detected'] / len(events)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                block['mean_latency'] = np.where(block['detected'] > 0, latency.sum(axis=1) / block['detected'], np.nan)
+        else:
+            block['recall'] = np.nan
+            block['mean_latency'] = np.nan
+    return results.reshape(-1)
+
+
+def rank(results):
+    """Indices of results, best first: most events caught, fewest false alerts, earliest"""
+    recall = np.nan_to_num(results['recall'], nan=0.)
+    latency = np.nan_to_num(results['mean_latency'], nan=np.inf)
+    return np.lexsort((latency, results['false_per_hour'], -recall))
+
+
+def replay(t, ear, config, max_sample_gap=1.0):
+    """(status codes, PERCLOS, [(t, alert type)]) of one validated config over a trace, as AttentionScorer gives them"""
+    t = np.asarray(t, dtype=np.float64)
+    ear = np.asarray(ear, dtype=np.float64)
+    bands = np.array([[config[key] for key in BAND_KEYS]], dtype=np.float64)
+    codes, perclos, (_, cols, levels) = _evaluate(t, sample_weights(t, max_sample_gap), ear, config['ear_thresh'],
+                                                  config['perclos_time_period'], [config['sleep_threshold']], bands)
+    codes = codes[0]
+    asleep = (codes == SLEEPING) & (closure_durations(t, ear <= config['ear_thresh']) >= config['sleep_threshold'])
+    perclos = np.where(asleep, 100.0, perclos)
+    alerts = [(float(t[col]), STATUS_NAMES[level]) for col, level in zip(cols, levels)]
+    return codes, perclos, alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay an EAR trace against a grid of PERCLOS configurations')
+    parser.add_argument('trace', help='frame_log directory or file, or a CSV with t and ear columns')
+    parser.add_argument('--stream', type=int, help='frame log stream number')
+    parser.add_argument('--events', help="file of 'start,end' lines, seconds from the start of the trace")
+    parser.add_argument('--tolerance', type=float, default=5.0, help='seconds after an event an alert still counts')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    t, ear = load_trace(args.trace, args.stream)
+    events = None
+    if args.events:
+        with open(args.events) as f:
+            events = parse_events(f.read())
+    results = tune(t, ear, events, tolerance=args.tolerance)
+    print("{} configurations over {} samples ({:.1f} min), {} events".format(
+        len(results), len(t), (t[-1] - t[0]) / 60. if len(t) else 0., 0 if events is None else len(events)))
+    print("{:>5} {:>6} {:>6} {:>5} {:>7} {:>7} {:>9} {:>8}".format('ear', 'sleep', 'period', 'bands', 'alerts', 'recall', 'false/h', 'latency'))
+    for row in results[rank(results)[:args.top]]:
+        print("{:5.2f} {:6.1f} {:6.0f} {:5.2f} {:7d} {:7.2f} {:9.1f} {:8.1f}".format(
+            row['ear_thresh'], row['sleep_threshold'], row['perclos_time_period'], row['band_scale'], row['alerts'],
+            row['recall'], row['false_per_hour'], row['mean_latency']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
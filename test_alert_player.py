@@ -0,0 +1,174 @@
+"""
+Test script for the alert player
+Run this to verify alert sounds are preloaded, played off the caller's thread and prioritised
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+
+class FakeChannel:
+    def __init__(self, duration):
+        self.t_end = time.monotonic() + duration
+
+    def get_busy(self):
+        return time.monotonic() < self.t_end
+
+    def stop(self):
+        self.t_end = 0.
+
+
+class FakeSound:
+    """Stands in for pygame.mixer.Sound with a known length and a record of every start"""
+    def __init__(self, name, duration, starts):
+        self.name = name
+        self.duration = duration
+        self.starts = starts
+
+    def play(self):
+        self.starts.append(self.name)
+        return FakeChannel(self.duration)
+
+
+def fake_player(durations, max_age=5.0):
+    from alert_player import AlertPlayer
+    starts = []
+    player = AlertPlayer(max_age=max_age, poll_interval=0.005)
+    player.sounds = {name: FakeSound(name, duration, starts) for name, duration in durations.items()}
+    return player, starts
+
+
+def wait_for(condition, timeout=2.0):
+    t_end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < t_end:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_preloaded_sounds():
+    """Sounds are decoded by load(), play() returns without touching the files"""
+    print("=" * 50)
+    print("Testing preloaded sounds")
+    print("=" * 50)
+
+    from alert_player import AlertPlayer
+    audio_dir = os.path.join(os.path.dirname(__file__), 'source', 'audio')
+    player = AlertPlayer()
+    assert player.enabled, "the dummy SDL driver should give a mixer"
+    player.load({'Sleeping': os.path.join(audio_dir, 'Sleep.mp3'), 'Drowsy': os.path.join(audio_dir, 'Drowsiness.mp3'),
+                 'Missing': os.path.join(audio_dir, 'does_not_exist.mp3')})
+    assert set(player.sounds) == {'Sleeping', 'Drowsy'}
+    sleeping = player.sounds['Sleeping']
+    player.load({'Sleeping': os.path.join(audio_dir, 'Sleep.mp3')})
+    assert player.sounds['Sleeping'] is sleeping, "an unchanged file is not decoded again"
+    print("✓ Decoded once, missing file skipped")
+
+    t_start = time.perf_counter()
+    assert player.play('Sleeping')
+    elapsed = time.perf_counter() - t_start
+    assert wait_for(lambda: player.played == 1)
+    player.close()
+    print(f"✓ play() returned in {elapsed * 1000:.3f} ms")
+
+
+def test_priorities():
+    """Sleeping preempts, lower alerts wait for the sound and expire after max_age"""
+    print("\n" + "=" * 50)
+    print("Testing priorities")
+    print("=" * 50)
+
+    player, starts = fake_player({'Drowsy': 0.3, 'Sleeping': 0.3, 'Semi-Closed': 0.05}, max_age=0.1)
+    player.play('Drowsy')
+    assert wait_for(lambda: starts == ['Drowsy'])
+    player.play('Sleeping')
+    assert wait_for(lambda: starts == ['Drowsy', 'Sleeping'])
+    assert player.preempted == 1
+    print("✓ Sleeping stopped the Drowsy sound")
+
+    # a lower alert queued behind Sleeping is stale by the time it ends
+    player.play('Semi-Closed')
+    assert wait_for(lambda: player.dropped == 1)
+    assert starts == ['Drowsy', 'Sleeping']
+    print("✓ Semi-Closed dropped after waiting behind Sleeping")
+
+    player.play('Semi-Closed')
+    assert wait_for(lambda: starts[-1] == 'Semi-Closed')
+    player.close()
+    print("✓ Played once the channel was free")
+
+
+def test_sleeping_not_restarted():
+    """A Sleeping status on every frame plays the sound through instead of restarting it"""
+    print("\n" + "=" * 50)
+    print("Testing repeated Sleeping")
+    print("=" * 50)
+
+    from attention_score import AttentionScorer
+    player, starts = fake_player({'Sleeping': 0.25})
+    scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)
+    scorer.alert_player = player
+    scorer.audio_files = {'Sleeping': 'Sleep.mp3'}
+    scorer.ear_thresh = 0.15
+    scorer.sleep_threshold = 0.5
+
+    t_start = time.monotonic()
+    while time.monotonic() - t_start < 1.0:
+        status, _ = scorer.get_PERCLOS(time.monotonic() - t_start, 100, 0.05)
+        time.sleep(0.01)
+    player.close()
+    assert status == 'Sleeping'
+    # 0.5 s of closure before the alert, then a 0.25 s sound back to back
+    assert 1 <= len(starts) <= 3, starts
+    print(f"✓ {len(starts)} plays over 0.5 s of Sleeping frames")
+
+
+def test_no_audio_device():
+    """Without a usable audio device the scorer runs silently"""
+    print("\n" + "=" * 50)
+    print("Testing missing audio device")
+    print("=" * 50)
+
+    code = ("from attention_score import AttentionScorer\n"
+            "scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)\n"
+            "assert not scorer.alert_player.enabled\n"
+            "for i in range(200):\n"
+            "    status, _ = scorer.get_PERCLOS(i / 20., 20, 0.05)\n"
+            "print(status)\n")
+    env = dict(os.environ, SDL_AUDIODRIVER='no_such_driver',
+               PYTHONPATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'source'))
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith('Sleeping'), result.stdout
+    print("✓ Scored to Sleeping with audio disabled")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Preloaded sounds', test_preloaded_sounds), ('Priorities', test_priorities),
+                       ('Repeated Sleeping', test_sleeping_not_restarted), ('No audio device', test_no_audio_device)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
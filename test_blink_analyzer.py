@@ -0,0 +1,148 @@
+"""
+Test script for the streaming blink and microsleep analyzer
+Run this to verify blinks, microsleeps and their rates over 1/5/15 minute horizons
+"""
+
+import os
+import sys
+import time
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import numpy as np
+
+
+def ear_signal(seconds, fps, closures):
+    """[(t, ear)] at fps, eyes closed during each (start, duration) of closures"""
+    samples = []
+    for frame_idx in range(int(seconds * fps)):
+        t_now = frame_idx / fps
+        closed = any(start <= t_now < start + duration for start, duration in closures)
+        samples.append((t_now, 0.05 if closed else 0.3))
+    return samples
+
+
+def test_blinks_and_microsleeps():
+    """Closures are sorted by duration, rates are per observed minute"""
+    print("=" * 50)
+    print("Testing blink detection")
+    print("=" * 50)
+
+    from blink_analyzer import BlinkAnalyzer
+
+    analyzer = BlinkAnalyzer(ear_thresh=0.15)
+    # a 200 ms blink every 4 s, a 1.5 s microsleep at 30 s, a one-frame glitch at 45 s
+    closures = [(start, 0.2) for start in np.arange(2., 60., 4.) if not 29 < start < 32] + [(30., 1.5), (45.5, 1 / 30.)]
+    events = [analyzer.update(t_now, ear) for t_now, ear in ear_signal(60, 30, closures)]
+    assert events.count('microsleep') == 1
+    stats = analyzer.stats()[60]
+    assert stats['blinks'] == events.count('blink') == 14, stats
+    assert abs(stats['mean_blink_ms'] - 200) < 35, stats
+    assert abs(stats['blink_rate_per_min'] - 14) < 0.5, stats
+    assert stats['microsleeps'] == 1 and abs(stats['microsleep_s'] - 1.5) < 0.05
+    assert sum(stats['closure_histogram']) == 15
+    print("✓ 14 blinks of {:.0f} ms, 1 microsleep, glitch ignored".format(stats['mean_blink_ms']))
+    print("  " + ", ".join("{}: {}".format(label, count) for label, count in
+                           zip(analyzer.histogram_labels(), stats['closure_histogram']) if count))
+
+
+def test_horizons():
+    """Every horizon matches a brute-force count of the events that ended inside it"""
+    print("\n" + "=" * 50)
+    print("Testing horizons")
+    print("=" * 50)
+
+    from blink_analyzer import BlinkAnalyzer
+
+    rng = np.random.default_rng(0)
+    analyzer = BlinkAnalyzer(ear_thresh=0.15)
+    ended = []
+    t_now, closed = 0., False
+    checks = 0
+    while t_now < 1500:
+        # blinks get more frequent after 10 minutes, with the odd long closure
+        p_close = 0.006 if t_now < 600 else 0.02
+        closed = rng.random() < (0.8 if closed else p_close)
+        event = analyzer.update(t_now, 0.05 if closed else 0.3)
+        current_bin = int(t_now)
+        if event:
+            ended.append((current_bin, event))
+        t_now += 1 / 20.
+        if rng.random() < 0.002:
+            stats = analyzer.stats()
+            for horizon in analyzer.horizons:
+                in_horizon = [event for end_bin, event in ended if end_bin > current_bin - horizon]
+                assert stats[horizon]['blinks'] == in_horizon.count('blink'), (t_now, horizon)
+                assert stats[horizon]['microsleeps'] == in_horizon.count('microsleep'), (t_now, horizon)
+            checks += 1
+    stats = analyzer.stats()
+    assert stats[60]['blink_rate_per_min'] > stats[900]['blink_rate_per_min'] * 0.9
+    assert analyzer.bins.shape == (900, 14), "constant memory"
+    print("✓ {} checks against brute force, blinks/min 1 min {:.1f}, 5 min {:.1f}, 15 min {:.1f}".format(
+        checks, stats[60]['blink_rate_per_min'], stats[300]['blink_rate_per_min'], stats[900]['blink_rate_per_min']))
+
+
+def test_unobserved_time():
+    """No face or a stalled loop is not observed time, and ends a closure unmeasured"""
+    print("\n" + "=" * 50)
+    print("Testing unobserved time")
+    print("=" * 50)
+
+    from blink_analyzer import BlinkAnalyzer
+
+    analyzer = BlinkAnalyzer(ear_thresh=0.15)
+    for frame_idx in range(300):
+        t_now = frame_idx / 30.
+        ear = None if 100 <= frame_idx < 160 else (0.05 if 90 <= frame_idx < 170 else 0.3)
+        assert analyzer.update(t_now, ear) is None
+    analyzer.update(30., 0.05)  # 20 s gap
+    assert analyzer.update(30.2, 0.3) is None
+    stats = analyzer.stats()[60]
+    assert stats['blinks'] == 0 and stats['microsleeps'] == 0
+    assert abs(stats['observed_s'] - (299 - 60) / 30. - 0.2) < 1e-6, stats['observed_s']
+    print("✓ {:.1f} s observed, interrupted closures dropped".format(stats['observed_s']))
+
+
+def test_cost():
+    """A frame costs a few microseconds, a jump over the ring resets it"""
+    print("\n" + "=" * 50)
+    print("Testing per-frame cost")
+    print("=" * 50)
+
+    from blink_analyzer import BlinkAnalyzer
+
+    analyzer = BlinkAnalyzer(ear_thresh=0.15)
+    samples = ear_signal(120, 30, [(start, 0.2) for start in range(1, 120, 3)])
+    t_start = time.perf_counter()
+    for t_now, ear in samples:
+        analyzer.update(t_now, ear)
+    per_frame = (time.perf_counter() - t_start) / len(samples)
+    analyzer.update(10000., 0.3)
+    assert analyzer.stats()[900]['blinks'] == 0
+    print("✓ {:.1f} us per frame".format(per_frame * 1e6))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Blinks and microsleeps', test_blinks_and_microsleeps), ('Horizons', test_horizons),
+                       ('Unobserved time', test_unobserved_time), ('Per-frame cost', test_cost)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
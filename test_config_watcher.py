@@ -0,0 +1,181 @@
+"""
+Test script for the live PERCLOS config reload
+Run this to verify saved thresholds reach a running scorer without losing its PERCLOS history
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+
+def write_config(path, config, mtime_ns):
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    # the watcher compares mtimes, make two writes in the same tick distinguishable
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_validation():
+    """Missing keys come from the defaults, unusable values are rejected"""
+    print("=" * 50)
+    print("Testing config validation")
+    print("=" * 50)
+
+    from attention_score import DEFAULT_PERCLOS_CONFIG, validate_perclos_config
+
+    config = validate_perclos_config({'ear_thresh': 0.2})
+    assert config['ear_thresh'] == 0.2 and config['sleeping_min'] == DEFAULT_PERCLOS_CONFIG['sleeping_min']
+    print("✓ Defaults fill missing keys")
+
+    for bad in ({'ear_thresh': 'high'}, {'ear_thresh': -0.1}, {'perclos_time_period': 0},
+                {'drowsy_min': 16.0, 'drowsy_max': 12.0}, {'very_drowsy_max': 5.0}, {'audio_files': ['Sleep.mp3']}, []):
+        try:
+            validate_perclos_config(bad)
+        except ValueError as e:
+            print(f"✓ Rejected {bad}: {e}")
+        else:
+            raise AssertionError('accepted {}'.format(bad))
+
+
+def test_live_reload():
+    """A changed file is swapped in before the next frame, the PERCLOS window is kept"""
+    print("\n" + "=" * 50)
+    print("Testing live reload")
+    print("=" * 50)
+
+    from attention_score import AttentionScorer, DEFAULT_PERCLOS_CONFIG, read_perclos_config
+    from config_watcher import ConfigWatcher
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_file = os.path.join(tmp_dir, 'perclos_config.json')
+        write_config(config_file, DEFAULT_PERCLOS_CONFIG, 1_000_000_000)
+        watcher = ConfigWatcher(config_file)
+        scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)
+        scorer.apply_config(read_perclos_config(config_file))
+        scorer.audio_enabled = False
+        watcher.scorers.add(scorer)
+        assert not watcher.check(), "unchanged file"
+
+        for frame_idx in range(100):
+            scorer.get_PERCLOS(frame_idx / 10., 10, 0.12)
+        samples = len(scorer.perclos_samples)
+        closed_before = scorer.closed_time
+        assert closed_before > 9., "closed under the default 0.15 threshold"
+
+        write_config(config_file, dict(DEFAULT_PERCLOS_CONFIG, ear_thresh=0.1, sleep_threshold=30.0), 2_000_000_000)
+        assert watcher.check()
+        assert scorer.pending_config is not None and scorer.sleep_threshold != 30.0, "applied by the loop, not the watcher"
+        scorer.get_PERCLOS(10.0, 10, 0.12)
+        assert scorer.ear_thresh == 0.1 and scorer.sleep_threshold == 30.0
+        # 0.12 is open now, the closure measured so far stays in the window
+        assert len(scorer.perclos_samples) == samples + 1 and scorer.closed_time == closed_before
+        print("✓ New EAR threshold applied on the next frame, window kept ({} samples)".format(samples + 1))
+
+        # a half-edited or out-of-range file is ignored
+        with open(config_file, 'w') as f:
+            f.write('{"ear_thresh": 0.')
+        os.utime(config_file, ns=(3_000_000_000, 3_000_000_000))
+        assert not watcher.check()
+        write_config(config_file, dict(DEFAULT_PERCLOS_CONFIG, ear_thresh=-1), 4_000_000_000)
+        assert not watcher.check()
+        scorer.get_PERCLOS(10.1, 10, 0.12)
+        assert scorer.ear_thresh == 0.1 and watcher.errors == 2
+        assert not scorer.audio_enabled, "a reload does not unmute the scorer"
+        print("✓ Invalid files kept out: {}".format(watcher.last_error))
+
+
+def test_sounds_loaded_once():
+    """One validation and one sound decode per change, however many scorers are registered"""
+    print("\n" + "=" * 50)
+    print("Testing one reload for many scorers")
+    print("=" * 50)
+
+    import attention_score
+    from alert_player import get_player
+    from attention_score import AttentionScorer, DEFAULT_PERCLOS_CONFIG
+    from config_watcher import ConfigWatcher
+    from fleet_scorer import FleetScorer
+
+    player = get_player()
+    loads, validations = [], []
+    real_validate = attention_score.validate_perclos_config
+
+    def counting_validate(config):
+        validations.append(config)
+        return real_validate(config)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_file = os.path.join(tmp_dir, 'perclos_config.json')
+        write_config(config_file, DEFAULT_PERCLOS_CONFIG, 1_000_000_000)
+        watcher = ConfigWatcher(config_file)
+        scorers = [AttentionScorer(t_now=0.0, ear_thresh=0.15) for _ in range(4)] + [FleetScorer(3, 0.0)]
+        for scorer in scorers:
+            watcher.scorers.add(scorer)
+
+        write_config(config_file, dict(DEFAULT_PERCLOS_CONFIG, ear_thresh=0.1), 2_000_000_000)
+        player.load = lambda audio_files: loads.append(audio_files)
+        attention_score.validate_perclos_config = counting_validate
+        try:
+            assert watcher.check()
+        finally:
+            del player.load
+            attention_score.validate_perclos_config = real_validate
+        assert len(loads) == 1 and len(validations) == 1, (len(loads), len(validations))
+        assert loads[0]['Sleeping'].endswith(os.path.join('audio', 'Sleep.mp3'))
+        assert all(scorer.pending_config['ear_thresh'] == 0.1 for scorer in scorers)
+        scorers[0].get_PERCLOS(0.1, 10, 0.3)
+        assert scorers[0].ear_thresh == 0.1 and scorers[0].audio_files == loads[0]
+    print("✓ 5 scorers updated with 1 validation and 1 sound load")
+
+
+def test_atomic_save():
+    """ConfigManager.save_config replaces the file in one step and leaves no temporary file"""
+    print("\n" + "=" * 50)
+    print("Testing atomic save")
+    print("=" * 50)
+
+    from attention_score import read_perclos_config
+    from config_page import ConfigManager
+
+    config_manager = ConfigManager('test_watcher_config.json')
+    try:
+        config_manager.update_config(dict(config_manager.default_config, ear_thresh=0.17))
+        assert config_manager.save_config()
+        assert read_perclos_config(config_manager.config_file)['ear_thresh'] == 0.17
+        leftovers = [name for name in os.listdir(os.path.dirname(config_manager.config_file)) if name.endswith('.tmp')]
+        assert not leftovers, leftovers
+        print("✓ Saved config is valid, no temporary files left")
+    finally:
+        if os.path.exists(config_manager.config_file):
+            os.remove(config_manager.config_file)
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Validation', test_validation), ('Live reload', test_live_reload),
+                       ('Sounds loaded once', test_sounds_loaded_once), ('Atomic save', test_atomic_save)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,134 @@
+"""
+Test script for the vectorised fleet scorer
+Run this to verify FleetScorer gives the same status, PERCLOS and alerts as one AttentionScorer per driver
+"""
+
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+# every level reachable within a short period
+CONFIG = {
+    'semi_closed_min': 0.0, 'semi_closed_max': 0.05,
+    'moderately_drowsy_min': 0.05, 'moderately_drowsy_max': 0.1,
+    'drowsy_min': 0.1, 'drowsy_max': 0.15,
+    'very_drowsy_min': 0.15, 'very_drowsy_max': 0.2,
+    'sleeping_min': 0.2,
+    'ear_thresh': 0.15, 'sleep_threshold': 2.0, 'perclos_time_period': 20,
+    'audio_files': {},
+}
+
+
+def simulate(num_drivers, steps, seed, capacity=2048):
+    """Drive N scalar scorers and one FleetScorer with the same irregular samples, compare every step"""
+    from attention_score import AttentionScorer
+    from fleet_scorer import FleetScorer
+
+    rng = np.random.default_rng(seed)
+    fleet = FleetScorer(num_drivers, 0.0, config=CONFIG, capacity=capacity)
+    fleet_alerts = []
+    fleet.alert_listeners.append(lambda driver, alert_type: fleet_alerts.append((driver, alert_type)))
+    scorers = []
+    scalar_alerts = []
+    for driver in range(num_drivers):
+        scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)
+        scorer.apply_config(dict(CONFIG))
+        scorer.audio_enabled = False
+        scorer.alert_listeners.append(lambda alert_type, driver=driver: scalar_alerts.append((driver, alert_type)))
+        scorers.append(scorer)
+
+    t_now = np.zeros(num_drivers)
+    closed = np.zeros(num_drivers, dtype=bool)
+    # drivers differ in how drowsy they are: how likely the eyes close and stay closed
+    p_close = rng.uniform(0.005, 0.05, num_drivers)
+    p_stay = rng.uniform(0.8, 0.995, num_drivers)
+    for step in range(steps):
+        t_now = t_now + rng.uniform(0.02, 0.2, num_drivers) * (rng.random(num_drivers) > 0.002) + (rng.random(num_drivers) < 0.002) * 3.0
+        closed = np.where(closed, rng.random(num_drivers) < p_stay, rng.random(num_drivers) < p_close)
+        ears = np.where(closed, rng.uniform(0.02, 0.14, num_drivers), rng.uniform(0.2, 0.35, num_drivers))
+        ears[rng.random(num_drivers) < 0.02] = np.nan  # no face
+        active = rng.random(num_drivers) < 0.85
+
+        codes, perclos_scores = fleet.update(t_now, ears, active)
+        names = fleet.status_names(codes)
+        for driver, scorer in enumerate(scorers):
+            if not active[driver]:
+                assert names[driver] == '' and np.isnan(perclos_scores[driver])
+                continue
+            ear = None if np.isnan(ears[driver]) else float(ears[driver])
+            tired, perclos_score = scorer.get_PERCLOS(float(t_now[driver]), 10, ear)
+            assert tired == names[driver], (step, driver, tired, names[driver])
+            assert abs(perclos_score - perclos_scores[driver]) < 1e-9, (step, driver, perclos_score, perclos_scores[driver])
+            assert scorer.eye_closure_counter == fleet.eye_closure_counter[driver]
+    assert fleet_alerts == scalar_alerts
+    return fleet, fleet_alerts
+
+
+def test_conformance():
+    """Same statuses, scores and alerts as the scalar class, sample for sample"""
+    print("=" * 50)
+    print("Testing conformance with AttentionScorer")
+    print("=" * 50)
+
+    fleet, alerts = simulate(24, 1500, seed=0)
+    kinds = sorted(set(alert_type for _, alert_type in alerts))
+    assert kinds == ['Drowsy', 'Moderately Drowsy', 'Semi-Closed', 'Sleeping'], kinds
+    print("✓ 24 drivers x 1500 samples identical, {} alerts of {} kinds".format(len(alerts), len(kinds)))
+
+
+def test_ring_growth():
+    """Windows longer than the ring capacity grow it without changing any result"""
+    print("\n" + "=" * 50)
+    print("Testing ring growth")
+    print("=" * 50)
+
+    fleet, _ = simulate(4, 600, seed=1, capacity=8)
+    assert fleet.capacity > 8 and fleet.count.max() <= fleet.capacity
+    print("✓ Ring grew to {} samples, results unchanged".format(fleet.capacity))
+
+
+def test_config_reload():
+    """A reloaded config applies on the next update"""
+    print("\n" + "=" * 50)
+    print("Testing config reload")
+    print("=" * 50)
+
+    from fleet_scorer import FleetScorer, SLEEPING
+
+    fleet = FleetScorer(3, 0.0, config=CONFIG)
+    fleet.reload_config(dict(CONFIG, sleep_threshold=0.5))
+    for step in range(10):
+        codes, _ = fleet.update(step * 0.1, [0.05, 0.3, 0.05])
+    assert fleet.sleep_threshold == 0.5
+    assert list(codes == SLEEPING) == [True, False, True]
+    print("✓ New sleep threshold used")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Conformance', test_conformance), ('Ring growth', test_ring_growth), ('Config reload', test_config_reload)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,149 @@
+"""
+Test script for the binary frame log
+Run this to verify records round-trip through the memory-mapped reader, rotate by size and survive a torn write
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import numpy as np
+
+
+def fake_face(rng, num_lms=68):
+    from landmark_pipeline import FaceResult
+    return FaceResult((100, 80, 260, 240), 0.99, rng.uniform(0, 1, num_lms * 2).astype(np.float32))
+
+
+def test_round_trip():
+    """What goes in comes out of the memory map, eye points taken from the schema"""
+    print("=" * 50)
+    print("Testing round trip")
+    print("=" * 50)
+
+    from frame_log import FrameLogWriter, RECORD_DTYPE, FACE, STATUS_NAMES, read_log, log_files, load_logs
+    from landmark_schema import get_schema
+
+    # 68-point layout, so the eye points are picked out of the face
+    schema = get_schema('data_300W', 68)
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as log_dir:
+        writer = FrameLogWriter(log_dir, chunk_records=64, schema=schema)
+        faces = []
+        for frame_idx in range(500):
+            face = fake_face(rng) if frame_idx % 10 else None
+            faces.append(face)
+            if face is None:
+                writer.append(1, t_now=1000. + frame_idx / 30.)
+            else:
+                writer.append(1, 'Drowsy', face, 0.21, 0.12, t_now=1000. + frame_idx / 30.)
+        writer.close()
+
+        files = log_files(log_dir)
+        assert len(files) == 1 and RECORD_DTYPE.itemsize == 92
+        records = read_log(files[0])
+        assert isinstance(records, np.memmap) and len(records) == 500
+        assert np.allclose(records['t'], 1000. + np.arange(500) / 30.)
+        face_rows = (records['flags'] & FACE) > 0
+        assert face_rows.sum() == 450 and not face_rows[0]
+        assert all(STATUS_NAMES[code] == 'Drowsy' for code in records['status'][face_rows])
+        assert np.isnan(records['ear'][~face_rows]).all() and np.allclose(records['ear'][face_rows], 0.21)
+        expected = faces[1].lms_pred_merge.reshape(-1, 2)[schema.eyes.ravel()]
+        assert np.allclose(records['landmarks'][1][:12], expected, atol=1e-3)
+        assert np.isnan(records['landmarks'][1][12:]).all()
+        assert list(records['box'][1]) == [100, 80, 260, 240]
+        in_range = load_logs(log_dir, t_start=1005., t_end=1010.)
+        assert len(in_range) == 150 and load_logs(log_dir, stream=0).size == 0
+        del records
+    print("✓ 500 frames of {} bytes read back, time range and stream filters".format(RECORD_DTYPE.itemsize))
+
+
+def test_rotation():
+    """Files rotate at max_bytes, the oldest go past max_total_bytes, nothing is lost in between"""
+    print("\n" + "=" * 50)
+    print("Testing rotation")
+    print("=" * 50)
+
+    from frame_log import FrameLogWriter, RECORD_DTYPE, HEADER, log_files, load_logs
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        writer = FrameLogWriter(log_dir, chunk_records=100, max_bytes=HEADER.size + 300 * RECORD_DTYPE.itemsize)
+        for frame_idx in range(3000):
+            writer.append(0, 'Awake', ear=0.3, perclos=0.0, t_now=float(frame_idx))
+        writer.flush()
+        files = log_files(log_dir)
+        assert len(files) == 10, len(files)
+        assert all(os.path.getsize(path) <= writer.max_bytes for path in files)
+        assert np.array_equal(load_logs(log_dir)['t'], np.arange(3000.))
+
+        writer.max_total_bytes = 4 * writer.max_bytes
+        for frame_idx in range(3000, 4000):
+            writer.append(0, 'Awake', ear=0.3, perclos=0.0, t_now=float(frame_idx))
+        writer.close()
+        files = log_files(log_dir)
+        assert sum(os.path.getsize(path) for path in files) <= writer.max_total_bytes
+        t = load_logs(log_dir)['t']
+        assert t[-1] == 3999. and np.all(np.diff(t) == 1.)
+    print("✓ {} files kept, newest {} frames contiguous".format(len(files), len(t)))
+
+
+def test_torn_write_and_cost():
+    """A partial last record is ignored, a foreign file is refused, append costs a few microseconds"""
+    print("\n" + "=" * 50)
+    print("Testing torn write and append cost")
+    print("=" * 50)
+
+    from frame_log import FrameLogWriter, log_files, read_log
+
+    rng = np.random.default_rng(1)
+    face = fake_face(rng)
+    with tempfile.TemporaryDirectory() as log_dir:
+        writer = FrameLogWriter(log_dir)
+        t_start = time.perf_counter()
+        for frame_idx in range(5000):
+            writer.append(0, 'Awake', face, 0.3, 0.0)
+        per_frame = (time.perf_counter() - t_start) / 5000
+        writer.close()
+        path = log_files(log_dir)[0]
+        with open(path, 'ab') as f:
+            f.write(b'\0' * 50)
+        assert len(read_log(path)) == 5000
+
+        other = os.path.join(log_dir, 'other.bin')
+        with open(other, 'wb') as f:
+            f.write(b'\0' * 200)
+        try:
+            read_log(other)
+            raise AssertionError("foreign file accepted")
+        except ValueError:
+            pass
+    print("✓ Torn record ignored, {:.1f} us per append".format(per_frame * 1e6))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Round trip', test_round_trip), ('Rotation', test_rotation),
+                       ('Torn write and cost', test_torn_write_and_cost)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,169 @@
+"""
+Test script for the latency-budget frame scheduler
+Run this to verify slow frames degrade to landmarks-only / skipped frames and PERCLOS keeps real time
+"""
+
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+COSTS = {'full': 0.12, 'landmarks': 0.03, 'skip': 0.001}
+
+
+def simulate(scheduler, frames, frame_interval=1 / 30., costs=COSTS, lag=0.):
+    """Drive the scheduler like a capture loop that always takes the newest frame, which reaches the
+    loop `lag` seconds after capture; returns modes and latencies"""
+    from frame_scheduler import SKIP
+    modes = []
+    latencies = []
+    t_now = 0.
+    for _ in range(frames):
+        # the newest frame the camera has produced by now
+        frame_time = ((t_now - lag) // frame_interval) * frame_interval
+        mode = scheduler.plan(t_now, frame_time, has_box=True)
+        elapsed = costs[mode]
+        scheduler.done(mode, elapsed, t_now)
+        if mode != SKIP:
+            latencies.append(t_now + elapsed - frame_time)
+        modes.append(mode)
+        t_now += max(elapsed, 0.002)
+    return modes, latencies
+
+
+def test_budget():
+    """A full pass over budget runs landmarks in the last boxes, with periodic re-detection"""
+    print("=" * 50)
+    print("Testing latency budget")
+    print("=" * 50)
+
+    from frame_scheduler import FrameScheduler, FULL, LANDMARKS
+
+    scheduler = FrameScheduler(target_latency=0.1, min_score_rate=5.0, box_max_age=0.5)
+    modes, latencies = simulate(scheduler, 200)
+    assert modes[0] == FULL, "nothing measured yet, start with the full pipeline"
+    assert modes.count(LANDMARKS) > modes.count(FULL), modes.count(FULL)
+    assert abs(scheduler.costs[FULL] - COSTS[FULL]) < 1e-9
+    print("✓ {} full, {} landmarks-only frames".format(modes.count(FULL), modes.count(LANDMARKS)))
+
+    # boxes are re-detected every box_max_age seconds
+    full_gaps = [j - i for i, j in zip([k for k, m in enumerate(modes) if m == FULL][:-1],
+                                        [k for k, m in enumerate(modes) if m == FULL][1:])]
+    assert max(full_gaps) * COSTS[LANDMARKS] <= 0.5 + COSTS[FULL]
+    within = sum(latency <= 0.1 for latency in latencies) / len(latencies)
+    assert within > 0.8, within
+    print("✓ {:.0%} of scored frames within budget".format(within))
+
+
+def test_min_score_rate():
+    """Frames too late for the budget are skipped, fresh results still come at min_score_rate"""
+    print("\n" + "=" * 50)
+    print("Testing minimum scoring rate")
+    print("=" * 50)
+
+    from frame_scheduler import FrameScheduler, SKIP
+
+    scheduler = FrameScheduler(target_latency=0.1, min_score_rate=5.0)
+    modes, _ = simulate(scheduler, 400, lag=0.09)
+    scored_times = []
+    t_now = 0.
+    for mode in modes:
+        if mode != SKIP:
+            scored_times.append(t_now)
+        t_now += max(COSTS[mode], 0.002)
+    gaps = [b - a for a, b in zip(scored_times, scored_times[1:])]
+    assert max(gaps) <= 1 / 5.0 + COSTS['full'] + 0.002, max(gaps)
+    assert modes.count(SKIP) > 0
+    print("✓ Largest gap between fresh results {:.0f} ms".format(max(gaps) * 1000))
+
+
+def test_backlog_without_timestamps():
+    """A camera without capture times: slow iterations build a backlog that skips drain"""
+    print("\n" + "=" * 50)
+    print("Testing backlog estimate")
+    print("=" * 50)
+
+    from frame_scheduler import FrameScheduler, SKIP
+
+    scheduler = FrameScheduler(target_latency=0.1, frame_interval=1 / 30., buffer_frames=4)
+    assert scheduler.plan(0., has_box=True) != SKIP
+    scheduler.done('full', 0.09, 0.)
+    scheduler.plan(0.09, has_box=True)
+    assert abs(scheduler.backlog - (0.09 - 1 / 30.)) < 1e-9
+    scheduler.plan(0.5, has_box=True)
+    assert scheduler.backlog == 4 / 30., "bounded by the driver's queue"
+    print("✓ Backlog bounded at {:.0f} ms".format(scheduler.backlog * 1000))
+
+
+def test_perclos_time_correct():
+    """Skipped frames reuse the EAR but are scored at their own timestamps"""
+    print("\n" + "=" * 50)
+    print("Testing PERCLOS with skipped frames")
+    print("=" * 50)
+
+    from attention_score import AttentionScorer
+    from frame_scheduler import FrameScheduler, SKIP
+
+    scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)
+    scorer.audio_files = {}
+    scheduler = FrameScheduler(target_latency=0.05, min_score_rate=2.0)
+    ear = None
+    t_now = 0.
+    while t_now < 4.0:
+        # frames arrive 100 ms late, only the min_score_rate ones are processed
+        mode = scheduler.plan(t_now, t_now - 0.1, has_box=ear is not None)
+        if mode != SKIP:
+            ear = 0.05  # eyes closed the whole time
+        scheduler.done(mode, 0.02 if mode != SKIP else 0.001, t_now)
+        status, _ = scorer.get_PERCLOS(t_now, 10, ear)
+        t_now += 0.1
+    assert status == 'Sleeping', status
+    print("✓ 4 s of closed eyes reported as Sleeping with {} skipped frames".format(scheduler.counts[SKIP]))
+
+
+def test_counts_what_ran():
+    """counts follow the mode reported to done(), a frame the motion gate skipped is a SKIP"""
+    print("\n" + "=" * 50)
+    print("Testing mode counts")
+    print("=" * 50)
+
+    from frame_scheduler import FrameScheduler, FULL, LANDMARKS, SKIP
+
+    scheduler = FrameScheduler(target_latency=0.15)
+    for step in range(10):
+        t_now = step / 30.
+        mode = scheduler.plan(t_now, t_now, has_box=True)
+        assert mode == FULL
+        # the gate finds nothing moved on every other frame
+        scheduler.done(SKIP if step % 2 else mode, 0.001 if step % 2 else 0.05, t_now)
+    assert scheduler.counts == {FULL: 5, LANDMARKS: 0, SKIP: 5}
+    print("✓ 10 planned FULL, counted 5 full and 5 gated skips")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Latency budget', test_budget), ('Minimum scoring rate', test_min_score_rate),
+                       ('Backlog estimate', test_backlog_without_timestamps), ('PERCLOS time', test_perclos_time_correct),
+                       ('Mode counts', test_counts_what_ran)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,221 @@
+"""
+Test script for the iris gaze cascade
+Run this to verify eye crops, the batched Iris forward, the gaze offsets and the every-K-frames schedule
+"""
+
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import cv2
+import numpy as np
+import torch
+
+
+class FakeFace:
+    """Only the fields GazeCascade reads"""
+    def __init__(self, box, lms_pred_merge, ear=0.3):
+        self.box = box
+        self.lms_pred_merge = lms_pred_merge
+        self.average_aspect_ratio = ear
+        self.gaze = None
+        self.gaze_score = None
+
+
+class DarkestBlob:
+    """Stands in for a trained Iris model: the 5 points are the centroid of the dark pixels of each crop"""
+    def __init__(self, input_size=32):
+        self.input_size = input_size
+        self.batches = []
+
+    def predict(self, crops):
+        self.batches.append(len(crops))
+        points = []
+        for crop in crops:
+            ys, xs = np.nonzero(crop[..., 0] < 60)
+            centre = np.array([xs.mean(), ys.mean()]) / self.input_size
+            points.append(np.tile(centre, (5, 1)))
+        return np.array(points, dtype=np.float32)
+
+
+def eye_contour(middle, width, roll):
+    """8 EYES_16 points: corner, upper lid, other corner, lower lid"""
+    angles = np.linspace(np.pi, -np.pi, 8, endpoint=False)
+    local = np.stack([np.cos(angles) * width / 2, np.sin(angles) * width / 6], axis=1)
+    rotation = np.array([[np.cos(roll), -np.sin(roll)], [np.sin(roll), np.cos(roll)]])
+    return np.asarray(middle) + local @ rotation.T
+
+
+def make_face(frame, schema, centre, box_width, gaze, roll=0., ear=0.3):
+    """Face of box_width at centre with both irises drawn gaze eye widths off the eye middles"""
+    roll_rad = np.radians(roll)
+    axis = np.array([np.cos(roll_rad), np.sin(roll_rad)])
+    normal = np.array([-axis[1], axis[0]])
+    eye_width = box_width * 0.2
+    box = (int(centre[0] - box_width / 2), int(centre[1] - box_width / 2), int(centre[0] + box_width / 2), int(centre[1] + box_width / 2))
+    points = np.tile(np.array(centre, dtype=np.float64), (schema.num_lms, 1))
+    for eye, side in zip(schema.eyes, (-1, 1)):
+        middle = np.asarray(centre) + side * axis * box_width * 0.2
+        points[eye] = eye_contour(middle, eye_width, roll_rad)
+        iris = middle + (gaze[0] * axis + gaze[1] * normal) * eye_width
+        if frame is not None:
+            cv2.circle(frame, (int(round(iris[0])), int(round(iris[1]))), int(eye_width * 0.15), (20, 20, 20), -1, cv2.LINE_AA)
+        if schema.pupils is not None:
+            points[schema.pupils[(side + 1) // 2]] = iris
+    size = np.array([box[2] - box[0] + 1, box[3] - box[1] + 1])
+    return FakeFace(box, ((points - box[:2]) / size).astype(np.float32).ravel(), ear)
+
+
+def test_pupil_landmarks():
+    """Layouts with pupils give the offset straight from the landmarks, whatever the head roll"""
+    print("=" * 50)
+    print("Testing gaze from pupil landmarks")
+    print("=" * 50)
+
+    from gaze_cascade import GazeCascade
+    from landmark_schema import EYES_16, LAPA_106
+
+    assert not GazeCascade(EYES_16).available
+    gaze = GazeCascade(LAPA_106, interval=5)
+    assert gaze.available
+    for truth, roll in [((0., 0.), 0.), ((0.2, 0.), 0.), ((-0.15, 0.1), 25.), ((0.1, -0.05), -30.)]:
+        face = make_face(None, LAPA_106, (320, 240), 200, truth, roll)
+        gaze.reset()
+        (score,) = gaze.estimate(None, [face])
+        assert np.allclose(face.gaze, truth, atol=1e-4), (face.gaze, truth)
+        assert abs(score - np.hypot(*truth)) < 1e-4
+    print("✓ offsets recovered at rolls of 0, 25 and -30 degrees")
+
+
+def test_iris_cascade():
+    """Both eyes of every face of every camera share one forward, offsets come back in eye widths"""
+    print("\n" + "=" * 50)
+    print("Testing the iris cascade")
+    print("=" * 50)
+
+    from gaze_cascade import GazeCascade
+    from landmark_schema import EYES_16
+
+    iris = DarkestBlob()
+    gaze = GazeCascade(EYES_16, iris, interval=1)
+    frames = [np.full((480, 640, 3), 200, dtype=np.uint8) for _ in range(2)]
+    truths = [[(0.2, 0.), (-0.1, 0.05)], [(0., 0.1)]]
+    faces = [[make_face(frames[0], EYES_16, (180, 200), 240, truths[0][0], roll=15),
+              make_face(frames[0], EYES_16, (480, 260), 200, truths[0][1])],
+             [make_face(frames[1], EYES_16, (500, 240), 220, truths[1][0], roll=-10)]]
+    gaze.estimate_frames(frames, faces, ['cab', 'rear'])
+    assert iris.batches == [6]
+    for frame_faces, frame_truths in zip(faces, truths):
+        for face, truth in zip(frame_faces, frame_truths):
+            assert np.allclose(face.gaze, truth, atol=0.02), (face.gaze, truth)
+    print("✓ 3 faces on 2 cameras, 6 eye crops in one batch, offsets within 0.02 eye widths")
+
+
+def test_schedule():
+    """The cascade runs every interval frames on open eyes, tracked faces keep their score in between"""
+    print("\n" + "=" * 50)
+    print("Testing the schedule")
+    print("=" * 50)
+
+    from gaze_cascade import GazeCascade
+    from landmark_schema import EYES_16
+
+    iris = DarkestBlob()
+    gaze = GazeCascade(EYES_16, iris, interval=3, min_ear=0.15)
+    frame = np.full((480, 640, 3), 200, dtype=np.uint8)
+    scores = []
+    for step in range(10):
+        picture = frame.copy()
+        # eyes closed on frame 3, when the second run was due, it moves to the next open frame
+        face = make_face(picture, EYES_16, (320 + step, 240), 200, (0.2 if step >= 4 else 0., 0.), ear=0.1 if step == 3 else 0.3)
+        gaze.estimate(picture, [face])
+        scores.append(face.gaze_score)
+    assert iris.batches == [2, 2, 2]
+    assert gaze.measured == 3 and gaze.reused == 7
+    assert all(abs(score) < 0.02 for score in scores[:4]) and all(abs(score - 0.2) < 0.02 for score in scores[4:])
+
+    # a new face is measured at once, a face that left drops its track
+    picture = frame.copy()
+    gaze.estimate(picture, [make_face(picture, EYES_16, (100, 100), 150, (0., 0.))])
+    assert iris.batches[-1] == 2 and len(gaze.tracks[0]) == 1 and abs(gaze.tracks[0][0][2][0]) < 0.02
+    gaze.estimate(frame, [])
+    assert gaze.tracks[0] == []
+    print("✓ 3 runs over 10 frames, the closed-eye frame deferred, scores held in between")
+
+
+def test_min_ear_per_frame():
+    """Each frame is gated with the EAR threshold its scorer uses now, not the one at construction"""
+    print("\n" + "=" * 50)
+    print("Testing per-frame open-eye thresholds")
+    print("=" * 50)
+
+    from gaze_cascade import GazeCascade
+    from landmark_schema import EYES_16
+
+    iris = DarkestBlob()
+    gaze = GazeCascade(EYES_16, iris, interval=1, min_ear=0.15)
+    frames = [np.full((480, 640, 3), 200, dtype=np.uint8) for _ in range(2)]
+    faces = [[make_face(frame, EYES_16, (320, 240), 200, (0.1, 0.), ear=0.2)] for frame in frames]
+    # the second stream's scorer was reloaded with ear_thresh 0.25: an EAR of 0.2 is closed there
+    gaze.estimate_frames(frames, faces, ['cab', 'rear'], [0.15, 0.25])
+    assert iris.batches == [2]
+    assert faces[0][0].gaze_score is not None and faces[1][0].gaze_score is None
+
+    face = make_face(frames[0], EYES_16, (320, 240), 200, (0.1, 0.), ear=0.2)
+    gaze.reset()
+    gaze.estimate(frames[0], [face], min_ear=0.25)
+    assert face.gaze is None and iris.batches == [2]
+    print("✓ thresholds of 0.15 and 0.25 gate an EAR of 0.2 differently")
+
+
+def test_iris_model():
+    """IrisModel runs the experiments/Iris network on a batch of eye crops"""
+    print("\n" + "=" * 50)
+    print("Testing IrisModel")
+    print("=" * 50)
+
+    import model_loader
+    from gaze_cascade import IRIS_DATA_NAME, DEFAULT_IRIS_EXPERIMENT, IrisModel
+
+    cfg = model_loader.load_experiment_config(IRIS_DATA_NAME, DEFAULT_IRIS_EXPERIMENT)
+    torch.manual_seed(0)
+    net = model_loader.build_landmark_net(cfg)
+    net.eval()
+    model = IrisModel(net, cfg, torch.device('cpu'))
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 255, (model.input_size, model.input_size, 3), dtype=np.uint8) for _ in range(4)]
+
+    assert model.predict([]).shape == (0, cfg.num_lms, 2)
+    points = model.predict(crops)
+    assert points.shape == (4, cfg.num_lms, 2) and np.isfinite(points).all()
+    assert np.allclose(model.predict(crops[2:3])[0], points[2], atol=1e-5)
+    print("✓ {} points per crop at {}px, neighbour merge {}".format(
+        cfg.num_lms, model.input_size, 'on' if model.reverse_index is not None else 'off (no meanface)'))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Pupil landmarks', test_pupil_landmarks), ('Iris cascade', test_iris_cascade),
+                       ('Schedule', test_schedule), ('Per-frame min EAR', test_min_ear_per_frame),
+                       ('Iris model', test_iris_model)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
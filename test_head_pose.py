@@ -0,0 +1,172 @@
+"""
+Test script for head pose estimation from the landmarks
+Run this to verify solvePnP recovers known poses, warm-starts tracked heads and feeds eval_scores
+"""
+
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import cv2
+import numpy as np
+
+FRAME_SHAPE = (480, 640, 3)
+
+
+class FakeFace:
+    """Only the fields HeadPoseEstimator reads"""
+    def __init__(self, box, lms_pred_merge):
+        self.box = box
+        self.lms_pred_merge = lms_pred_merge
+        self.head_pose = None
+
+
+def rvec_of(roll, pitch, yaw):
+    """Rodrigues vector of R = Rz(roll) Ry(yaw) Rx(pitch), angles in degrees"""
+    roll, pitch, yaw = np.radians([roll, pitch, yaw])
+    rz = np.array([[np.cos(roll), -np.sin(roll), 0], [np.sin(roll), np.cos(roll), 0], [0, 0, 1]])
+    ry = np.array([[np.cos(yaw), 0, np.sin(yaw)], [0, 1, 0], [-np.sin(yaw), 0, np.cos(yaw)]])
+    rx = np.array([[1, 0, 0], [0, np.cos(pitch), -np.sin(pitch)], [0, np.sin(pitch), np.cos(pitch)]])
+    rvec, _ = cv2.Rodrigues(rz @ ry @ rx)
+    return rvec
+
+
+def project_face(schema, pose, centre, depth=600., rng=None, noise=0.):
+    """Face whose pose landmarks are the template seen at pose, the other landmarks on the box centre"""
+    from head_pose import HeadPoseEstimator, POSE_TEMPLATE
+
+    camera = HeadPoseEstimator.camera_matrix(FRAME_SHAPE)
+    tvec = np.array([[(centre[0] - camera[0, 2]) * depth / camera[0, 0]], [(centre[1] - camera[1, 2]) * depth / camera[0, 0]], [depth]])
+    names = [name for name in POSE_TEMPLATE if name in schema.pose]
+    template = np.array([POSE_TEMPLATE[name] for name in names])
+    projected, _ = cv2.projectPoints(template, rvec_of(*pose), tvec, camera, None)
+    projected = projected.reshape(-1, 2)
+    if rng is not None:
+        projected = projected + rng.normal(0, noise, projected.shape)
+    width = int(camera[0, 0] * 150. / depth)
+    box = (int(centre[0] - width / 2), int(centre[1] - width / 2), int(centre[0] + width / 2), int(centre[1] + width / 2))
+    points = np.tile(np.array(centre, dtype=np.float64), (schema.num_lms, 1))
+    points[[schema.pose[name] for name in names]] = projected
+    size = np.array([box[2] - box[0] + 1, box[3] - box[1] + 1])
+    return FakeFace(box, ((points - box[:2]) / size).astype(np.float32).ravel())
+
+
+def test_euler_angles():
+    """euler_angles inverts the roll, pitch, yaw convention, batched"""
+    print("=" * 50)
+    print("Testing the angle conversion")
+    print("=" * 50)
+
+    from head_pose import euler_angles, rotation_matrices
+
+    angles = np.array([[0, 0, 0], [10, -20, 30], [-35, 15, -40], [5, 40, 0]], dtype=np.float64)
+    rvecs = np.stack([rvec_of(*row).ravel() for row in angles])
+    assert np.allclose(euler_angles(rvecs), angles, atol=1e-6)
+    assert np.allclose(rotation_matrices(rvecs), np.stack([cv2.Rodrigues(rvec)[0] for rvec in rvecs]), atol=1e-9)
+    print("✓ {} poses round trip".format(len(angles)))
+
+
+def test_tracked_pose():
+    """A head turning in front of the camera is recovered within a few degrees, warm-started after the first frame"""
+    print("\n" + "=" * 50)
+    print("Testing pose estimation on a tracked head")
+    print("=" * 50)
+
+    from head_pose import HeadPoseEstimator
+    from landmark_schema import get_schema
+
+    schema = get_schema('data_300W', 68)
+    estimator = HeadPoseEstimator(schema)
+    assert estimator.full_pose
+    rng = np.random.default_rng(0)
+    errors = []
+    for step in range(120):
+        phase = step / 120. * 2 * np.pi
+        truth = (8 * np.sin(phase), 15 * np.sin(2 * phase), 35 * np.sin(phase + 1))
+        faces = [project_face(schema, truth, (320 + 40 * np.sin(phase), 240), rng=rng, noise=1.0),
+                 project_face(schema, (0, -10, 20), (120, 300), depth=900., rng=rng, noise=1.0)]
+        poses = estimator.estimate(faces, FRAME_SHAPE)
+        assert faces[0].head_pose == poses[0] and poses[1] is not None
+        errors.append(np.abs(np.array(poses[0]) - truth).max())
+    assert max(errors) < 8.0 and np.mean(errors) < 2.0, (max(errors), np.mean(errors))
+    assert estimator.cold_starts == 2 and estimator.failures == 0
+    print("✓ max error {:.1f}°, mean {:.1f}°, {} warm starts".format(max(errors), np.mean(errors), estimator.warm_starts))
+
+
+def test_eye_only_layout():
+    """The 16 eye points of the WFLW snapshot give the roll alone"""
+    print("\n" + "=" * 50)
+    print("Testing the eye-only layout")
+    print("=" * 50)
+
+    from head_pose import HeadPoseEstimator
+    from landmark_schema import EYES_16
+
+    estimator = HeadPoseEstimator(EYES_16)
+    assert not estimator.full_pose and estimator.available
+    box = (100, 100, 299, 299)
+    points = np.zeros((EYES_16.num_lms, 2))
+    roll = np.radians(20)
+    for eye, centre in zip(EYES_16.eyes, [(-40, 0), (40, 0)]):
+        points[eye] = [200 + centre[0] * np.cos(roll), 200 + centre[0] * np.sin(roll)]
+    face = FakeFace(box, ((points - 100) / 200).astype(np.float32).ravel())
+    (pose,) = estimator.estimate([face], FRAME_SHAPE)
+    assert abs(pose[0] - 20) < 1e-3 and pose[1] is None and pose[2] is None
+    print("✓ roll {:.1f}°, pitch and yaw unknown".format(pose[0]))
+
+
+def test_distraction():
+    """eval_scores reports a distraction once the head stays turned for pose_time_thresh"""
+    print("\n" + "=" * 50)
+    print("Testing the distraction check")
+    print("=" * 50)
+
+    from attention_score import AttentionScorer
+    from head_pose import HeadPoseEstimator
+    from landmark_schema import get_schema
+
+    schema = get_schema('data_300W', 68)
+    estimator = HeadPoseEstimator(schema)
+    scorer = AttentionScorer(t_now=0., ear_thresh=0.15, gaze_thresh=0.2, perclos_thresh=0.2, roll_thresh=15,
+                             pitch_thresh=15, yaw_thresh=15, ear_time_thresh=0.2, gaze_time_thresh=0.2, pose_time_thresh=2.0)
+    flags = []
+    for step in range(50):
+        t_now = step * 0.1
+        yaw = 0 if t_now < 1.0 else 40
+        face = project_face(schema, (0, 0, yaw), (320, 240))
+        estimator.estimate([face], FRAME_SHAPE)
+        _, _, distracted = scorer.eval_scores(t_now, 0.3, None, *face.head_pose)
+        flags.append(distracted)
+    first = flags.index(True)
+    assert not any(flags[:first]) and all(flags[first:])
+    assert 3.0 <= first * 0.1 <= 3.2
+    print("✓ distracted {:.1f}s after the head turned".format(first * 0.1 - 1.0))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Angle conversion', test_euler_angles), ('Tracked pose', test_tracked_pose),
+                       ('Eye-only layout', test_eye_only_layout), ('Distraction', test_distraction)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,172 @@
+"""
+Test script for the fixed-bucket histogram
+Run this to verify quantiles against distributions whose quantiles are known
+"""
+
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import numpy as np
+
+
+def test_uniform():
+    """Evenly spread values: the interpolated quantiles are exact"""
+    print("=" * 50)
+    print("Testing quantiles of a uniform distribution")
+    print("=" * 50)
+
+    from histogram import Histogram
+
+    histogram = Histogram(buckets=[round(0.1 * k, 1) for k in range(1, 11)])
+    assert histogram.quantile(0.5) == 0.
+    for value in range(1, 1001):
+        histogram.observe(value / 1000.)
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99):
+        assert abs(histogram.quantile(q) - q) < 1e-9, (q, histogram.quantile(q))
+    assert histogram.quantile(1.0) == histogram.max == 1.0
+    assert abs(histogram.mean - 0.5005) < 1e-9
+    assert histogram.cumulative_counts()[4] == (0.5, 500)
+    assert histogram.cumulative_counts()[-1] == (float('inf'), 1000)
+    print("✓ p10..p99 exact, mean and cumulative counts")
+
+
+def test_exponential():
+    """Exponential latencies: every quantile falls in the bucket of the true one"""
+    print("\n" + "=" * 50)
+    print("Testing quantiles of an exponential distribution")
+    print("=" * 50)
+
+    from histogram import Histogram, LATENCY_BUCKETS
+
+    values = np.random.default_rng(0).exponential(0.02, 100000)
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(float(value))
+    bounds = (0.,) + LATENCY_BUCKETS
+    for q in (0.5, 0.95, 0.99):
+        truth = np.quantile(values, q)
+        idx = np.searchsorted(LATENCY_BUCKETS, truth)
+        estimate = histogram.quantile(q)
+        assert bounds[idx] <= estimate <= bounds[idx + 1], (q, truth, estimate)
+        print(f"   p{int(q * 100)}: {estimate * 1000:.2f} ms (true {truth * 1000:.2f} ms)")
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 100000 and abs(snapshot['mean'] - values.mean()) < 1e-9
+    print("✓ p50, p95 and p99 within their buckets")
+
+
+def test_bounded_by_max():
+    """Interpolation never goes past the largest value, also beyond the last bucket"""
+    print("\n" + "=" * 50)
+    print("Testing the max clamp")
+    print("=" * 50)
+
+    from histogram import Histogram
+
+    histogram = Histogram()
+    for _ in range(10):
+        histogram.observe(0.004)
+    assert abs(histogram.quantile(0.5) - 0.0035) < 1e-12
+    assert histogram.quantile(1.0) == 0.004
+
+    histogram.observe(10.)
+    assert histogram.quantile(1.0) == 10.
+    assert 5. <= histogram.quantile(0.99) <= 10.
+    histogram.clear()
+    assert histogram.count == 0 and histogram.quantile(0.99) == 0.
+    print("✓ quantiles clamped to the max, +Inf bucket ends at the max")
+
+
+class FakeClock:
+    def __init__(self, t=1000.):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_rolling_window():
+    """With a window, values older than it leave the quantiles, the Prometheus counts keep them"""
+    print("\n" + "=" * 50)
+    print("Testing the rolling window")
+    print("=" * 50)
+
+    from histogram import Histogram
+
+    clock = FakeClock()
+    histogram = Histogram(window=60., slices=6, clock=clock)
+    # a minute of slow frames, then a minute of fast ones
+    for _ in range(600):
+        histogram.observe(0.2)
+        clock.t += 0.1
+    assert histogram.quantile(0.95) > 0.15
+    for step in range(600):
+        histogram.observe(0.004)
+        clock.t += 0.1
+        if step == 300:
+            # half way the slow frames still fill the p95
+            assert histogram.quantile(0.95) > 0.15
+    assert histogram.quantile(0.95) <= 0.005 and histogram.recent_max == 0.004
+    assert histogram.count == 1200 and histogram.max == 0.2
+    assert histogram.cumulative_counts()[-1][1] == 1200
+    print("✓ slow frames left the p95 within a minute, cumulative counts kept them")
+
+    # nothing observed for longer than the window: no recent values at all
+    clock.t += 61
+    assert histogram.quantile(0.5) == 0. and histogram.snapshot()['max'] == 0.
+    assert histogram.snapshot()['count'] == 1200
+    print("✓ idle histogram ages out on read")
+
+
+def test_profiler_window():
+    """FrameProfiler percentiles roll, window=None keeps every frame (replays)"""
+    print("\n" + "=" * 50)
+    print("Testing the profiler window")
+    print("=" * 50)
+
+    from instrumentation import FrameProfiler
+
+    clock = FakeClock()
+    rolling, whole_run = FrameProfiler(), FrameProfiler(window=None)
+    for timer in rolling.timers.values():
+        timer.histogram.clock = clock
+        timer.histogram.clear()
+    for elapsed in [0.2] * 50 + [0.004] * 50:
+        for profiler in (rolling, whole_run):
+            profiler.start_frame()
+            profiler.record('detect', elapsed)
+            profiler.end_frame()
+        clock.t += 2.
+    assert rolling.snapshot()['stages']['detect']['p95'] <= 5
+    assert whole_run.snapshot()['stages']['detect']['p95'] > 150
+    assert rolling.snapshot()['stages']['detect']['count'] == 100
+    print("✓ p95 {:.1f} ms over the last minute, {:.1f} ms over the run".format(
+        rolling.snapshot()['stages']['detect']['p95'], whole_run.snapshot()['stages']['detect']['p95']))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Uniform', test_uniform), ('Exponential', test_exponential),
+                       ('Bounded by max', test_bounded_by_max), ('Rolling window', test_rolling_window),
+                       ('Profiler window', test_profiler_window)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,149 @@
+"""
+Test script for the dynamic batcher of the inference service
+Run this to verify requests are grouped, flushed after max_wait_ms and failed together
+"""
+
+import os
+import sys
+import time
+import threading
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+
+class Recorder:
+    """process_batch stand-in that doubles every item and remembers the batches it got"""
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.error is not None:
+            raise self.error
+        return [item * 2 for item in items]
+
+
+def test_full_batch():
+    """Requests waiting together go through one process_batch call, in order"""
+    print("=" * 50)
+    print("Testing batching")
+    print("=" * 50)
+
+    from inference_service import DynamicBatcher
+
+    recorder = Recorder()
+    batcher = DynamicBatcher(recorder, max_batch_size=4, max_wait_ms=500)
+    try:
+        t_start = time.perf_counter()
+        futures = [batcher.submit(item) for item in range(6)]
+        assert [future.result(timeout=5) for future in futures[:4]] == [0, 2, 4, 6]
+        # a full batch does not wait for max_wait_ms
+        assert time.perf_counter() - t_start < 0.4
+        assert [future.result(timeout=5) for future in futures[4:]] == [8, 10]
+        assert recorder.batches == [[0, 1, 2, 3], [4, 5]]
+        assert batcher(7, timeout=5) == 14
+        assert batcher.latency.count == 7
+        assert batcher.batch_sizes.count == 3
+    finally:
+        batcher.stop()
+    print("✓ 6 requests in batches of 4 and 2, results back to their callers")
+
+
+def test_max_wait_flush():
+    """A batch that does not fill up runs once its oldest request has waited max_wait_ms"""
+    print("\n" + "=" * 50)
+    print("Testing the max-wait flush")
+    print("=" * 50)
+
+    from inference_service import DynamicBatcher
+
+    recorder = Recorder()
+    batcher = DynamicBatcher(recorder, max_batch_size=8, max_wait_ms=50)
+    try:
+        t_start = time.perf_counter()
+        futures = [batcher.submit(item) for item in (1, 2)]
+        assert [future.result(timeout=5) for future in futures] == [2, 4]
+        waited = time.perf_counter() - t_start
+        assert 0.045 <= waited < 1.0, waited
+        assert recorder.batches == [[1, 2]]
+        assert batcher.latency.quantile(0.5) >= 0.045
+    finally:
+        batcher.stop()
+    print("✓ 2 of 8 requests flushed after {:.0f} ms".format(waited * 1000))
+
+
+def test_exception():
+    """An exception in process_batch reaches every caller of the batch, latency is still recorded"""
+    print("\n" + "=" * 50)
+    print("Testing the exception path")
+    print("=" * 50)
+
+    from inference_service import DynamicBatcher
+
+    batcher = DynamicBatcher(Recorder(ValueError('bad frame')), max_batch_size=3, max_wait_ms=500)
+    try:
+        futures = [batcher.submit(item) for item in range(3)]
+        errors = [future.exception(timeout=5) for future in futures]
+        assert all(isinstance(error, ValueError) for error in errors), errors
+        assert batcher.latency.count == 3
+    finally:
+        batcher.stop()
+
+    # a result missing for some request fails the whole batch instead of leaving callers waiting
+    batcher = DynamicBatcher(lambda items: items[:1], max_batch_size=2, max_wait_ms=500)
+    try:
+        futures = [batcher.submit(item) for item in range(2)]
+        assert all(isinstance(future.exception(timeout=5), RuntimeError) for future in futures)
+    finally:
+        batcher.stop()
+    print("✓ every caller of a failed batch gets the exception")
+
+
+def test_stop():
+    """Requests queued behind stop() and submitted after it fail instead of hanging"""
+    print("\n" + "=" * 50)
+    print("Testing stop")
+    print("=" * 50)
+
+    from inference_service import DynamicBatcher
+
+    release = threading.Event()
+    batcher = DynamicBatcher(lambda items: release.wait(5) and items, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit(1)
+    time.sleep(0.05)
+    queued = batcher.submit(2)
+    batcher.stop()
+    release.set()
+    assert first.result(timeout=5) == 1
+    assert isinstance(queued.exception(timeout=5), RuntimeError)
+    assert isinstance(batcher.submit(3).exception(timeout=5), RuntimeError)
+    batcher.thread.join(timeout=5)
+    assert not batcher.thread.is_alive()
+    print("✓ pending requests failed on stop")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Full batch', test_full_batch), ('Max-wait flush', test_max_wait_flush),
+                       ('Exception', test_exception), ('Stop', test_stop)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,120 @@
+"""
+Test script for the batched landmark pipeline
+Run this to verify batched PIP decoding matches the single-face path used by app.py
+"""
+
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import numpy as np
+import torch
+
+
+def build_random_net():
+    import model_loader
+    cfg = model_loader.load_experiment_config('WFLW', 'pip_32_16_60_r18_l2_l1_10_1_nb10')
+    torch.manual_seed(0)
+    net = model_loader.build_landmark_net(cfg)
+    net.eval()
+    return cfg, net
+
+
+def test_forward_pip_batch():
+    """forward_pip_batch + merge_nb_predictions == forward_pip + app.py merge, face by face"""
+    print("=" * 50)
+    print("Testing forward_pip_batch")
+    print("=" * 50)
+
+    import model_loader
+    from functions import forward_pip, forward_pip_batch, merge_nb_predictions
+
+    cfg, net = build_random_net()
+    _, reverse_index1, reverse_index2, max_len = model_loader.load_meanface(cfg)
+    inputs = torch.randn(3, 3, cfg.input_size, cfg.input_size)
+
+    lms_x, lms_y, nb_x, nb_y, _, _ = forward_pip_batch(net, inputs, cfg.input_size, cfg.net_stride, cfg.num_nb)
+    batched = merge_nb_predictions(lms_x, lms_y, nb_x, nb_y, reverse_index1, reverse_index2, max_len)
+    print(f"✓ Batched output shape: {tuple(batched.shape)}")
+    assert batched.shape == (3, cfg.num_lms, 2)
+
+    for b in range(inputs.shape[0]):
+        lms_pred_x, lms_pred_y, lms_pred_nb_x, lms_pred_nb_y, _, _ = forward_pip(net, inputs[b:b+1], None, cfg.input_size, cfg.net_stride, cfg.num_nb)
+        tmp_nb_x = lms_pred_nb_x[reverse_index1, reverse_index2].view(cfg.num_lms, max_len)
+        tmp_nb_y = lms_pred_nb_y[reverse_index1, reverse_index2].view(cfg.num_lms, max_len)
+        tmp_x = torch.mean(torch.cat((lms_pred_x, tmp_nb_x), dim=1), dim=1).view(-1, 1)
+        tmp_y = torch.mean(torch.cat((lms_pred_y, tmp_nb_y), dim=1), dim=1).view(-1, 1)
+        lms_pred_merge = torch.cat((tmp_x, tmp_y), dim=1).flatten()
+        assert torch.allclose(batched[b].flatten(), lms_pred_merge, atol=1e-5)
+    print("✓ Batched landmarks match single-face decoding")
+
+
+def test_pipeline_predict():
+    """LandmarkPipeline.predict accepts any number of crops"""
+    print("\n" + "=" * 50)
+    print("Testing LandmarkPipeline.predict")
+    print("=" * 50)
+
+    from landmark_pipeline import LandmarkPipeline
+
+    cfg, net = build_random_net()
+    pipeline = LandmarkPipeline(None, net, cfg, torch.device('cpu'))
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 255, (cfg.input_size, cfg.input_size, 3), dtype=np.uint8) for _ in range(4)]
+
+    assert pipeline.predict([]).shape == (0, cfg.num_lms * 2)
+    lms = pipeline.predict(crops)
+    assert lms.shape == (4, cfg.num_lms * 2)
+    assert np.allclose(pipeline.predict(crops[1:2])[0], lms[1], atol=1e-5)
+    print("✓ Crops are independent of their batch neighbours")
+
+
+def test_aspect_ratio_batch():
+    """calculate_aspect_ratio_batch == calculate_aspect_ratio face by face, for every input layout"""
+    print("\n" + "=" * 50)
+    print("Testing calculate_aspect_ratio_batch")
+    print("=" * 50)
+
+    from functions import calculate_aspect_ratio, calculate_aspect_ratio_batch
+
+    rng = np.random.default_rng(0)
+    lms = rng.uniform(0, 1, (64, 32)).astype(np.float32)
+    average, left, right = calculate_aspect_ratio_batch(lms)
+    assert average.shape == left.shape == right.shape == (64,)
+    for i in range(len(lms)):
+        expected = calculate_aspect_ratio(lms[i])
+        assert np.allclose((average[i], left[i], right[i]), expected, rtol=1e-5)
+    print("✓ Flat (N, 32) landmarks match the per-face EAR")
+
+    points = calculate_aspect_ratio_batch(lms.reshape(64, 16, 2))
+    trace = calculate_aspect_ratio_batch(lms.reshape(8, 8, 16, 2))
+    assert np.allclose(points[0], average)
+    assert trace[0].shape == (8, 8) and np.allclose(trace[0].reshape(-1), average)
+    print("✓ (N, 16, 2) points and (T, faces, 16, 2) traces")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('forward_pip_batch', test_forward_pip_batch), ('LandmarkPipeline', test_pipeline_predict),
+                       ('calculate_aspect_ratio_batch', test_aspect_ratio_batch)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,149 @@
+"""
+Test script for the landmark schema registry
+Run this to verify EAR is computed from the right points for every experiments/* landmark layout
+"""
+
+import glob
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def experiment_configs():
+    import model_loader
+    for path in sorted(glob.glob(os.path.join(ROOT, 'experiments', '*', '*.py'))):
+        data_name = os.path.basename(os.path.dirname(path))
+        yield model_loader.load_experiment_config(data_name, os.path.splitext(os.path.basename(path))[0])
+
+
+def test_default_schema():
+    """The 16-point schema gives exactly the original calculate_aspect_ratio"""
+    print("=" * 50)
+    print("Testing default schema")
+    print("=" * 50)
+
+    from functions import calculate_aspect_ratio, calculate_aspect_ratio_batch
+    from landmark_schema import EYES_16
+
+    lms = np.random.default_rng(0).uniform(0, 1, (32, 32))
+    average, left, right = calculate_aspect_ratio_batch(lms, EYES_16)
+    for i in range(len(lms)):
+        expected = calculate_aspect_ratio(lms[i])
+        assert np.allclose((average[i], left[i], right[i]), expected)
+        assert np.allclose(calculate_aspect_ratio(lms[i], EYES_16), expected)
+    print("✓ Same EAR as the hard-coded 16-point formula")
+
+
+def test_every_experiment():
+    """Every experiment config resolves to a schema of its size, eyeless ones refuse an EAR"""
+    print("\n" + "=" * 50)
+    print("Testing experiment configs")
+    print("=" * 50)
+
+    from landmark_schema import schema_for
+
+    for cfg in experiment_configs():
+        schema = schema_for(cfg, need_eyes=False)
+        assert schema.num_lms == cfg.num_lms, (cfg.data_name, cfg.experiment_name)
+        if schema.has_eyes:
+            assert schema.eyes.max() < cfg.num_lms
+        else:
+            try:
+                schema_for(cfg)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('{} should have no EAR'.format(cfg.data_name))
+        print("✓ {}/{}: {}".format(cfg.data_name, cfg.experiment_name, schema.name))
+
+
+def test_meanface_geometry():
+    """On each meanface the contours start at the corners and an open eye has a sane EAR"""
+    print("\n" + "=" * 50)
+    print("Testing schemas against the meanfaces")
+    print("=" * 50)
+
+    from functions import calculate_aspect_ratio
+    from landmark_schema import get_schema
+
+    for path in sorted(glob.glob(os.path.join(ROOT, 'data', '*', 'meanface.txt'))):
+        data_name = os.path.basename(os.path.dirname(path))
+        meanface = np.loadtxt(path).reshape(-1, 2)
+        schema = get_schema(data_name, len(meanface))
+        if not schema.has_eyes:
+            continue
+        for contour in (schema.left_eye, schema.right_eye, schema.mouth):
+            if contour is None:
+                continue
+            points = meanface[contour]
+            half = len(contour) // 2
+            # corners are the horizontal extremes, the upper lid is above the lower one
+            assert {int(np.argmin(points[:, 0])), int(np.argmax(points[:, 0]))} == {0, half}, (data_name, contour)
+            assert all(points[i, 1] < points[len(contour) - i, 1] for i in range(1, half)), (data_name, contour)
+        assert meanface[schema.left_eye, 0].mean() < meanface[schema.right_eye, 0].mean()
+        average, left, right = calculate_aspect_ratio(meanface.reshape(-1), schema)
+        assert 0.1 < left < 0.5 and 0.1 < right < 0.5, (data_name, left, right)
+        print("✓ {}: EAR {:.3f}".format(data_name, average))
+
+
+def test_pipeline_other_layout():
+    """A 68-landmark model drives LandmarkPipeline without code changes"""
+    print("\n" + "=" * 50)
+    print("Testing a 68-landmark pipeline")
+    print("=" * 50)
+
+    import model_loader
+    from functions import calculate_aspect_ratio
+    from landmark_pipeline import LandmarkPipeline
+
+    cfg = model_loader.load_experiment_config('data_300W', 'pip_32_16_60_r18_l2_l1_10_1_nb10')
+    torch.manual_seed(0)
+    net = model_loader.build_landmark_net(cfg)
+    net.eval()
+    pipeline = LandmarkPipeline(None, net, cfg, torch.device('cpu'))
+    assert pipeline.schema.name == 'ibug_68'
+    frame = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    faces = pipeline.process_boxes(frame, [((40, 30, 200, 190), 0.99)])
+    assert faces[0].lms_pred_merge.shape == (68 * 2,)
+    assert np.isclose(faces[0].average_aspect_ratio, calculate_aspect_ratio(faces[0].lms_pred_merge, pipeline.schema)[0])
+    print("✓ EAR {:.3f} from the 68-point eye contours".format(faces[0].average_aspect_ratio))
+
+    cfg = model_loader.load_experiment_config('AFLW', 'pip_32_16_60_r18_l2_l1_10_1_nb10')
+    try:
+        LandmarkPipeline(None, None, cfg, torch.device('cpu'))
+    except ValueError as e:
+        print("✓ AFLW refused: {}".format(e))
+    else:
+        raise AssertionError('AFLW has no eyelids')
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Default schema', test_default_schema), ('Experiment configs', test_every_experiment),
+                       ('Meanface geometry', test_meanface_geometry), ('Other layouts', test_pipeline_other_layout)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,108 @@
+"""
+Test script for optical-flow landmark propagation
+Run this to verify landmarks follow the image between inferences and fall back when lost
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+BOX = (400, 150, 699, 449)
+
+
+def textured_frame(seed=0, shift=(0, 0)):
+    """Smooth random texture (LK needs gradients everywhere), shifted by (dx, dy) pixels"""
+    rng = np.random.default_rng(seed)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, size=(760, 1320), dtype=np.uint8), (0, 0), 3)
+    texture = cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+    dx, dy = shift
+    gray = texture[20 - dy:740 - dy, 20 - dx:1300 - dx]
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def eye_landmarks():
+    """16 eye points normalised to BOX, ordered like calculate_aspect_ratio expects"""
+    left = [(0.25, 0.40), (0.29, 0.37), (0.33, 0.36), (0.37, 0.37), (0.41, 0.40), (0.37, 0.43), (0.33, 0.44), (0.29, 0.43)]
+    right = [(x + 0.34, y) for x, y in left]
+    return np.array(left + right, dtype=np.float32).reshape(-1)
+
+
+def test_propagation():
+    """Landmarks move with the image and the EAR is computed from the moved points"""
+    print("=" * 50)
+    print("Testing landmark propagation")
+    print("=" * 50)
+
+    from functions import calculate_aspect_ratio
+    from landmark_pipeline import FaceResult
+    from landmark_tracker import LandmarkTracker
+
+    tracker = LandmarkTracker(interval=3)
+    face = FaceResult(BOX, 0.99, eye_landmarks())
+    assert tracker.inference_due()
+    tracker.start(textured_frame(), [face])
+    assert not tracker.inference_due()
+
+    faces = tracker.propagate(textured_frame(shift=(4, -3)))
+    assert faces is not None, "a small translation must be tracked"
+    moved = faces[0].landmarks_px()
+    error = np.abs(moved - (face.landmarks_px() + np.float32([4, -3]))).max()
+    assert error < 0.5, error
+    assert faces[0].box == (404, 147, 703, 446)
+    expected_ear = calculate_aspect_ratio(face.lms_pred_merge)[0]
+    assert abs(faces[0].average_aspect_ratio - expected_ear) < 0.02
+    print("✓ Landmarks followed a (4, -3) px shift, max error {:.2f} px".format(error))
+
+    assert not tracker.inference_due()
+    assert tracker.propagate(textured_frame(shift=(6, -2))) is not None
+    assert tracker.inference_due(), "every 3rd frame runs the models"
+    print("✓ Inference every 3 frames")
+
+
+def test_fallback():
+    """A frame the points cannot be found in asks for inference instead"""
+    print("\n" + "=" * 50)
+    print("Testing fallback to inference")
+    print("=" * 50)
+
+    from landmark_pipeline import FaceResult
+    from landmark_tracker import LandmarkTracker
+
+    tracker = LandmarkTracker(interval=5)
+    tracker.start(textured_frame(), [FaceResult(BOX, 0.99, eye_landmarks())])
+    assert tracker.propagate(textured_frame(seed=1)) is None
+    assert tracker.fallbacks == 1 and tracker.frames_propagated == 0
+    print("✓ Lost points fall back to inference")
+
+    tracker.start(textured_frame(), [])
+    assert tracker.inference_due(), "nothing to track without a face"
+    print("✓ No face, no propagation")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Propagation', test_propagation), ('Fallback', test_fallback)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,223 @@
+"""
+Test script for the Prometheus metrics endpoint
+Run this to verify /metrics can be scraped and reports what the detector loop feeds it
+"""
+
+import os
+import re
+import sys
+import urllib.request
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[^}]*\})? (-?[0-9.e+-]+|\+Inf|-Inf|NaN)$')
+
+
+def scrape(port):
+    with urllib.request.urlopen('http://127.0.0.1:{}/metrics'.format(port), timeout=5) as response:
+        assert response.headers['Content-Type'].startswith('text/plain')
+        return response.read().decode('utf-8')
+
+
+def parse_samples(text):
+    """{'name{labels}': value} for every sample line, checking the text format on the way"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        assert SAMPLE_RE.match(line), "malformed sample line: {}".format(line)
+        key, value = line.rsplit(' ', 1)
+        samples[key] = float(value)
+    return samples
+
+
+def test_scrape_metrics():
+    """A local scraper sees frame counters, gauges, stage histograms and process stats"""
+    print("=" * 50)
+    print("Testing /metrics scrape")
+    print("=" * 50)
+
+    from instrumentation import FrameProfiler
+    from metrics_server import DetectorMetrics, start_metrics_server
+
+    metrics = DetectorMetrics()
+    profiler = FrameProfiler()
+    metrics.attach_profiler(profiler)
+    for face_detected in (True, True, False):
+        profiler.start_frame()
+        with profiler.stage('detect'):
+            pass
+        profiler.end_frame()
+        metrics.observe_frame('cab 1', face_detected, perclos=0.125, aspect_ratio=0.3, fps=14.5, dropped=2)
+
+    httpd = start_metrics_server(0, registry=metrics.registry)
+    try:
+        samples = parse_samples(scrape(httpd.server_address[1]))
+    finally:
+        httpd.shutdown()
+
+    assert samples['ddd_frames_processed_total{stream="cab 1"}'] == 3
+    assert samples['ddd_frames_dropped_total{stream="cab 1"}'] == 6
+    assert samples['ddd_face_detected_frames_total{stream="cab 1"}'] == 2
+    assert 0 < samples['ddd_face_detected_ratio{stream="cab 1"}'] < 1
+    assert samples['ddd_perclos{stream="cab 1"}'] == 0.125
+    assert samples['ddd_fps{stream="cab 1"}'] == 14.5
+    print("✓ Frame counters and gauges")
+
+    assert samples['ddd_stage_latency_seconds_count{stage="detect"}'] == 3
+    assert samples['ddd_stage_latency_seconds_bucket{stage="detect",le="+Inf"}'] == 3
+    assert samples['ddd_stage_latency_seconds_count{stage="total"}'] == 3
+    assert 'ddd_stage_latency_seconds_count{stage="forward"}' in samples
+    print("✓ Stage latency histograms")
+
+    assert samples['process_resident_memory_bytes'] > 0
+    assert samples['process_peak_resident_memory_bytes'] >= samples['process_resident_memory_bytes'] * 0.9
+    assert samples['process_cpu_seconds_total'] > 0
+    print("✓ Process CPU and RSS")
+
+
+def test_alert_counts():
+    """Alerts fired by AttentionScorer.play_alert are counted per type"""
+    print("\n" + "=" * 50)
+    print("Testing alert counters")
+    print("=" * 50)
+
+    from attention_score import AttentionScorer
+    from metrics_server import DetectorMetrics
+
+    metrics = DetectorMetrics()
+    scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)
+    scorer.audio_files = {}
+    scorer.alert_listeners.append(metrics.alert_listener('webcam'))
+
+    scorer.play_alert('Drowsy')
+    scorer.play_alert('Drowsy')  # once per PERCLOS period
+    scorer.play_alert('Awake')
+    assert metrics.alerts.get('webcam', 'Drowsy') == 1
+    assert metrics.alerts.get('webcam', 'Awake') == 0
+    assert 'ddd_alerts_total{stream="webcam",type="Drowsy"} 1' in metrics.registry.exposition()
+    print("✓ Alerts counted once per period")
+
+    # eyes held closed: Sleeping after sleep_threshold seconds, one alert however many frames follow
+    scorer.audio_enabled = False
+    t_now = 0.
+    for _ in range(30):
+        t_now += 1 / 30.
+        scorer.get_PERCLOS(t_now, 30, 0.3)
+    statuses = []
+    for _ in range(int(30 * (scorer.sleep_threshold + 5))):
+        t_now += 1 / 30.
+        statuses.append(scorer.get_PERCLOS(t_now, 30, 0.02)[0])
+    assert statuses.count('Sleeping') > 100
+    assert metrics.alerts.get('webcam', 'Sleeping') == 1
+    # awake again and asleep again is a second alert
+    for _ in range(30):
+        t_now += 1 / 30.
+        scorer.get_PERCLOS(t_now, 30, 0.3)
+    for _ in range(int(30 * (scorer.sleep_threshold + 1))):
+        t_now += 1 / 30.
+        scorer.get_PERCLOS(t_now, 30, 0.02)
+    assert metrics.alerts.get('webcam', 'Sleeping') == 2
+    print("✓ {} Sleeping frames counted as one alert per onset".format(statuses.count('Sleeping')))
+
+
+def test_without_proc():
+    """Without /proc (macOS) no current RSS is published, the peak RSS is in bytes"""
+    print("\n" + "=" * 50)
+    print("Testing the exposition without /proc")
+    print("=" * 50)
+
+    import builtins
+    import metrics_server
+
+    rss = metrics_server.process_rss_bytes()
+    real_open = builtins.open
+
+    def no_proc(path, *args, **kwargs):
+        if str(path).startswith('/proc'):
+            raise OSError('no /proc')
+        return real_open(path, *args, **kwargs)
+
+    builtins.open = no_proc
+    try:
+        assert metrics_server.process_rss_bytes() is None
+        peak = metrics_server.process_peak_rss_bytes()
+        samples = parse_samples(metrics_server.DetectorMetrics().registry.exposition())
+    finally:
+        builtins.open = real_open
+    assert 'process_resident_memory_bytes' not in samples
+    assert samples['process_peak_resident_memory_bytes'] == peak
+    if rss is not None:
+        # same order of magnitude as the real RSS, not 1024x off
+        assert rss * 0.9 <= peak < rss * 10, (rss, peak)
+
+    # macOS reports ru_maxrss in bytes already
+    import resource
+    platform = sys.platform
+    sys.platform = 'darwin'
+    try:
+        assert metrics_server.process_peak_rss_bytes() == resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        sys.platform = platform
+    print("✓ current RSS left out, peak RSS {:.0f} MB".format(peak / 2**20))
+
+
+def test_without_resource_module():
+    """Without the Unix-only resource module (Windows) the process metrics are left out"""
+    print("\n" + "=" * 50)
+    print("Testing the exposition without the resource module")
+    print("=" * 50)
+
+    import builtins
+    import metrics_server
+
+    real_import, real_open = builtins.__import__, builtins.open
+
+    def no_resource(name, *args, **kwargs):
+        if name == 'resource':
+            raise ImportError('No module named resource')
+        return real_import(name, *args, **kwargs)
+
+    def no_proc(path, *args, **kwargs):
+        if str(path).startswith('/proc'):
+            raise OSError('no /proc')
+        return real_open(path, *args, **kwargs)
+
+    builtins.__import__, builtins.open = no_resource, no_proc
+    try:
+        assert metrics_server.process_cpu_seconds() is None
+        assert metrics_server.process_rss_bytes() is None
+        text = metrics_server.DetectorMetrics().registry.exposition()
+    finally:
+        builtins.__import__, builtins.open = real_import, real_open
+    samples = parse_samples(text)
+    assert not any(name.startswith('process_') for name in samples)
+    print("✓ process_* series skipped, the rest is still exported")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Scrape /metrics', test_scrape_metrics), ('Alert counters', test_alert_counts),
+                       ('Without /proc', test_without_proc), ('Without resource', test_without_resource_module)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
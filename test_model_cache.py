@@ -0,0 +1,133 @@
+"""
+Test script for the Streamlit model cache
+Run this to verify models are loaded once, and the background load runs in the session's script context
+"""
+
+import os
+import sys
+import threading
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import numpy as np
+
+
+class CountingLoader:
+    """Stands in for the from_experiment classmethods, without weights on disk: counts loads and
+    remembers the thread and ScriptRunContext of the last one"""
+    def __init__(self, model_factory):
+        self.model_factory = model_factory
+        self.loads = 0
+        self.thread = None
+        self.ctx = None
+
+    def __call__(self, cls, *args, **kwargs):
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        self.loads += 1
+        self.thread = threading.current_thread().name
+        self.ctx = get_script_run_ctx(suppress_warning=True)
+        return self.model_factory()
+
+
+class FakeIris:
+    input_size = 32
+
+    def predict(self, crops):
+        return np.zeros((len(crops), 5, 2), dtype=np.float32)
+
+
+def prefetch_script():
+    import streamlit as st
+    import model_cache
+    pipeline = model_cache.prefetch_pipeline().result()
+    st.write('pipeline {}'.format(id(pipeline)))
+
+
+def test_pipeline_cached():
+    """The background load sees the caller's ScriptRunContext, later get_pipeline calls hit the cache"""
+    print("=" * 50)
+    print("Testing the pipeline cache")
+    print("=" * 50)
+
+    import model_cache
+    from landmark_pipeline import LandmarkPipeline
+    from streamlit.testing.v1 import AppTest
+
+    loader = CountingLoader(object)
+    from_experiment, warm_up = LandmarkPipeline.__dict__['from_experiment'], model_cache.warm_up
+    LandmarkPipeline.from_experiment = classmethod(loader)
+    model_cache.warm_up = lambda pipeline: None
+    model_cache._load_pipeline.clear()
+    try:
+        app = AppTest.from_function(prefetch_script, default_timeout=30).run()
+        assert not app.exception, app.exception
+        assert loader.loads == 1 and loader.thread.startswith('model-loader')
+        assert loader.ctx is not None, "loader thread ran without a ScriptRunContext"
+        print("✓ loaded on {} inside the session's script run".format(loader.thread))
+
+        pipeline = model_cache.get_pipeline()
+        assert model_cache.get_pipeline() is pipeline
+        assert model_cache.prefetch_pipeline().result(timeout=30) is pipeline
+        assert app.markdown[0].value == 'pipeline {}'.format(id(pipeline))
+        assert loader.loads == 1
+        print("✓ get_pipeline and prefetch_pipeline return the cached pipeline")
+    finally:
+        LandmarkPipeline.from_experiment = from_experiment
+        model_cache.warm_up = warm_up
+        model_cache._load_pipeline.clear()
+
+
+def test_iris_model_cached():
+    """The iris model is loaded once per experiment and device, and not at all without a snapshot"""
+    print("\n" + "=" * 50)
+    print("Testing the iris model cache")
+    print("=" * 50)
+
+    import torch
+    import model_cache
+    from gaze_cascade import IrisModel, DEFAULT_IRIS_EXPERIMENT, iris_snapshot_exists
+
+    if not iris_snapshot_exists():
+        assert model_cache.get_iris_model(DEFAULT_IRIS_EXPERIMENT, torch.device('cpu')) is None
+        print("✓ no Iris snapshot, no model")
+
+    loader = CountingLoader(FakeIris)
+    from_experiment = IrisModel.__dict__['from_experiment']
+    IrisModel.from_experiment = classmethod(loader)
+    model_cache._load_iris_model.clear()
+    try:
+        model = model_cache._load_iris_model(DEFAULT_IRIS_EXPERIMENT, 'cpu', 1)
+        assert model_cache._load_iris_model(DEFAULT_IRIS_EXPERIMENT, 'cpu', 1) is model
+        assert loader.loads == 1
+        # a retrained snapshot (new mtime) is loaded again
+        assert model_cache._load_iris_model(DEFAULT_IRIS_EXPERIMENT, 'cpu', 2) is not model
+        assert loader.loads == 2
+        print("✓ second call returns the cached model, a new snapshot reloads")
+    finally:
+        IrisModel.from_experiment = from_experiment
+        model_cache._load_iris_model.clear()
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Pipeline cache', test_pipeline_cached), ('Iris model cache', test_iris_model_cached)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,111 @@
+"""
+Test script for the motion gate in front of the detector
+Run this to verify static frames skip the models and eye closure is still seen
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+FACE_BOX = (500, 200, 799, 499)
+
+
+def make_frame(eyes_closed=False, seed=0):
+    """A noisy 720p frame with a bright 'face' whose eye patches darken when closed"""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 4, size=(720, 1280, 3), dtype=np.uint8) + 60
+    frame[200:500, 500:800] = 180
+    eye_value = 170 if eyes_closed else 40
+    frame[300:320, 560:620] = eye_value
+    frame[300:320, 680:740] = eye_value
+    return frame
+
+
+def test_gate_decisions():
+    """Static frames are skipped, staleness and eye closure force the models to run"""
+    print("=" * 50)
+    print("Testing MotionGate decisions")
+    print("=" * 50)
+
+    from motion_gate import MotionGate
+
+    gate = MotionGate(max_stale=1.0)
+    assert gate.should_run(make_frame(), 0.0), "first frame must run"
+    gate.update(make_frame(), 0.0, [FACE_BOX])
+
+    for i, t in enumerate((0.1, 0.2, 0.3)):
+        assert not gate.should_run(make_frame(seed=i + 1), t), "sensor noise must not count as motion"
+    print("✓ Static frames skipped")
+
+    assert gate.should_run(make_frame(eyes_closed=True, seed=5), 0.4), "eye closure inside the face box"
+    gate.update(make_frame(eyes_closed=True, seed=5), 0.4, [FACE_BOX])
+    print("✓ Eye closure runs the models")
+
+    assert not gate.should_run(make_frame(eyes_closed=True, seed=6), 1.3)
+    assert gate.should_run(make_frame(eyes_closed=True, seed=7), 1.5), "result older than max_stale"
+    print("✓ Stale results refreshed")
+
+    assert gate.frames_run == 3 and gate.frames_skipped == 4
+    print("✓ Skip ratio {:.2f}".format(gate.skip_ratio))
+
+
+def test_perclos_on_skipped_frames():
+    """Reusing the last EAR on skipped frames counts closed-eye frames like running the models"""
+    print("\n" + "=" * 50)
+    print("Testing PERCLOS with reused EAR")
+    print("=" * 50)
+
+    from attention_score import AttentionScorer
+    from motion_gate import MotionGate
+
+    def run(gated):
+        scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)
+        scorer.audio_files = {}
+        gate = MotionGate(max_stale=10.0) if gated else None
+        ear = None
+        for frame_idx in range(20):
+            t_now = frame_idx * 0.1
+            closed = 5 <= frame_idx < 12
+            frame = make_frame(eyes_closed=closed, seed=frame_idx)
+            if gate is None or gate.should_run(frame, t_now):
+                ear = 0.05 if closed else 0.3  # what the landmark model would report
+                if gate is not None:
+                    gate.update(frame, t_now, [FACE_BOX])
+            scorer.get_PERCLOS(t_now, 10, ear)
+        return scorer.eye_closure_counter, gate
+
+    expected, _ = run(gated=False)
+    counted, gate = run(gated=True)
+    assert counted == expected == 7, (counted, expected)
+    assert gate.frames_skipped > 0
+    print("✓ {} closed frames counted with {} of 20 frames skipped".format(counted, gate.frames_skipped))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Gate decisions', test_gate_decisions), ('PERCLOS on skipped frames', test_perclos_on_skipped_frames)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,110 @@
+"""
+Test script for the sliding-window PERCLOS
+Run this to verify the score is time based: same for any frame rate, no jump at period boundaries
+"""
+
+import os
+import sys
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+
+def make_scorer():
+    from attention_score import AttentionScorer
+    scorer = AttentionScorer(t_now=0.0, ear_thresh=0.15)
+    scorer.audio_files = {}
+    scorer.ear_thresh = 0.15
+    scorer.sleep_threshold = 3.0
+    scorer.perclos_time_period = 60
+    return scorer
+
+
+def run(scorer, fps, seconds, t_start=0.):
+    """Blink pattern: eyes closed for 0.5 s every 5 s; returns [(t, perclos)]"""
+    scores = []
+    n_frames = int(seconds * fps)
+    for frame_idx in range(n_frames):
+        t_now = t_start + frame_idx / fps
+        ear = 0.05 if (t_now % 5.0) < 0.5 else 0.3
+        _, perclos_score = scorer.get_PERCLOS(t_now, fps, ear)
+        scores.append((t_now, perclos_score))
+    return scores
+
+
+def test_frame_rate_independent():
+    """The same eye closure gives the same PERCLOS at 30, 10 and 4 frames per second"""
+    print("=" * 50)
+    print("Testing frame-rate independence")
+    print("=" * 50)
+
+    results = {fps: run(make_scorer(), fps, 90)[-1][1] for fps in (30, 10, 4)}
+    for fps, perclos_score in results.items():
+        print(f"   {fps:>2} fps: {perclos_score:.4f}")
+        assert abs(perclos_score - 0.1) < 0.01, perclos_score
+    print("✓ 10% closure measured at every frame rate")
+
+
+def test_no_reset_jump():
+    """The window slides: no drop to zero when a period ends, memory stays bounded"""
+    print("\n" + "=" * 50)
+    print("Testing rolling window")
+    print("=" * 50)
+
+    scorer = make_scorer()
+    scores = run(scorer, 30, 150)
+    after_warmup = [perclos_score for t_now, perclos_score in scores if t_now >= 60]
+    assert min(after_warmup) > 0.08, min(after_warmup)
+    assert max(after_warmup) < 0.12, max(after_warmup)
+    assert len(scorer.perclos_samples) <= 60 * 30 + 1
+    print("✓ Score stays within 8-12% across the 60 s and 120 s boundaries")
+
+    # eyes open from now on, the closure slides out of the window
+    for frame_idx in range(61 * 30):
+        _, perclos_score = scorer.get_PERCLOS(150 + frame_idx / 30, 30, 0.3)
+    assert perclos_score < 1e-9, perclos_score
+    print("✓ Closure leaves the window after one period")
+
+
+def test_alerts_rearm_once_per_period():
+    """Each alert still plays at most once per PERCLOS period"""
+    print("\n" + "=" * 50)
+    print("Testing alert re-arming")
+    print("=" * 50)
+
+    scorer = make_scorer()
+    fired = []
+    scorer.alert_listeners.append(fired.append)
+    scorer.perclos_config = dict(scorer.perclos_config, semi_closed_max=0.05, moderately_drowsy_min=0.05,
+                                 moderately_drowsy_max=1.0, drowsy_min=1.0, drowsy_max=1.0,
+                                 very_drowsy_min=1.0, very_drowsy_max=1.0, sleeping_min=1.0)
+    run(scorer, 10, 150)
+    assert fired.count('Semi-Closed') == 3, fired
+    print("✓ Semi-Closed fired once in each of the 3 periods")
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Frame-rate independence', test_frame_rate_independent), ('Rolling window', test_no_reset_jump),
+                       ('Alert re-arming', test_alerts_rearm_once_per_period)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,189 @@
+"""
+Test script for recording and replaying sessions
+Run this to verify a recording round-trips, replays are repeatable and scored with the recorded config
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+SHAPE = (48, 64, 3)
+FPS = 10.
+
+
+class FakeFace:
+    """Only the fields replay() reads"""
+    def __init__(self, ear):
+        self.box = (8, 8, 40, 40)
+        self.score = 0.99
+        self.area = 32 * 32
+        self.average_aspect_ratio = ear
+
+
+class FakePipeline:
+    """Reads the EAR off the frame: the blue channel of pixel (0, 0) in hundredths, no face on black frames"""
+    def process_frames(self, frames, profiler=None):
+        return [[FakeFace(frame[0, 0, 0] / 100.)] if frame[0, 0, 0] else [] for frame in frames]
+
+
+def ear_trace(seconds=20):
+    """Open eyes (0.3) with 1 s closures (0.05) every 4 s and 1 s without a face at 10 s"""
+    t = np.arange(int(seconds * FPS)) / FPS
+    ear = np.where(t % 4.0 < 1.0, 0.05, 0.3)
+    ear[(t >= 10) & (t < 11)] = 0.
+    return t, ear
+
+
+def make_recording(path, perclos_config):
+    from replay import FrameRecorder
+    recorder = FrameRecorder(path, SHAPE, 1000, source='synthetic', perclos_config=perclos_config)
+    for t, ear in zip(*ear_trace()):
+        frame = np.zeros(SHAPE, dtype=np.uint8)
+        frame[..., 0] = int(round(ear * 100))
+        recorder.write(frame, 100. + t)
+    recorder.close()
+
+
+def test_record_and_replay():
+    """Frames, timestamps and config come back from disk, two replays give the same outputs"""
+    print("=" * 50)
+    print("Testing record -> replay")
+    print("=" * 50)
+
+    from attention_score import DEFAULT_PERCLOS_CONFIG
+    from replay import Recording, replay, compare_outputs, save_outputs, load_outputs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_recording(tmp, DEFAULT_PERCLOS_CONFIG)
+        recording = Recording(tmp)
+        t, ear = ear_trace()
+        assert len(recording) == len(t) and recording.shape == SHAPE
+        assert np.allclose(recording.timestamps, t) and abs(recording.fps - FPS) < 1e-9
+        assert np.array_equal(recording.frames[:, 0, 0, 0], np.round(ear * 100).astype(np.uint8))
+        assert recording.perclos_config == DEFAULT_PERCLOS_CONFIG
+        print("✓ {} frames, timestamps and config read back".format(len(recording)))
+
+        outputs, latencies = replay(recording, FakePipeline())
+        assert outputs['processed'].all() and len(latencies) == len(recording)
+        no_face = ear == 0
+        assert np.isnan(outputs['ear'][no_face]).all()
+        assert np.allclose(outputs['ear'][~no_face], ear[~no_face])
+        assert np.nanmax(outputs['perclos']) > 0.05
+
+        again, _ = replay(Recording(tmp), FakePipeline())
+        comparison = compare_outputs(again, outputs)
+        assert comparison['match'] and comparison['frames_compared'] == len(recording), comparison
+        save_outputs(os.path.join(tmp, 'reference.npz'), outputs)
+        assert compare_outputs(again, load_outputs(os.path.join(tmp, 'reference.npz')))['match']
+        del recording
+    print("✓ replay repeated and compared against a saved reference")
+
+
+def test_compare_outputs():
+    """Every kind of difference between two runs is reported, skipped frames are left out"""
+    print("\n" + "=" * 50)
+    print("Testing compare_outputs")
+    print("=" * 50)
+
+    from replay import compare_outputs
+
+    count = 6
+    reference = {
+        'processed': np.ones(count, dtype=bool),
+        'ear': np.array([0.3, 0.3, np.nan, 0.05, 0.05, 0.3]),
+        'perclos': np.array([0., 0., np.nan, 5., 10., 10.]),
+        'status': np.array(['Awake', 'Awake', '', 'Semi-Closed', 'Semi-Closed', 'Semi-Closed'], dtype=object),
+    }
+
+    def changed(**arrays):
+        outputs = {key: value.copy() for key, value in reference.items()}
+        for key, (idx, value) in arrays.items():
+            outputs[key][idx] = value
+        return outputs
+
+    assert compare_outputs(reference, reference) == {'frames_compared': 6, 'face_mismatch': 0, 'max_ear_diff': 0.,
+                                                      'max_perclos_diff': 0., 'status_mismatch': 0, 'match': True}
+    result = compare_outputs(changed(ear=(1, 0.31)), reference)
+    assert not result['match'] and abs(result['max_ear_diff'] - 0.01) < 1e-12
+    assert compare_outputs(changed(ear=(1, 0.30001)), reference)['match']
+    result = compare_outputs(changed(ear=(2, 0.3)), reference)
+    assert result['face_mismatch'] == 1 and not result['match']
+    result = compare_outputs(changed(perclos=(4, 10.5)), reference)
+    assert result['max_perclos_diff'] == 0.5 and not result['match']
+    result = compare_outputs(changed(status=(5, 'Awake')), reference)
+    assert result['status_mismatch'] == 1 and not result['match']
+
+    # a frame one run skipped is not compared, whatever it holds
+    result = compare_outputs(changed(processed=(3, False), ear=(3, np.nan), perclos=(3, np.nan), status=(3, '')), reference)
+    assert result['match'] and result['frames_compared'] == 5
+    print("✓ EAR, face, PERCLOS and status differences reported, skipped frames ignored")
+
+
+def test_recorded_config():
+    """The replay scores with the config stored at record time, not with perclos_config.json"""
+    print("\n" + "=" * 50)
+    print("Testing the recorded PERCLOS config")
+    print("=" * 50)
+
+    from attention_score import DEFAULT_PERCLOS_CONFIG, read_perclos_config
+    from replay import Recording, META_FILE, replay, compare_outputs
+
+    live = read_perclos_config()
+    # closures of 0.05 are not closed eyes below an EAR threshold of 0.04
+    recorded = dict(DEFAULT_PERCLOS_CONFIG, ear_thresh=0.04)
+    assert live['ear_thresh'] != recorded['ear_thresh']
+    with tempfile.TemporaryDirectory() as tmp:
+        make_recording(tmp, recorded)
+        outputs, _ = replay(Recording(tmp), FakePipeline())
+        assert np.nanmax(outputs['perclos']) == 0 and set(outputs['status'][outputs['processed']]) <= {'Awake', ''}
+
+        # an explicit config wins over the recorded one
+        overridden, _ = replay(Recording(tmp), FakePipeline(), perclos_config=live)
+        assert np.nanmax(overridden['perclos']) > 0.05
+
+        # recordings made before the config was stored fall back to the live file
+        meta_path = os.path.join(tmp, META_FILE)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        del meta['perclos_config']
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        recording = Recording(tmp)
+        assert recording.perclos_config is None
+        legacy, _ = replay(recording, FakePipeline())
+        assert compare_outputs(legacy, overridden)['match']
+        del recording
+    print("✓ recorded EAR threshold {} used instead of the live {}".format(recorded['ear_thresh'], live['ear_thresh']))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Record and replay', test_record_and_replay), ('Compare outputs', test_compare_outputs),
+                       ('Recorded config', test_recorded_config)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
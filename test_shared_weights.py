@@ -0,0 +1,113 @@
+"""
+Test script for memory-mapped landmark weights
+Run this to verify mmap_weights loads the same network as torch.load, backed by the shared cache file
+"""
+
+import os
+import sys
+import tempfile
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+
+import torch
+
+
+def file_mappings():
+    """[(start, end, path)] of the file-backed mappings of this process, None off Linux"""
+    try:
+        with open('/proc/self/maps') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    mappings = []
+    for line in lines:
+        parts = line.split(maxsplit=5)
+        if len(parts) == 6 and parts[5].startswith('/'):
+            start, end = (int(address, 16) for address in parts[0].split('-'))
+            mappings.append((start, end, parts[5].strip()))
+    return mappings
+
+
+def backing_file(tensor, mappings):
+    address = tensor.data_ptr()
+    for start, end, path in mappings:
+        if start <= address < end:
+            return path
+    return None
+
+
+def test_mmap_weights():
+    """Two mmap loads give the outputs of the torch.load path, their tensors live in the exported file"""
+    print("=" * 50)
+    print("Testing memory-mapped weights")
+    print("=" * 50)
+
+    import model_loader
+    import shared_weights
+
+    cfg = model_loader.load_experiment_config('WFLW', 'pip_32_16_60_r18_l2_l1_10_1_nb10')
+    torch.manual_seed(0)
+    net = model_loader.build_landmark_net(cfg)
+    device = torch.device('cpu')
+    cache_dir = shared_weights.CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        weight_file = os.path.join(tmp, 'epoch59.pth')
+        # snapshots are in the legacy format, which cannot be mapped
+        torch.save(net.state_dict(), weight_file, _use_new_zipfile_serialization=False)
+        shared_weights.CACHE_DIR = os.path.join(tmp, 'cache')
+        try:
+            path = shared_weights.export_shared_weights(weight_file)
+            assert os.path.dirname(path) == shared_weights.CACHE_DIR
+            mtime = os.stat(path).st_mtime_ns
+            assert shared_weights.export_shared_weights(weight_file) == path
+            assert os.stat(path).st_mtime_ns == mtime
+            print("✓ exported once to {}".format(os.path.basename(path)))
+
+            reference = model_loader.load_landmark_net(cfg, device, weight_file)
+            mapped = [model_loader.load_landmark_net(cfg, device, weight_file, mmap_weights=True) for _ in range(2)]
+            inputs = torch.randn(2, 3, cfg.input_size, cfg.input_size)
+            with torch.no_grad():
+                expected = reference(inputs)
+                for model in mapped:
+                    for output, expected_output in zip(model(inputs), expected):
+                        assert torch.equal(output, expected_output)
+            print("✓ both mapped networks match the torch.load network")
+
+            mappings = file_mappings()
+            if mappings is None:
+                print("- no /proc/self/maps, backing file not checked")
+                return
+            for model in mapped:
+                state_dict = model.state_dict()
+                assert all(backing_file(tensor, mappings) == path for tensor in state_dict.values() if tensor.numel())
+            assert mapped[0].state_dict()['conv1.weight'].data_ptr() != mapped[1].state_dict()['conv1.weight'].data_ptr()
+            assert backing_file(reference.state_dict()['conv1.weight'], mappings) is None
+            print("✓ {} tensors per network mapped from the cache file".format(len(state_dict)))
+            del mapped, model, state_dict
+        finally:
+            shared_weights.CACHE_DIR = cache_dir
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Mapped weights', test_mmap_weights)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,165 @@
+"""
+Test script for the offline threshold tuner
+Run this to verify the vectorised replay matches AttentionScorer and the grid search scores labelled events
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+# Add source directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'source'))
+# AttentionScorer initialises pygame.mixer, CI machines have no sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+# every level reachable within a short period, as in test_fleet_scorer
+CONFIG = {
+    'semi_closed_min': 0.0, 'semi_closed_max': 0.05,
+    'moderately_drowsy_min': 0.05, 'moderately_drowsy_max': 0.1,
+    'drowsy_min': 0.1, 'drowsy_max': 0.15,
+    'very_drowsy_min': 0.15, 'very_drowsy_max': 0.2,
+    'sleeping_min': 0.2,
+    'ear_thresh': 0.15, 'sleep_threshold': 2.0, 'perclos_time_period': 20,
+    'audio_files': {},
+}
+
+
+def drive(seconds, seed, drowsy=()):
+    """Irregular 10-30 fps EAR trace, eyes closing more often during the (start, end) spans of drowsy"""
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(0.03, 0.1, int(seconds * 15)) + (rng.random(int(seconds * 15)) < 0.002) * 2.0)
+    t = t[t < seconds]
+    closed = np.zeros(len(t), dtype=bool)
+    for idx in range(1, len(t)):
+        in_drowsy = any(start <= t[idx] < end for start, end in drowsy)
+        p_close, p_stay = (0.08, 0.97) if in_drowsy else (0.01, 0.6)
+        closed[idx] = rng.random() < (p_stay if closed[idx - 1] else p_close)
+    ear = np.where(closed, rng.uniform(0.02, 0.12, len(t)), rng.uniform(0.2, 0.35, len(t)))
+    return t, ear
+
+
+def scalar_run(t, ear, config):
+    """Statuses, scores and alerts of an AttentionScorer over the trace"""
+    from attention_score import AttentionScorer
+
+    scorer = AttentionScorer(t_now=t[0], ear_thresh=0.15)
+    scorer.apply_config(dict(config))
+    scorer.audio_enabled = False
+    alerts = []
+    current = [None]
+    scorer.alert_listeners.append(lambda alert_type: alerts.append((current[0], alert_type)))
+    statuses, scores = [], []
+    for t_now, ear_score in zip(t, ear):
+        current[0] = float(t_now)
+        tired, perclos_score = scorer.get_PERCLOS(float(t_now), 10, float(ear_score))
+        statuses.append(tired)
+        scores.append(perclos_score)
+    return statuses, np.array(scores), alerts
+
+
+def test_replay_conformance():
+    """replay() gives the scalar statuses, scores and alerts, sample for sample"""
+    print("=" * 50)
+    print("Testing replay against AttentionScorer")
+    print("=" * 50)
+
+    from threshold_tuner import config_for, replay
+    from fleet_scorer import STATUS_NAMES
+
+    t, ear = drive(400, seed=0, drowsy=[(100, 180), (300, 340)])
+    total = 0
+    for ear_thresh, sleep_threshold, period, band_scale in [(0.15, 2.0, 20, 1.0), (0.1, 1.0, 10, 0.5), (0.13, 3.0, 45, 2.0)]:
+        config = config_for(CONFIG, ear_thresh, sleep_threshold, period, band_scale)
+        statuses, scores, alerts = scalar_run(t, ear, config)
+        codes, perclos, tuned_alerts = replay(t, ear, config)
+        assert [STATUS_NAMES[code] for code in codes] == statuses
+        assert np.allclose(perclos, scores, atol=1e-9)
+        assert tuned_alerts == alerts, (tuned_alerts[:5], alerts[:5])
+        total += len(alerts)
+    print("✓ {} samples x 3 configs identical, {} alerts".format(len(t), total))
+
+
+def test_grid():
+    """Every grid row equals its own replay, labelled events are caught by the right configs"""
+    print("\n" + "=" * 50)
+    print("Testing the grid search")
+    print("=" * 50)
+
+    from threshold_tuner import config_for, replay, tune, rank, parse_events
+
+    t, ear = drive(600, seed=1, drowsy=[(200, 260), (450, 500)])
+    events = parse_events("# drowsy spans\n200,260\n450, 500\n")
+    grid = dict(ear_thresholds=(0.1, 0.15), sleep_thresholds=(1.0, 3.0), periods=(10, 30), band_scales=(0.5, 1.0, 2.0))
+    results = tune(t, ear, events, base_config=CONFIG, tolerance=5.0, **grid)
+    assert len(results) == 24
+    for row in results:
+        config = config_for(CONFIG, row['ear_thresh'], row['sleep_threshold'], row['perclos_time_period'], row['band_scale'])
+        _, _, alerts = replay(t, ear, config)
+        assert row['alerts'] == len(alerts)
+        assert row['sleeping'] == sum(alert_type == 'Sleeping' for _, alert_type in alerts)
+        caught = [any(start <= t_alert - t[0] <= end + 5.0 for t_alert, _ in alerts) for start, end in events]
+        assert row['detected'] == sum(caught)
+        outside = [t_alert for t_alert, _ in alerts if not any(start <= t_alert - t[0] <= end + 5.0 for start, end in events)]
+        assert row['false_alerts'] == len(outside)
+    best = results[rank(results)[0]]
+    assert best['recall'] == 1.0
+    print("✓ 24 configs match their replays, best: ear {:.2f}, sleep {:.1f}s, period {:.0f}s, bands x{:.2f}, "
+          "{:.1f} false/h, {:.1f}s late".format(best['ear_thresh'], best['sleep_threshold'], best['perclos_time_period'],
+                                                best['band_scale'], best['false_per_hour'], best['mean_latency']))
+
+
+def test_load_and_speed():
+    """Traces load from frame logs, the default grid of thousands of configs runs in seconds"""
+    print("\n" + "=" * 50)
+    print("Testing trace loading and the default grid")
+    print("=" * 50)
+
+    from frame_log import FrameLogWriter
+    from landmark_pipeline import FaceResult
+    from threshold_tuner import load_trace, tune
+
+    t, ear = drive(1800, seed=2, drowsy=[(900, 1000)])
+    face = FaceResult((0, 0, 100, 100), 0.99, np.zeros(196, dtype=np.float32))
+    with tempfile.TemporaryDirectory() as log_dir:
+        writer = FrameLogWriter(log_dir)
+        for idx, (t_now, ear_score) in enumerate(zip(t, ear)):
+            writer.append(0, 'Awake', face, ear_score, 0.0, t_now=1.7e9 + t_now)
+            if idx % 50 == 0:
+                writer.append(0, t_now=1.7e9 + t_now)  # no face, dropped by load_trace
+        writer.close()
+        loaded_t, loaded_ear = load_trace(log_dir)
+    assert len(loaded_t) == len(t) and np.allclose(loaded_t - 1.7e9, t) and np.allclose(loaded_ear, ear)
+
+    t_start = time.perf_counter()
+    results = tune(loaded_t, loaded_ear, [(900, 1000)], base_config=CONFIG)
+    elapsed = time.perf_counter() - t_start
+    assert len(results) >= 5000 and (results['alerts'] >= results['sleeping']).all()
+    print("✓ {} samples, {} configs in {:.1f} s".format(len(t), len(results), elapsed))
+
+
+def main():
+    """Run all tests"""
+    results = {}
+    for name, test in [('Replay conformance', test_replay_conformance), ('Grid search', test_grid),
+                       ('Loading and speed', test_load_and_speed)]:
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"\n✗ Error in {name}: {e}")
+            results[name] = False
+
+    print("\n" + "=" * 60)
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name:.<40} {status}")
+    print("=" * 60)
+    return all(results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)